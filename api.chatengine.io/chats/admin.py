@@ -1,6 +1,6 @@
 
 from django.contrib import admin
-from .models import Chat, ChatPerson, Person, Message, Attachment
+from .models import Chat, ChatPerson, Person, Message, Attachment, StoredFile
 
 admin.site.register(Chat)
 admin.site.register(ChatPerson)
@@ -8,3 +8,4 @@ admin.site.register(Person)
 
 admin.site.register(Message)
 admin.site.register(Attachment)
+admin.site.register(StoredFile)
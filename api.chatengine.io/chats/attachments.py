@@ -0,0 +1,200 @@
+import os
+import time
+import hashlib
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import transaction
+from django.core.files import File
+
+from server.utils.images import generate_derivatives, needs_derivatives
+from server.utils.jobs import job_queue
+from server.utils.uploads import get_upload_key
+from webhooks.sender import get_session
+
+from .models import Message, Attachment
+from .stored_files import add_reference, get_content_name, get_storage
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+class StreamedFile(File):
+    """
+    A download handed to storage chunk by chunk, never written to a temp file, and hashed
+    (sha256, in `digest`) on the way.
+
+    Raises AttachmentTooLarge past max_bytes and TimeoutError once the download runs past its
+    deadline, so storage aborts the upload instead of keeping a partial file.
+    """
+
+    def __init__(self, response, name, max_bytes, deadline):
+        super().__init__(None, name)
+        self.response = response
+        self.max_bytes = max_bytes
+        self.deadline = deadline
+        self.read_bytes = 0
+        self.iterator = response.iter_content(CHUNK_SIZE)
+        self.buffer = b''
+        self.digest = hashlib.sha256()
+
+    @property
+    def size(self):
+        # Only known once storage has read it all, which is when FieldFile/Storage ask
+        return self.read_bytes
+
+    def next_chunk(self):
+        if time.monotonic() > self.deadline:
+            raise TimeoutError('Download of {} timed out'.format(self.name))
+        chunk = next(self.iterator, b'')
+        self.read_bytes += len(chunk)
+        if self.read_bytes > self.max_bytes:
+            raise AttachmentTooLarge('{} is over {} bytes'.format(self.name, self.max_bytes))
+        self.digest.update(chunk)
+        return chunk
+
+    def chunks(self, chunk_size=None):
+        if self.buffer:
+            yield self.buffer
+            self.buffer = b''
+        chunk = self.next_chunk()
+        while chunk:
+            yield chunk
+            chunk = self.next_chunk()
+
+    def read(self, size=-1):
+        # For storages that upload from a file object (S3's upload_fileobj)
+        while size < 0 or len(self.buffer) < size:
+            chunk = self.next_chunk()
+            if not chunk:
+                break
+            self.buffer += chunk
+        if size < 0:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self.response.close()
+
+
+def get_file_name(url):
+    return os.path.basename(urlparse(url).path) or 'attachment'
+
+
+class AttachmentFetcher:
+    """
+    Downloads attachment URLs on a bounded thread pool, streaming each one into storage.
+
+    The content's name depends on its hash, which is only known once it has all been read, so the
+    pool uploads each download to a staging object first. The calling thread then stores each
+    content once (see stored_files, a copy when it's new) and writes its Attachment row, one short
+    transaction per attachment. A URL that fails, times out or is too large is logged and skipped.
+    """
+
+    def __init__(self, concurrency=None, timeout=None, max_bytes=None):
+        self.concurrency = concurrency or settings.ATTACHMENT_FETCH_CONCURRENCY
+        self.timeout = timeout or settings.ATTACHMENT_FETCH_TIMEOUT
+        self.max_bytes = max_bytes or settings.ATTACHMENT_MAX_BYTES
+        self.session = get_session(pool_size=self.concurrency)
+        self.storage = get_storage()
+        self.max_length = Attachment._meta.get_field('file').max_length
+
+    def upload(self, url):
+        staging = None
+        try:
+            response = self.session.get(url, stream=True, timeout=self.timeout)
+            response.raise_for_status()
+            if int(response.headers.get('Content-Length') or 0) > self.max_bytes:
+                response.close()
+                raise AttachmentTooLarge('{} is over {} bytes'.format(url, self.max_bytes))
+
+            content = StreamedFile(response, get_file_name(url), self.max_bytes, time.monotonic() + self.timeout)
+            try:
+                staging = get_upload_key('staging', content.name)
+                staging = self.storage.save(staging, content, max_length=self.max_length)
+                return content.digest.hexdigest(), content.name, staging
+            finally:
+                content.close()
+        except Exception as e:
+            logger.warning('Skipping attachment %s: %s: %s', url, type(e).__name__, e)
+            if staging is not None:
+                # Whatever a failed upload left behind
+                self.storage.delete(staging)
+            return None
+
+    def attach(self, message, digest, file_name, staging):
+        try:
+            with transaction.atomic():
+                name = get_content_name(digest, file_name)
+                add_reference(name, source=staging)
+                return Attachment.objects.create(chat_id=message.chat_id, message=message, file=name)
+        except Exception as e:
+            logger.warning('Skipping attachment %s: %s: %s', file_name, type(e).__name__, e)
+            return None
+
+    def fetch(self, message, urls):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            uploads = [upload for upload in executor.map(self.upload, urls) if upload is not None]
+            attachments = [self.attach(message, *upload) for upload in uploads]
+            # Staging objects are only read while their content is stored
+            list(executor.map(self.storage.delete, [staging for _, _, staging in uploads]))
+        return [attachment for attachment in attachments if attachment is not None]
+
+
+def fetch_message_attachments(message_id, urls):
+    # Runs on the job queue, the message went out without these attachments
+    message = Message.objects.filter(pk=message_id).select_related('chat', 'sender').first()
+    if message is None or message.chat is None:
+        return
+
+    attachments = AttachmentFetcher().fetch(message, urls)
+    if len(attachments) == 0:
+        return
+
+    # The attachments are committed, a retry would fetch and attach every URL again
+    try:
+        publish_message_edit(message.pk)
+        enqueue_attachment_derivatives(attachments)
+    except Exception:
+        logger.exception('Attached %s files to message %s but could not announce them', len(attachments), message.pk)
+
+
+def enqueue_message_attachments(message, urls):
+    urls = [url for url in urls if url]
+    if len(urls) > 0:
+        job_queue.enqueue(fetch_message_attachments, message.pk, urls)
+
+
+def publish_message_edit(message_id):
+    from .publishers import chat_publisher
+    from .serializers import MessageSerializer
+    message = Message.objects.select_related('chat', 'sender').prefetch_related('attachments').get(pk=message_id)
+    chat_publisher.publish_message_data('edit_message', message.chat, MessageSerializer(message, many=False).data)
+
+
+def generate_attachment_derivatives(attachment_ids):
+    # Runs on the job queue, members get an edit_message once the thumbnails are there
+    queryset = Attachment.objects.filter(pk__in=attachment_ids)
+    updated = generate_derivatives(queryset, 'file', 'derivatives', settings.ATTACHMENT_DERIVATIVES)
+    message_ids = Attachment.objects.filter(pk__in=updated).values_list('message_id', flat=True).distinct()
+    for message_id in message_ids:
+        publish_message_edit(message_id)
+
+
+def enqueue_attachment_derivatives(attachments):
+    attachment_ids = [attachment.pk for attachment in attachments if needs_derivatives(attachment.file, attachment.derivatives)]
+    if len(attachment_ids) > 0:
+        transaction.on_commit(lambda: job_queue.enqueue(generate_attachment_derivatives, attachment_ids))
@@ -1,6 +1,7 @@
 from rest_framework import exceptions, authentication
 
 from projects.models import Project
+from projects.cache import get_project, get_project_by_private_key
 from chats.models import Chat
 from subscriptions.upgrade_email import upgrade_emailer
 
@@ -26,7 +27,7 @@ class ChatAccessKeyAuthentication(authentication.BaseAuthentication):
 
         try:
             if public_key is not None:
-                project = Project.objects.get(public_key=public_key)
+                project = get_project(public_key)
                 chat = Chat.objects.get(project=project, id=chat_id, access_key=access_key)
 
                 if not project.is_active:
@@ -36,7 +37,7 @@ class ChatAccessKeyAuthentication(authentication.BaseAuthentication):
                 return chat, project
 
             if private_key is not None:
-                project = Project.objects.get(private_key=private_key)
+                project = get_project_by_private_key(private_key)
                 chat = Chat.objects.get(project=project, id=chat_id)
 
                 if not project.is_active:
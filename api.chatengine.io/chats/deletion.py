@@ -0,0 +1,78 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from webhooks.cache import get_webhook
+from webhooks.sender import hook
+
+from .models import Chat, ChatPerson, Message, Attachment, repoint_last_message
+from .stored_files import release_files
+
+DELETE_TRIGGER = 'On Delete Message'
+
+
+def delete_messages(ids, send_hooks=True):
+    """
+    Deletes messages with set-based queries and no per-row signals.
+
+    Does by hand what the collector and the delete signals would do: attachments go (and release
+    their stored files), last_read and last_message pointers are cleared and chats are re-pointed
+    at their newest remaining message.
+    Instead of one 'On Delete Message' hook per row, each chat gets a single event whose payload
+    carries a `messages` list (`message` is null). send_hooks=False skips the event altogether.
+    """
+    ids = list(ids)
+    if len(ids) == 0:
+        return 0
+
+    # Serialized up front, the rows are gone by the time the hook is queued
+    events = get_delete_events(ids) if send_hooks else {}
+
+    with transaction.atomic():
+        chats = Chat.objects.filter(last_message_id__in=ids)
+        chat_ids = list(chats.values_list('pk', flat=True))
+        chats.update(last_message=None, last_activity=None)
+        ChatPerson.objects.filter(last_read_id__in=ids).update(last_read=None)
+
+        attachments = Attachment.objects.filter(message_id__in=ids)
+        names = list(attachments.values_list('file', flat=True))
+        attachments._raw_delete(attachments.db)
+        release_files(names)
+        messages = Message.objects.filter(pk__in=ids)
+        deleted = messages._raw_delete(messages.db)
+
+        repoint_last_message(Chat.objects.filter(pk__in=chat_ids))
+        send_delete_events(events)
+
+    return deleted
+
+
+def get_delete_events(ids):
+    project_ids = Chat.objects.filter(messages__pk__in=ids).values_list('project_id', flat=True).distinct()
+    hooked = [project_id for project_id in project_ids if get_webhook(project_id, DELETE_TRIGGER) is not None]
+    if len(hooked) == 0:
+        return {}
+
+    from .serializers import MessageSerializer
+
+    events = defaultdict(list)
+    messages = Message.objects.filter(pk__in=ids, chat__project_id__in=hooked) \
+        .select_related('chat', 'sender').prefetch_related('attachments').order_by('chat', 'id')
+    for message in messages:
+        events[message.chat].append(MessageSerializer(message, many=False).data)
+    return events
+
+
+def send_delete_events(events):
+    from .serializers import ChatSerializer
+    from projects.serializers import ProjectSerializer
+
+    for chat, messages_json in events.items():
+        chat.refresh_from_db()
+        hook.enqueue(
+            event_trigger=DELETE_TRIGGER,
+            project_id=chat.project_id,
+            project_json=lambda: ProjectSerializer(chat.project, many=False).data,
+            chat_json=lambda: ChatSerializer(chat, many=False).data,
+            messages_json=messages_json
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, OuterRef, Subquery
+
+from chats.models import Chat, Message
+
+
+class Command(BaseCommand):
+    help = 'Backfill Chat.last_message and Chat.last_activity from each chat\'s message history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_id = Chat.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        latest = Message.objects.filter(chat=OuterRef('pk')).order_by('-id')
+
+        updated = 0
+        for start in range(0, max_id + 1, batch_size):
+            updated += Chat.objects.filter(id__gte=start, id__lt=start + batch_size).update(
+                last_message=Subquery(latest.values('pk')[:1]),
+                last_activity=Subquery(latest.values('created')[:1]),
+            )
+            self.stdout.write('Backfilled chats up to id {} ({} updated)'.format(start + batch_size - 1, updated))
+
+        self.stdout.write(self.style.SUCCESS('Done, {} chats backfilled'.format(updated)))
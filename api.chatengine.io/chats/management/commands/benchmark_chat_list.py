@@ -0,0 +1,70 @@
+import io
+import uuid
+
+from django.utils import timezone
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from projects.models import Project, Person
+from chats.models import Chat, ChatPerson, Message
+from chats.serializers import ChatSerializer, MessageSerializer
+
+from server.utils.benchmark import measure, rolled_back
+
+
+class FullScanChatSerializer(ChatSerializer):
+    # The pre-pointer implementation, kept here to compare against
+    def get_last_message(self, obj):
+        query = Message.objects.filter(chat=obj)
+        message = query.first() if len(query) > 0 else None
+        serializer = MessageSerializer(message, many=False)
+        return serializer.data
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chat list serialization with long message histories (fixtures are rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chats', type=int, default=25)
+        parser.add_argument('--messages', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            chats = self.create_fixtures(chat_count=options['chats'], message_count=options['messages'])
+
+            def serialize(serializer_class):
+                def run():
+                    fresh = list(Chat.objects.filter(pk__in=[chat.pk for chat in chats]))
+                    return serializer_class(fresh, many=True).data
+                return run
+
+            before = measure(serialize(FullScanChatSerializer), repeat=options['repeat'])
+            after = measure(serialize(ChatSerializer), repeat=options['repeat'])
+
+        self.stdout.write('{} chats x {} messages'.format(options['chats'], options['messages']))
+        for label, result in (('full scan', before), ('last_message pointer', after)):
+            self.stdout.write('{:>22}: {:9.1f} ms median, {:9.1f} ms min, {} queries'.format(
+                label, result['median_ms'], result['min_ms'], result['queries']
+            ))
+
+    def create_fixtures(self, chat_count, message_count):
+        user = User.objects.create_user(email='benchmark-{}@chatengine.io'.format(uuid.uuid4()), password='benchmark')
+        project = Project.objects.create(owner=user, title='Benchmark')
+        person = Person.objects.create(project=project, username='benchmark', secret='benchmark')
+
+        chats = Chat.objects.bulk_create([
+            Chat(project=project, admin=person, title='Chat {}'.format(i)) for i in range(chat_count)
+        ])
+        ChatPerson.objects.bulk_create([ChatPerson(chat=chat, person=person) for chat in chats])
+        now = timezone.now()
+        for chat in chats:
+            Message.objects.bulk_create([
+                Message(chat=chat, sender=person, sender_username=person.username, text='Message {}'.format(i), created=now)
+                for i in range(message_count)
+            ], batch_size=1000)
+
+        # bulk_create skips the signals that maintain the pointer
+        call_command('backfill_last_message', stdout=io.StringIO())
+        return chats
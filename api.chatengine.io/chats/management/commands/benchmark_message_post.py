@@ -0,0 +1,66 @@
+import time
+import uuid
+
+from django.test import Client
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from projects.models import Project, Person
+from chats.models import Chat, ChatPerson, Message
+from chats.views import touch_chat_people
+
+from server.utils.benchmark import measure, rolled_back
+
+SECRET = 'benchmark'
+
+
+def save_each_chat_person(chat, message, sender):
+    # The pre-bulk implementation, kept here to compare against
+    for chat_person in ChatPerson.objects.filter(chat=chat):
+        chat_person.last_read = message if chat_person.person == sender else chat_person.last_read
+        chat_person.chat_updated = message.created
+        chat_person.save()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark message post latency against chat size (fixtures are rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, nargs='+', default=[1, 10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:>8} {:>20} {:>20} {:>16}'.format('members', 'per-row saves ms', 'set-based ms', 'POST ms'))
+        for members in options['members']:
+            with rolled_back():
+                project, sender, chat = self.create_fixtures(members)
+                message = Message.objects.create(chat=chat, sender=sender, text='Benchmark')
+
+                before = measure(lambda: save_each_chat_person(chat, message, sender), repeat=options['repeat'])
+                after = measure(lambda: touch_chat_people(chat, message, sender), repeat=options['repeat'])
+
+                client = Client(headers={'project-id': str(project.pk), 'user-name': sender.username, 'user-secret': SECRET})
+                url = '/chats/{}/messages/'.format(chat.pk)
+                client.post(url, {'text': 'Warm up'}, content_type='application/json')
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    client.post(url, {'text': 'Hello'}, content_type='application/json')
+                    timings.append((time.perf_counter() - start) * 1000)
+
+            self.stdout.write('{:>8} {:>11.1f} ({:>5} q) {:>11.1f} ({:>5} q) {:>16.1f}'.format(
+                members, before['median_ms'], before['queries'], after['median_ms'], after['queries'], sorted(timings)[len(timings) // 2]
+            ))
+
+    def create_fixtures(self, members):
+        user = User.objects.create_user(email='benchmark-{}@chatengine.io'.format(uuid.uuid4()), password='benchmark')
+        project = Project.objects.create(owner=user, title='Benchmark')
+        sender = Person.objects.create(project=project, username='sender', secret=SECRET)
+        chat = Chat.objects.create(project=project, admin=sender, title='Benchmark')
+
+        # bulk_create skips the member bookkeeping signals, which this benchmark doesn't need
+        people = Person.objects.bulk_create([
+            Person(project=project, username='member_{}'.format(i), secret=SECRET) for i in range(members - 1)
+        ])
+        ChatPerson.objects.bulk_create([ChatPerson(chat=chat, person=person) for person in people])
+        return project, sender, chat
@@ -0,0 +1,41 @@
+import io
+import json
+
+from contextlib import redirect_stdout
+
+from django.core.management.base import BaseCommand
+
+from server.redis import redis_client
+from chats.publishers import chat_publisher
+
+from server.utils.benchmark import measure
+
+CHAT_ID = 0
+
+
+def sequential_publish(action, chat_data, people_ids):
+    # The pre-pipeline implementation, kept here to compare against
+    message = json.dumps({"action": action, "data": chat_data})
+    with redirect_stdout(io.StringIO()):
+        for person_id in people_ids:
+            print(f"Publishing to person:{str(person_id)}")
+            result = redis_client.publish(f"person:{str(person_id)}", message)
+            print(f"Published to person:{str(person_id)}: {result}")
+    redis_client.publish(f"chat:{str(chat_data['id'])}", message)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chat fan-out latency against the configured Redis for growing member counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, nargs='+', default=[1, 10, 100, 500, 2000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        chat_data = {'id': CHAT_ID, 'title': 'Benchmark', 'people': []}
+        self.stdout.write('{:>8} {:>16} {:>16}'.format('members', 'sequential ms', 'pipelined ms'))
+        for members in options['members']:
+            people_ids = list(range(1, members + 1))
+            before = measure(lambda: sequential_publish('edit_chat', chat_data, people_ids), repeat=options['repeat'])
+            after = measure(lambda: chat_publisher.publish_chat_data('edit_chat', chat_data, people_ids), repeat=options['repeat'])
+            self.stdout.write('{:>8} {:>16.2f} {:>16.2f}'.format(members, before['median_ms'], after['median_ms']))
@@ -0,0 +1,102 @@
+import io
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from accounts.models import User
+from projects.models import Project, Person
+from chats.models import Chat, ChatPerson, Message, Attachment
+from chats.serializers import ChatSerializer
+
+from server.utils.benchmark import measure, rolled_back
+from server.utils.files import signed_url_cache
+
+# Presigning is local HMAC work, nothing is sent to this bucket. Django 5.0 drops the OPTIONS of an
+# overridden default storage, so the bucket is set through the AWS_ settings S3Boto3Storage reads
+STORAGE_SETTINGS = {
+    'STORAGES': {
+        'default': {'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    'AWS_STORAGE_BUCKET_NAME': 'benchmark-bucket',
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+    'AWS_S3_REGION_NAME': 'us-east-1',
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark chat list serialization CPU and wall time with S3 avatars and attachments, with and without the signed URL cache (fixtures are rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chats', type=int, default=250)
+        parser.add_argument('--people', type=int, default=4)
+        parser.add_argument('--attachments', type=int, default=2)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back(), override_settings(**STORAGE_SETTINGS):
+            chats = self.create_fixtures(options['chats'], options['people'], options['attachments'])
+            pks = [chat.pk for chat in chats]
+
+            def serialize(clear_local=False):
+                def run():
+                    if clear_local:
+                        signed_url_cache.clear_local()
+                    return ChatSerializer(Chat.objects.filter(pk__in=pks), many=True).data
+                return run
+
+            with override_settings(SIGNED_URL_CACHE_MARGIN=settings.AWS_QUERYSTRING_EXPIRE):
+                uncached = measure(serialize(), repeat=options['repeat'])
+            serialize()()  # Warm up
+            shared = measure(serialize(clear_local=True), repeat=options['repeat'])
+            local = measure(serialize(), repeat=options['repeat'])
+
+            names = list(Person.objects.filter(project=chats[0].project_id).values_list('avatar', flat=True))
+            names += list(Attachment.objects.filter(chat__in=pks).values_list('file', flat=True))
+            signed_url_cache.delete(*['benchmark-bucket:{}'.format(name) for name in names])
+
+        self.stdout.write('{} chats x {} people, {} attachments each'.format(
+            options['chats'], options['people'], options['attachments']
+        ))
+        for label, result in (('signing every URL', uncached), ('Redis tier', shared), ('local tier', local)):
+            # The Redis tier is a network round trip, its cost shows in wall time rather than CPU time
+            self.stdout.write('{:>18}: {:9.1f} ms cpu, {:9.1f} ms wall (median), {:9.1f} ms wall (min)'.format(
+                label, result['cpu_ms'], result['median_ms'], result['min_ms']
+            ))
+
+    def create_fixtures(self, chat_count, people_count, attachment_count):
+        user = User.objects.create_user(email='benchmark-{}@chatengine.io'.format(uuid.uuid4()), password='benchmark')
+        project = Project.objects.create(owner=user, title='Benchmark')
+        run = uuid.uuid4().hex
+
+        # Every avatar and attachment gets its own path, the worst case for the cache
+        people = Person.objects.bulk_create([
+            Person(project=project, username='benchmark-{}'.format(i), secret='benchmark',
+                   avatar='avatars/{}/{}.png'.format(run, i))
+            for i in range(chat_count * people_count)
+        ])
+        chats = Chat.objects.bulk_create([
+            Chat(project=project, admin=people[i * people_count], title='Chat {}'.format(i)) for i in range(chat_count)
+        ])
+        ChatPerson.objects.bulk_create([
+            ChatPerson(chat=chat, person=people[i * people_count + j])
+            for i, chat in enumerate(chats) for j in range(people_count)
+        ])
+        now = timezone.now()
+        messages = Message.objects.bulk_create([
+            Message(chat=chat, sender=chat.admin, sender_username=chat.admin.username, text='Files', created=now)
+            for chat in chats
+        ])
+        Attachment.objects.bulk_create([
+            Attachment(chat=message.chat, message=message, file='attachments/{}/{}-{}.png'.format(run, message.pk, j))
+            for message in messages for j in range(attachment_count)
+        ])
+
+        # bulk_create skips the signals that maintain the pointer
+        call_command('backfill_last_message', stdout=io.StringIO())
+        return chats
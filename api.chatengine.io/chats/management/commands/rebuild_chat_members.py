@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from server.redis import redis_cache
+from chats.models import ChatPerson
+from chats.publishers import get_person_chats_key
+
+
+class Command(BaseCommand):
+    help = "Rebuild the person_chats:<id> sets the ws gateway reads in CHAT_BROADCAST_MODE."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        stale = list(redis_cache.scan_iter(match=get_person_chats_key('*'), count=batch_size))
+        for start in range(0, len(stale), batch_size):
+            redis_cache.delete(*stale[start:start + batch_size])
+
+        rows = ChatPerson.objects.order_by('person_id').values_list('person_id', 'chat_id')
+        pipeline = redis_cache.pipeline(transaction=False)
+        count = 0
+        for person_id, chat_id in rows.iterator(chunk_size=batch_size):
+            pipeline.sadd(get_person_chats_key(person_id), chat_id)
+            count += 1
+            if count % batch_size == 0:
+                pipeline.execute()
+        pipeline.execute()
+
+        self.stdout.write('Rebuilt {} memberships ({} stale sets removed)'.format(count, len(stale)))
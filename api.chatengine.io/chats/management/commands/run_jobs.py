@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from server.utils.jobs import job_queue
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (notification emails, ...).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-timeout', type=float, default=1)
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Job worker started, queue depth {}'.format(job_queue.depth()))
+        if options['once']:
+            stats = job_queue.drain()
+            self.stdout.write('Jobs: {succeeded} succeeded, {failed} failed, {scheduled} waiting to retry'.format(
+                scheduled=job_queue.scheduled(), **stats
+            ))
+            return
+        job_queue.run(poll_timeout=options['poll_timeout'], report=self.stdout.write)
@@ -0,0 +1,81 @@
+from django.db import transaction
+
+from projects.models import Person
+from webhooks.sender import hook
+
+from .models import Chat, ChatPerson, get_members_hash, sync_members_ids
+
+EDIT_TRIGGER = 'On Edit Chat'
+
+
+def chunks(values, chunk_size):
+    values = list(values)
+    for start in range(0, len(values), chunk_size):
+        yield values[start:start + chunk_size]
+
+
+def get_people_ids(project, usernames, chunk_size=500):
+    """
+    Resolves usernames to person ids in chunked username__in queries.
+
+    Raises Person.DoesNotExist naming the usernames that aren't in the project.
+    """
+    usernames = set(usernames)
+    people = {}
+    for chunk in chunks(usernames, chunk_size):
+        people.update(Person.objects.filter(project=project, username__in=chunk).values_list('username', 'id'))
+
+    missing = usernames - set(people)
+    if len(missing) > 0:
+        raise Person.DoesNotExist('No people named {}'.format(sorted(missing)))
+    return set(people.values())
+
+
+def replace_members(chat, people_ids, send_hooks=True, chunk_size=500):
+    """
+    Makes people_ids the chat's exact member set with set-based queries and no per-row signals.
+
+    The diff against the current members is applied with one bulk_create and a delete per chunk,
+    then members_ids is rebuilt once. Instead of the per-row ChatPerson signals there's a single
+    members publish and a single 'On Edit Chat' hook, and only if membership actually changed.
+    Returns the (added, removed) person ids.
+    """
+    people_ids = set(people_ids)
+
+    with transaction.atomic():
+        # Concurrent replaces of the same chat diff against each other's result, not a stale one. NO KEY,
+        # like sync_members_ids: message and member inserts into the chat keep going during the diff
+        list(Chat.objects.select_for_update(no_key=True).filter(pk=chat.pk).values_list('pk', flat=True))
+        current = set(ChatPerson.objects.filter(chat=chat).values_list('person_id', flat=True))
+        added, removed = sorted(people_ids - current), sorted(current - people_ids)
+        if len(added) == 0 and len(removed) == 0:
+            return added, removed
+
+        ChatPerson.objects.bulk_create([ChatPerson(chat=chat, person_id=person_id) for person_id in added], batch_size=chunk_size)
+        for chunk in chunks(removed, chunk_size):
+            # Nothing references ChatPerson, so there's no cascade for the collector to find
+            memberships = ChatPerson.objects.filter(chat=chat, person_id__in=chunk)
+            memberships._raw_delete(memberships.db)
+
+        members_ids = sync_members_ids(chat.pk)
+        chat.members_ids = members_ids
+        chat.members_hash = get_members_hash(members_ids)
+
+        if send_hooks:
+            send_edit_event(chat)
+
+    from .publishers import chat_publisher
+    chat_publisher.publish_members(chat.pk, added=added, removed=removed)
+    return added, removed
+
+
+def send_edit_event(chat):
+    from .serializers import ChatSerializer
+    from projects.serializers import ProjectSerializer
+
+    hook.enqueue(
+        event_trigger=EDIT_TRIGGER,
+        project_id=chat.project_id,
+        project_json=lambda: ProjectSerializer(chat.project, many=False).data,
+        chat_json=lambda: ChatSerializer(chat, many=False).data
+    )
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:36
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_members_hash(apps, schema_editor):
+    Chat = apps.get_model('chats', 'Chat')
+    last_id, chunk_size = 0, 1000
+    while True:
+        chats = list(Chat.objects.filter(pk__gt=last_id).order_by('pk').only('pk', 'members_ids')[:chunk_size])
+        if len(chats) == 0:
+            return
+        for chat in chats:
+            chat.members_hash = hashlib.sha256(chat.members_ids.encode()).hexdigest()
+        Chat.objects.bulk_update(chats, ['members_hash'])
+        last_id = chats[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0002_chat_last_message'),
+        ('projects', '0002_project_is_retention_hooks_enabled'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chat',
+            name='chats_chat_public__2cff09_idx',
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='members_hash',
+            field=models.CharField(default='', editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='chat',
+            name='members_ids',
+            field=models.TextField(default='[]', editable=False),
+        ),
+        migrations.RunPython(backfill_members_hash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='chat',
+            index=models.Index(fields=['project', 'members_hash'], name='chats_chat_public__96e986_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-18 14:02
+
+import jsonfield.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0003_chat_members_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='derivatives',
+            field=jsonfield.fields.JSONField(default=dict, editable=False),
+        ),
+    ]
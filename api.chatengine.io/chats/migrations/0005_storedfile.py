@@ -0,0 +1,40 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:20
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_stored_files(apps, schema_editor):
+    # Existing attachments keep their names, each one counted so deleting the last row removes it
+    Attachment = apps.get_model('chats', 'Attachment')
+    StoredFile = apps.get_model('chats', 'StoredFile')
+    files = Attachment.objects.exclude(file__isnull=True).exclude(file='').order_by() \
+        .values('file').annotate(references=Count('id'))
+
+    batch = []
+    for row in files.iterator():
+        batch.append(StoredFile(name=row['file'], references=row['references']))
+        if len(batch) == 1000:
+            StoredFile.objects.bulk_create(batch)
+            batch = []
+    StoredFile.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0004_attachment_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=5000, unique=True)),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_stored_files, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,14 @@
 import uuid
-import json
 import pytz
+import hashlib
+import threading
 
 from jsonfield import JSONField
 
 from datetime import datetime
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import OuterRef, Subquery
 from django.db.utils import IntegrityError
 from django.utils import timezone
 from django.dispatch import receiver
@@ -25,6 +27,15 @@ sanitizer = Sanitizer({
 })
 
 
+def get_members_hash(members_ids):
+    # members_ids is already canonical (str of the sorted ids), so equal member sets hash equally
+    return hashlib.sha256(members_ids.encode()).hexdigest()
+
+
+# Chat columns only written with queryset updates, by sync_members_ids and the message signals
+DERIVED_FIELDS = ('members_ids', 'members_hash', 'last_message', 'last_activity')
+
+
 class Chat(models.Model):
     admin = models.ForeignKey(Person, related_name="your_chats", on_delete=models.CASCADE, blank=True, null=True)
     project = models.ForeignKey(Project, db_column="public_key", related_name="chats", on_delete=models.CASCADE)
@@ -33,10 +44,14 @@ class Chat(models.Model):
     is_direct_chat = models.BooleanField(default=False, blank=True, null=True)
     custom_json = JSONField(default=dict)
 
-    members_ids = models.CharField(default='[]', max_length=999, editable=False)
+    members_ids = models.TextField(default='[]', editable=False)
+    members_hash = models.CharField(max_length=64, default='', editable=False)
     access_key = models.CharField(default="", max_length=999, editable=True)
     is_authenticated = models.BooleanField(default=True, editable=False)
 
+    last_message = models.ForeignKey('Message', related_name='+', on_delete=models.SET_NULL, blank=True, null=True, editable=False)
+    last_activity = models.DateTimeField(blank=True, null=True, editable=False)
+
     created = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -47,9 +62,20 @@ class Chat(models.Model):
         ordering = ('project', '-id')
         indexes = [
             models.Index(fields=["project", "-id"]),
-            models.Index(fields=["project", "members_ids"]),
+            models.Index(fields=["project", "members_hash"]),
         ]
 
+    def save(self, *args, **kwargs):
+        self.members_hash = get_members_hash(self.members_ids)
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # Membership columns belong to sync_members_ids and the last message pointer to the message
+            # signals, a stale instance mustn't write them back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in DERIVED_FIELDS
+            ]
+        super(Chat, self).save(*args, **kwargs)
+
 
 class Message(models.Model):
     chat = models.ForeignKey(Chat, related_name='messages', on_delete=models.CASCADE, default=None, blank=True, null=True)
@@ -108,6 +134,7 @@ class Attachment(models.Model):
     message = models.ForeignKey(Message, related_name='attachments', on_delete=models.CASCADE)
 
     file = models.FileField(upload_to='attachments', max_length=5000, blank=True, null=True)
+    derivatives = JSONField(default=dict, editable=False)
 
     created = models.DateTimeField(auto_now_add=True)
 
@@ -118,6 +145,17 @@ class Attachment(models.Model):
         ordering = ['chat', '-created']
 
 
+class StoredFile(models.Model):
+    # One object in storage and how many Attachment rows point at it (see chats/stored_files.py)
+    name = models.CharField(max_length=5000, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '{} ({})'.format(self.name, self.references)
+
+
 @receiver(post_save, sender=Chat)
 def post_save_chat(instance, created, **kwargs):
     if created and len(instance.access_key) == 0:
@@ -130,67 +168,139 @@ def post_save_chat(instance, created, **kwargs):
 
     from .serializers import ChatSerializer
     from projects.serializers import ProjectSerializer
-    chat_json = ChatSerializer(instance, many=False).data
-    project_json = ProjectSerializer(instance.project, many=False).data
-    if created:
-        hook.post(event_trigger='On New Chat', project_json=project_json, chat_json=chat_json)
-    else:
-        hook.post(event_trigger='On Edit Chat', project_json=project_json, chat_json=chat_json)
+    hook.enqueue(
+        event_trigger='On New Chat' if created else 'On Edit Chat',
+        project_id=instance.project_id,
+        project_json=lambda: ProjectSerializer(instance.project, many=False).data,
+        chat_json=lambda: ChatSerializer(instance, many=False).data
+    )
 
 
 @receiver(pre_delete, sender=Chat)
 def pre_delete_chat(instance, **kwargs):
     from .serializers import ChatSerializer
     from projects.serializers import ProjectSerializer
-    chat_json = ChatSerializer(instance, many=False).data
-    project_json = ProjectSerializer(instance.project, many=False).data
-    hook.post(event_trigger='On Delete Chat', project_json=project_json, chat_json=chat_json)
+    hook.enqueue(
+        event_trigger='On Delete Chat',
+        project_id=instance.project_id,
+        project_json=lambda: ProjectSerializer(instance.project, many=False).data,
+        chat_json=lambda: ChatSerializer(instance, many=False).data
+    )
 
 
 @receiver(post_save, sender=Message)
 def post_save_message(instance, created, **kwargs):
+    if created and instance.chat_id is not None:
+        # Queryset update so the chat's own save signals (and hooks) don't fire
+        Chat.objects.filter(pk=instance.chat_id).update(last_message=instance, last_activity=instance.created)
+        if Message.chat.is_cached(instance):
+            instance.chat.last_message = instance
+            instance.chat.last_activity = instance.created
+
     from .serializers import MessageSerializer, ChatSerializer
     from projects.serializers import ProjectSerializer
-    message_json = MessageSerializer(instance, many=False).data
-    chat_json = ChatSerializer(instance.chat, many=False).data
-    project_json = ProjectSerializer(instance.chat.project, many=False).data
-    if created:
-        hook.post(event_trigger='On New Message', project_json=project_json, message_json=message_json, chat_json=chat_json)
-    else:
-        hook.post(event_trigger='On Edit Message', project_json=project_json, message_json=message_json, chat_json=chat_json)
+    hook.enqueue(
+        event_trigger='On New Message' if created else 'On Edit Message',
+        project_id=instance.chat.project_id,
+        project_json=lambda: ProjectSerializer(instance.chat.project, many=False).data,
+        chat_json=lambda: ChatSerializer(instance.chat, many=False).data,
+        message_json=lambda: MessageSerializer(instance, many=False).data
+    )
 
 
 @receiver(pre_delete, sender=Message)
 def pre_delete_message(instance, **kwargs):
     from .serializers import MessageSerializer, ChatSerializer
     from projects.serializers import ProjectSerializer
-    message_json = MessageSerializer(instance, many=False).data
-    chat_json = ChatSerializer(instance.chat, many=False).data
-    project_json = ProjectSerializer(instance.chat.project, many=False).data
-    hook.post(event_trigger='On Delete Message', project_json=project_json, message_json=message_json, chat_json=chat_json)
+    hook.enqueue(
+        event_trigger='On Delete Message',
+        project_id=instance.chat.project_id,
+        project_json=lambda: ProjectSerializer(instance.chat.project, many=False).data,
+        chat_json=lambda: ChatSerializer(instance.chat, many=False).data,
+        message_json=lambda: MessageSerializer(instance, many=False).data
+    )
+
+
+@receiver(post_delete, sender=Message)
+def post_delete_message(instance, origin=None, **kwargs):
+    # Cascades from chats, people or projects take the chat along, nothing to re-point
+    if not isinstance(origin, Message) and getattr(origin, 'model', None) is not Message:
+        return
+
+    # SET_NULL has already cleared the pointer if this was the chat's last message
+    repoint_last_message(Chat.objects.filter(pk=instance.chat_id, last_message__isnull=True))
+
+
+# Attachments deleted together (by a cascade from their message, chat or project, or a queryset) release
+# their files in one batch: pre_delete is sent for all of them before any is deleted
+deleted_attachments = threading.local()
+
+
+@receiver(pre_delete, sender=Attachment)
+def pre_delete_attachment(instance, origin=None, **kwargs):
+    if instance.file:
+        batches = deleted_attachments.__dict__.setdefault('batches', {})
+        # Keyed by pk, a delete retried after a rollback collects the same rows again
+        batches.setdefault(id(origin), (origin, {}))[1][instance.pk] = instance.file.name
+
+
+@receiver(post_delete, sender=Attachment)
+def post_delete_attachment(instance, origin=None, **kwargs):
+    # The first one of a delete, by now all of its attachments are gone
+    batch = getattr(deleted_attachments, 'batches', {}).pop(id(origin), None)
+    if batch is not None:
+        from .stored_files import release_files
+        release_files(list(batch[1].values()))
+
+
+def repoint_last_message(chats):
+    latest = Message.objects.filter(chat=OuterRef('pk')).order_by('-id')
+    chats.update(
+        last_message=Subquery(latest.values('pk')[:1]),
+        last_activity=Subquery(latest.values('created')[:1]),
+    )
+
+
+def sync_members_ids(chat_id):
+    """
+    Recomputes members_ids/members_hash from ChatPerson with a queryset update.
+
+    The chat row is locked first, so concurrent membership changes on a chat apply one after the
+    other and each sees the rows the others committed. Nothing else on the chat is written and no
+    chat signals (or hooks) fire.
+
+    The lock is FOR NO KEY UPDATE: inserting a ChatPerson holds FOR KEY SHARE on its chat until
+    commit, which a plain FOR UPDATE would wait on, so two concurrent adds would deadlock.
+    """
+    with transaction.atomic():
+        list(Chat.objects.select_for_update(no_key=True).filter(pk=chat_id).values_list('pk', flat=True))
+        members_ids = str(list(ChatPerson.objects.filter(chat_id=chat_id).order_by('person_id').values_list('person_id', flat=True)))
+        Chat.objects.filter(pk=chat_id).update(members_ids=members_ids, members_hash=get_members_hash(members_ids))
+    return members_ids
 
 
 @receiver(post_save, sender=ChatPerson)
 def post_save_chat_person(instance, created, **kwargs):
     if created:
-        members_ids = json.loads(instance.chat.members_ids)
-        if instance.person.pk not in members_ids:
-            members_ids = sorted(members_ids + [instance.person.pk])
-        instance.chat.members_ids = str(members_ids)
-        instance.chat.save()
-        instance.save()
+        members_ids = sync_members_ids(instance.chat_id)
+        if ChatPerson.chat.is_cached(instance):
+            instance.chat.members_ids = members_ids
+            instance.chat.members_hash = get_members_hash(members_ids)
+
+        from .publishers import chat_publisher
+        chat_publisher.publish_members(instance.chat_id, added=[instance.person_id])
 
 
 @receiver(post_delete, sender=ChatPerson)
-def post_delete_chat_person(instance, **kwargs):
-    try:
-        members_ids = json.loads(instance.chat.members_ids)
-        if instance.person.pk in members_ids:
-            members_ids.remove(instance.person.pk)
-        instance.chat.members_ids = str(members_ids)
-        instance.chat.save()
-        
-    except Chat.DoesNotExist:
-        pass
-    except Person.DoesNotExist:
-        pass
+def post_delete_chat_person(instance, origin=None, **kwargs):
+    from .publishers import chat_publisher
+    chat_publisher.publish_members(instance.chat_id, removed=[instance.person_id])
+
+    # The chat is going too, there's no member list left to keep
+    if isinstance(origin, (Chat, Project)) or getattr(origin, 'model', None) in (Chat, Project):
+        return
+
+    members_ids = sync_members_ids(instance.chat_id)
+    if ChatPerson.chat.is_cached(instance):
+        instance.chat.members_ids = members_ids
+        instance.chat.members_hash = get_members_hash(members_ids)
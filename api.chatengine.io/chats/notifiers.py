@@ -1,18 +1,37 @@
 import os
 from datetime import datetime, timedelta
 
-from python_http_client.exceptions import HTTPError
-
 import pytz
 import sendgrid
 
+from django.conf import settings
+
 from chats.models import Message
 from projects.models import Project
+from projects.presence import load_presence
+
+from server.utils.jobs import job_queue
 
-sg = sendgrid.SendGridAPIClient(os.getenv('SEND_GRID_KEY'))
 FREE_MESSAGE = 'Given your project plan, \
     no emails notifications will be sent for the next five minutes.'
 
+# SendGrid takes up to 1,000 personalizations per request
+BATCH_SIZE = 1000
+
+
+def get_send_grid():
+    # Built per send so SEND_GRID_HOST can point at a local fake
+    return sendgrid.SendGridAPIClient(os.getenv('SEND_GRID_KEY'), host=settings.SEND_GRID_HOST)
+
+
+def send_message_emails(project_id, message_id, emails):
+    # Runs on the job queue, one SendGrid call per batch
+    project = Project.objects.filter(pk=project_id).first()
+    message = Message.objects.filter(pk=message_id).first()
+    if project is None or message is None:
+        return
+    Emailer().send_emails(project=project, message=message, emails=emails)
+
 
 class Emailer():
     def __init__(self):
@@ -21,32 +40,23 @@ class Emailer():
     def needs_throttle(self, project_plan):
         return any(plan in project_plan for plan in ['basic', 'light'])
 
-    def send_email(self, project: Project, message: Message, to_email: str):
+    def send_emails(self, project: Project, message: Message, emails):
+        substitutions = {
+            "-email-": message.sender_username,
+            "-text-": message.text,
+            "-link-": project.email_link,
+            "-free_message-": FREE_MESSAGE if self.needs_throttle(project.plan_type) else ''
+        }
+        subject = "New Message | {}".format(project.email_company_name if project.email_company_name else 'Chat Engine')
         data = {
             "personalizations": [
-                {
-                    "to": [{"email": to_email}],
-                    "subject": "New Message | {}".format(
-                        project.email_company_name if project.email_company_name else 'Chat Engine'
-                    ),
-                    "substitutions": {
-                        "-email-": message.sender_username,
-                        "-text-": message.text,
-                        "-link-": project.email_link,
-                        "-free_message-": FREE_MESSAGE if self.needs_throttle(project.plan_type) else ''
-                    }
-                }
+                {"to": [{"email": email}], "subject": subject, "substitutions": substitutions} for email in emails
             ],
             "from": {"email": project.email_sender},
             "template_id": "bf26cfb3-0460-4c03-a83a-52238cd4c5f1"
         }
-
-        try:
-            sg.client.mail.send.post(request_body=data)
-            return True
-
-        except HTTPError:
-            return False
+        # Raises on a failed call so the job queue retries it
+        get_send_grid().client.mail.send.post(request_body=data)
 
     def email_chat_members(self, project: Project, message: Message, people):
         # Make sure emails are on
@@ -58,19 +68,29 @@ class Emailer():
         if self.needs_throttle(project.plan_type) and now < project.email_last_sent + timedelta(minutes=5):
             return 'Free throttled', []
         
-        # Email every offline message receiver with an email
-        sent_list = []
-        for person in people:
-            if not person.is_online and person is not message.sender and person.email:
-                if self.send_email(project=project, message=message, to_email=person.email):
-                    sent_list.append(person.email)
+        # Email every offline message receiver with an email, presence for all of them in one lookup
+        load_presence(people)
+        sent_list = [
+            person.email for person in people
+            if not person.presence and person is not message.sender and person.email
+        ]
 
         # Make sure users send
         if len(sent_list) == 0:
             return 'No users qualify', sent_list
 
-        # Reset throttle
+        # Reset throttle on the row: project can be a cached instance with a stale email_last_sent, and
+        # saving it would write back stale columns. Throttled plans only claim an expired window, so
+        # of two racing sends only one gets it
+        projects = Project.objects.filter(pk=project.pk)
+        if self.needs_throttle(project.plan_type):
+            projects = projects.filter(email_last_sent__lte=now - timedelta(minutes=5))
+        if projects.update(email_last_sent=now) == 0:
+            return 'Free throttled', []
         project.email_last_sent = now
-        project.save()
+
+        # Sending happens on the run_jobs worker, the request only pays for the enqueue
+        for start in range(0, len(sent_list), BATCH_SIZE):
+            job_queue.enqueue(send_message_emails, str(project.pk), message.pk, sent_list[start:start + BATCH_SIZE])
 
         return 'Success', sent_list
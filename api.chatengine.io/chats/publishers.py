@@ -1,43 +1,192 @@
-import json 
+import json
+import logging
 
-from server.redis import redis_client
+from django.conf import settings
+
+from server.redis import redis_client, redis_cache
 from chats.models import ChatPerson
 
+logger = logging.getLogger(__name__)
+
+# Membership changes for the gateway's index when CHAT_BROADCAST_MODE is on
+MEMBERS_CHANNEL = 'chat_members'
+
+# Stamps the event with the channel's next seq, appends it to the channel's log and publishes it, atomically.
+# The seq is the log's last entry id + 1, so it keeps counting after MAXLEN trims old entries.
+SEQUENCED_PUBLISH = """
+local last = redis.call('XREVRANGE', KEYS[1], '+', '-', 'COUNT', 1)
+local seq = 1
+if #last > 0 then
+    seq = tonumber(string.match(last[1][1], '^%d+')) + 1
+end
+local message = '{"seq": ' .. seq .. ', ' .. string.sub(ARGV[2], 2)
+redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[3], seq .. '-0', 'message', message)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return redis.call('PUBLISH', ARGV[1], message)
+"""
+sequenced_publish = redis_client.register_script(SEQUENCED_PUBLISH)
+
+# A chat-wide event: logged with its payload once, in the chat's log, and stamped and published for the
+# chat and each member (KEYS[2..], channels in ARGV[5..]). Members' logs only note which chat entry it was,
+# so a chat's events cost its members' logs O(members) between them, not O(members x payload).
+LOGGED_ONCE_PUBLISH = """
+local function next_seq(key)
+    local last = redis.call('XREVRANGE', key, '+', '-', 'COUNT', 1)
+    if #last > 0 then
+        return tonumber(string.match(last[1][1], '^%d+')) + 1
+    end
+    return 1
+end
+local function stamp(seq)
+    return '{"seq": ' .. seq .. ', ' .. string.sub(ARGV[2], 2)
+end
+
+local chat_seq = next_seq(KEYS[1])
+local message = stamp(chat_seq)
+redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[3], chat_seq .. '-0', 'message', message)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+local receivers = {redis.call('PUBLISH', ARGV[1], message)}
+
+for i = 2, #KEYS do
+    local seq = next_seq(KEYS[i])
+    redis.call('XADD', KEYS[i], 'MAXLEN', '~', ARGV[3], seq .. '-0', 'ref', KEYS[1], 'ref_seq', chat_seq)
+    redis.call('EXPIRE', KEYS[i], ARGV[4])
+    receivers[i] = redis.call('PUBLISH', ARGV[i + 3], stamp(seq))
+end
+return receivers
+"""
+logged_once_publish = redis_client.register_script(LOGGED_ONCE_PUBLISH)
+
+
 def get_people_ids_in_chat(chat_id):
-        chat_people = ChatPerson.objects.filter(chat=chat_id)
-        return [chat_person.person_id for chat_person in chat_people]
+    return list(ChatPerson.objects.filter(chat=chat_id).values_list('person_id', flat=True))
+
+
+def get_person_chats_key(person_id):
+    return f"person_chats:{person_id}"
+
+
+def get_events_key(channel):
+    return f"events:{channel}"
+
+
+def publish_sequenced(pipeline, channel, message):
+    sequenced_publish(
+        keys=[get_events_key(channel)],
+        args=[channel, message, settings.CHAT_EVENT_LOG_LENGTH, settings.CHAT_EVENT_LOG_TTL],
+        client=pipeline
+    )
+
+
+def publish_logged_once(chat_id, people_ids, message):
+    channels = [f"person:{person_id}" for person_id in people_ids]
+    return logged_once_publish(
+        keys=[get_events_key(f"chat:{chat_id}")] + [get_events_key(channel) for channel in channels],
+        args=[f"chat:{chat_id}", message, settings.CHAT_EVENT_LOG_LENGTH, settings.CHAT_EVENT_LOG_TTL] + channels
+    )
+
+
+def read_events(channel, after_seq=0):
+    """
+    Returns the logged events of a channel with a seq above after_seq, oldest first.
+
+    None means the log can't fill the gap (it was trimmed past after_seq or has expired), and the
+    client has to fetch the current state instead.
+    """
+    key = get_events_key(channel)
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.xrange(key, count=1)
+    pipeline.xrevrange(key, count=1)
+    pipeline.xrange(key, min=f'({after_seq}-0')
+    first, last, entries = pipeline.execute()
+
+    if len(last) == 0:
+        return None if after_seq > 0 else []
+    # Trimmed past the client's seq, or the log expired and restarted below it
+    if get_seq(first[0][0]) > after_seq + 1 or get_seq(last[0][0]) < after_seq:
+        return None
+
+    # Entries logged once (see LOGGED_ONCE_PUBLISH) are read from the chat's log
+    pipeline = redis_client.pipeline(transaction=False)
+    for _, fields in entries:
+        if b'ref' in fields:
+            ref_id = fields[b'ref_seq'] + b'-0'
+            pipeline.xrange(fields[b'ref'], min=ref_id, max=ref_id)
+    refs = iter(pipeline.execute())
+
+    events = []
+    for entry_id, fields in entries:
+        if b'ref' in fields:
+            ref = next(refs)
+            # The chat's log was trimmed past it (or expired)
+            if len(ref) == 0:
+                return None
+            fields = ref[0][1]
+        event = json.loads(fields[b'message'])
+        event['seq'] = get_seq(entry_id)
+        events.append(event)
+    return events
+
+
+def get_seq(entry_id):
+    return int(entry_id.split(b'-')[0])
+
 
 class ChatPublisher:
     def __init__(self):
         pass
 
     @staticmethod
-    def publish_chat_data(action, chat_data, people_ids=None):
-        if people_ids is None:
-            people_ids = get_people_ids_in_chat(chat_id=chat_data['id'])
+    def publish(action, chat_id, data, people_ids=None):
+        message = json.dumps({"action": action, "data": data})
 
-        message = json.dumps({"action": action, "data": chat_data})
+        # One round trip for the whole fan-out instead of one per member, each channel gets its own seq
+        if settings.CHAT_BROADCAST_MODE:
+            # The gateway forwards chat:<id> to its connected members, only targeted events go to people
+            pipeline = redis_client.pipeline(transaction=False)
+            if people_ids is None:
+                publish_sequenced(pipeline, f"chat:{chat_id}", message)
+            else:
+                for person_id in people_ids:
+                    publish_sequenced(pipeline, f"person:{person_id}", message)
+            receivers = pipeline.execute()
+        else:
+            if people_ids is None:
+                people_ids = get_people_ids_in_chat(chat_id=chat_id)
+            receivers = publish_logged_once(chat_id, people_ids, message)
 
-        for person_id in people_ids:
-            print(f"Publishing to person:{str(person_id)}")
-            result = redis_client.publish(f"person:{str(person_id)}", message)
-            print(f"Published to person:{str(person_id)}: {result}")
+        if logger.isEnabledFor(logging.DEBUG):
+            people = len(people_ids) if people_ids is not None else 0
+            logger.debug(
+                'Published %s to chat:%s and %d people (%d receivers)',
+                action, chat_id, people, sum(receivers),
+                extra={'action': action, 'chat_id': chat_id, 'people': people, 'receivers': sum(receivers)}
+            )
+        return receivers
 
-        redis_client.publish(f"chat:{str(chat_data['id'])}", message)
+    @staticmethod
+    def publish_chat_data(action, chat_data, people_ids=None):
+        return ChatPublisher.publish(action, chat_data['id'], chat_data, people_ids=people_ids)
 
     @staticmethod
     def publish_message_data(action, chat, message_data, people_ids=None):
-        if people_ids is None:
-            people_ids = get_people_ids_in_chat(chat_id=chat.id)
-        
         data = {"id": chat.pk, "message": message_data}
-        message = json.dumps({"action": action, "data": data})
+        return ChatPublisher.publish(action, chat.pk, data, people_ids=people_ids)
+
+    @staticmethod
+    def publish_members(chat_id, added=(), removed=()):
+        if not settings.CHAT_BROADCAST_MODE:
+            return
+
+        # The sets seed the index when a person connects, the event keeps it current afterwards
+        pipeline = redis_cache.pipeline(transaction=False)
+        for person_id in added:
+            pipeline.sadd(get_person_chats_key(person_id), chat_id)
+        for person_id in removed:
+            pipeline.srem(get_person_chats_key(person_id), chat_id)
+        pipeline.execute()
+
+        redis_client.publish(MEMBERS_CHANNEL, json.dumps({"id": chat_id, "added": list(added), "removed": list(removed)}))
 
-        for person_id in people_ids:
-            print(f"Publishing to person:{str(person_id)}")
-            result = redis_client.publish(f"person:{str(person_id)}", message)
-            print(f"Published to person:{str(person_id)}: {result}")
-        
-        redis_client.publish(f"chat:{str(chat.pk)}", message)
 
 chat_publisher = ChatPublisher()
@@ -1,7 +1,12 @@
+from django.db.models import prefetch_related_objects
+
 from rest_framework import serializers
 from rest_framework.fields import DateTimeField
 
-from projects.serializers import PersonPublicSerializer
+from projects.presence import load_presence
+from projects.serializers import PersonPublicSerializer, PresenceListSerializer, get_avatar_files
+
+from server.utils.files import DerivativesField, SignedFileField, get_stored_files, load_signed_urls
 
 from .models import Chat, ChatPerson, Message, Attachment
 
@@ -11,12 +16,28 @@ class PersonSearchSerializer(serializers.Serializer):
 
 
 class AttachmentSerializer(serializers.ModelSerializer):
+    file = SignedFileField(max_length=5000, required=False, allow_null=True)
+    derivatives = DerivativesField('file', 'derivatives')
 
     class Meta(object):
         model = Attachment
         exclude = ['chat', 'message']
 
 
+def get_attachment_files(attachments):
+    return [file for attachment in attachments for file in get_stored_files(attachment, 'file', 'derivatives')]
+
+
+class MessageListSerializer(PresenceListSerializer):
+    def get_people(self, items):
+        return [message.sender for message in items]
+
+    def get_files(self, items):
+        prefetch_related_objects(items, 'attachments')
+        attachments = [attachment for message in items for attachment in message.attachments.all()]
+        return super().get_files(items) + get_attachment_files(attachments)
+
+
 class MessageSerializer(serializers.ModelSerializer):
     sender = PersonPublicSerializer(read_only=True, many=False, required=False)
     created = serializers.CharField(required=False)
@@ -26,6 +47,12 @@ class MessageSerializer(serializers.ModelSerializer):
     class Meta(object):
         model = Message
         exclude = ['chat']
+        list_serializer_class = MessageListSerializer
+
+
+class ChatPersonListSerializer(PresenceListSerializer):
+    def get_people(self, items):
+        return [chat_person.person for chat_person in items]
 
 
 class ChatPersonSerializer(serializers.ModelSerializer):
@@ -34,6 +61,42 @@ class ChatPersonSerializer(serializers.ModelSerializer):
     class Meta(object):
         model = ChatPerson
         exclude = ['id', 'chat']
+        list_serializer_class = ChatPersonListSerializer
+
+
+def get_chat_people(chats):
+    for chat in chats:
+        yield chat.admin
+        for chat_person in chat.people.all():
+            yield chat_person.person
+        if chat.last_message is not None:
+            yield chat.last_message.sender
+
+
+def get_chat_attachments(chats):
+    for chat in chats:
+        yield from chat.attachments.all()
+        if chat.last_message is not None:
+            yield from chat.last_message.attachments.all()
+
+
+class ChatListSerializer(serializers.ListSerializer):
+    # Everything ChatSerializer touches, resolved in one query per relation for the whole page
+    prefetch = [
+        'admin',
+        'people__person',
+        'attachments',
+        'last_message__sender',
+        'last_message__attachments',
+    ]
+
+    def to_representation(self, data):
+        chats = list(data.all() if hasattr(data, 'all') else data)
+        prefetch_related_objects(chats, *self.prefetch)
+        people = list(get_chat_people(chats))
+        load_presence(people)
+        load_signed_urls(get_avatar_files(people) + get_attachment_files(get_chat_attachments(chats)))
+        return super().to_representation(chats)
 
 
 class ChatSerializer(serializers.ModelSerializer):
@@ -43,14 +106,13 @@ class ChatSerializer(serializers.ModelSerializer):
     last_message = serializers.SerializerMethodField(required=False)
 
     def get_last_message(self, obj):
-        query = Message.objects.filter(chat=obj)
-        message = query.first() if len(query) > 0 else None
-        serializer = MessageSerializer(message, many=False)
+        serializer = MessageSerializer(obj.last_message, many=False)
         return serializer.data
 
     class Meta(object):
         model = Chat
-        exclude = ['project', 'members_ids']
+        exclude = ['project', 'members_ids', 'members_hash']
+        list_serializer_class = ChatListSerializer
 
 
 class ChatActiveSinceSerializer(serializers.Serializer):
@@ -0,0 +1,118 @@
+import os
+import hashlib
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from storages.utils import clean_name
+
+from server.utils.images import get_derivative_name
+from server.utils.jobs import job_queue
+
+from .membership import chunks
+from .models import Attachment, StoredFile
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_storage():
+    return Attachment._meta.get_field('file').storage
+
+
+def get_content_name(digest, file_name):
+    # attachments/<sha256>/<file name>: the same file sent again maps to the same object
+    field = Attachment._meta.get_field('file')
+    return field.generate_filename(None, '{}/{}'.format(digest, os.path.basename(file_name or '') or 'attachment'))
+
+
+def hash_file(content):
+    # sha256 of an uploaded file, rewound so it can be read again
+    digest = hashlib.sha256()
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def store_file(content, digest=None):
+    """
+    Stores an attachment's content by hash and returns its storage name, counting one reference.
+
+    Identical content under the same file name is only written once. Call it in the transaction
+    that creates the Attachment row, so the reference and the row commit (or roll back) together.
+    """
+    if digest is None:
+        digest = hash_file(content)
+    name = get_content_name(digest, content.name)
+    add_reference(name, content)
+    return name
+
+
+def copy_file(storage, source, name):
+    # S3 copies inside the bucket, other storages read the object back
+    if hasattr(storage, 'bucket_name'):
+        storage.connection.meta.client.copy_object(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(clean_name(name)),
+            CopySource={'Bucket': storage.bucket_name, 'Key': storage._normalize_name(clean_name(source))}
+        )
+        return
+    with storage.open(source, 'rb') as content:
+        storage.save(name, content, max_length=StoredFile._meta.get_field('name').max_length)
+
+
+def add_reference(name, content=None, source=None):
+    """
+    Counts one more reference to name, writing the object first when nothing holds it.
+
+    The object comes from content, or is copied from the storage name source (an object already
+    uploaded somewhere else, like a fetched URL's staging copy). Without either (direct uploads)
+    the object is already in the bucket, it's only counted.
+    """
+    storage = get_storage()
+    with transaction.atomic():
+        StoredFile.objects.get_or_create(name=name)
+        stored = StoredFile.objects.select_for_update().get(name=name)
+        # Unreferenced objects may have been deleted, a pending delete sees this reference and stops
+        if stored.references == 0 and (content is not None or source is not None) and not storage.exists(name):
+            if content is not None:
+                storage.save(name, content, max_length=StoredFile._meta.get_field('name').max_length)
+            else:
+                copy_file(storage, source, name)
+        StoredFile.objects.filter(pk=stored.pk).update(references=F('references') + 1)
+
+
+def release_files(names, chunk_size=500):
+    """
+    Drops one reference per name (a name can repeat). Objects left without references, along with
+    their derivatives, are deleted by the job queue once the transaction commits.
+    """
+    counts = Counter(name for name in names if name)
+    released = []
+    with transaction.atomic():
+        for chunk in chunks(counts, chunk_size):
+            # Locked in pk order so concurrent releases can't deadlock
+            for stored in StoredFile.objects.select_for_update().filter(name__in=chunk).order_by('pk'):
+                references = max(stored.references - counts[stored.name], 0)
+                StoredFile.objects.filter(pk=stored.pk).update(references=references)
+                if references == 0:
+                    released.append(stored.name)
+
+        if len(released) > 0:
+            transaction.on_commit(lambda: job_queue.enqueue(delete_unreferenced_files, released))
+
+
+def delete_unreferenced_files(names):
+    # Runs on the job queue. The rows stay (at zero) so add_reference always has one to lock
+    storage = get_storage()
+    for name in names:
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(name=name).first()
+            if stored is None or stored.references > 0:
+                continue
+            storage.delete(name)
+            for label in settings.ATTACHMENT_DERIVATIVES:
+                storage.delete(get_derivative_name(name, label))
@@ -0,0 +1,106 @@
+import io
+import os
+import tempfile
+
+from django.test import override_settings
+from rest_framework.test import APITestCase, RequestsClient
+
+from PIL import Image
+
+from chats.models import Person, Chat, Message, Attachment
+from projects.models import User, Project
+
+from server.utils.images import render_derivatives
+from server.utils.jobs import job_queue
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+
+
+def get_image_bytes(size, format='PNG', mode='RGB', color='red'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, format)
+    return buffer.getvalue()
+
+
+@override_settings(ATTACHMENT_DERIVATIVES={'thumbnail': 32, 'preview': 128})
+class AttachmentDerivativesTestCase(APITestCase):
+    def setUp(self):
+        job_queue.clear()
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title='Chat')
+
+        self.media = tempfile.TemporaryDirectory()
+        # MEDIA_ROOT, not OPTIONS: Django 5.0 drops the OPTIONS of an overridden default storage
+        storages = override_settings(MEDIA_ROOT=self.media.name, STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storages.enable()
+        self.addCleanup(storages.disable)
+        self.addCleanup(self.media.cleanup)
+
+    def tearDown(self):
+        job_queue.clear()
+
+    def headers(self):
+        return {"public-key": str(self.project.public_key), "user-name": USER, "user-secret": PASSWORD}
+
+    def test_image_attachments_get_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = RequestsClient().post(
+                'http://127.0.0.1:8000/chats/{}/messages/'.format(self.chat.pk),
+                headers=self.headers(),
+                data={'text': 'Files'},
+                files=[
+                    ('attachments', ('photo.png', get_image_bytes((400, 200)), 'image/png')),
+                    ('attachments', ('notes.txt', b'not an image', 'text/plain')),
+                ]
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([attachment['derivatives'] for attachment in response.json()['attachments']], [{}, {}])
+        self.assertEqual(job_queue.depth(), 1)
+        self.assertEqual(job_queue.drain(), {'succeeded': 1, 'failed': 0})
+
+        photo = Attachment.objects.get(message=response.json()['id'], file__endswith='.png')
+        self.assertEqual(photo.derivatives['source'], photo.file.name)
+        self.assertEqual(sorted(photo.derivatives['sizes']), ['preview', 'thumbnail'])
+        with photo.file.storage.open(photo.derivatives['sizes']['thumbnail']) as thumbnail:
+            image = Image.open(thumbnail)
+            self.assertEqual((image.format, image.size), ('WEBP', (32, 16)))
+        self.assertEqual(os.path.dirname(photo.derivatives['sizes']['preview']), os.path.dirname(photo.file.name))
+
+        notes = Attachment.objects.get(message=response.json()['id'], file__endswith='.txt')
+        self.assertEqual(notes.derivatives, {})
+
+        response = RequestsClient().get(
+            'http://127.0.0.1:8000/chats/{}/messages/'.format(self.chat.pk), headers=self.headers()
+        )
+        attachments = {os.path.splitext(attachment['file'])[1]: attachment for attachment in response.json()[0]['attachments']}
+        self.assertEqual(sorted(attachments['.png']['derivatives']), ['preview', 'thumbnail'])
+        self.assertTrue(attachments['.png']['derivatives']['thumbnail'].endswith('.thumbnail.webp'))
+        self.assertEqual(attachments['.txt']['derivatives'], {})
+
+    def test_unreadable_images_are_not_retried(self):
+        message = Message.objects.create(chat=self.chat, sender=self.person, text='Files')
+        name = Attachment._meta.get_field('file').storage.save('attachments/broken.png', io.BytesIO(b'not a png'))
+        attachment = Attachment.objects.create(chat=self.chat, message=message, file=name)
+
+        from chats.attachments import generate_attachment_derivatives
+        generate_attachment_derivatives([attachment.pk])
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.derivatives, {'source': name, 'sizes': {}})
+
+    def test_render_derivatives(self):
+        rendered = render_derivatives(get_image_bytes((1000, 500), 'JPEG'), {'small': 64, 'large': 2000}, 80)
+        sizes = {label: Image.open(io.BytesIO(data)).size for label, data in rendered.items()}
+        self.assertEqual(sizes, {'small': (64, 32), 'large': (1000, 500)})
+
+        # Partly transparent, libwebp drops an alpha channel that is opaque everywhere
+        rendered = render_derivatives(get_image_bytes((100, 100), mode='RGBA', color=(255, 0, 0, 128)), {'small': 10}, 80)
+        self.assertEqual(Image.open(io.BytesIO(rendered['small'])).mode, 'RGBA')
+
+        self.assertIsNone(render_derivatives(b'not an image', {'small': 64}, 80))
@@ -0,0 +1,98 @@
+import io
+
+from django.db import connection
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from chats.models import Person, Chat, Message
+from chats.serializers import ChatSerializer
+from projects.models import User, Project
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+CHAT = "Chat Engine Chat"
+
+
+class ChatLastMessageTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title=CHAT)
+
+    def test_new_message_moves_pointer(self):
+        self.assertIsNone(Chat.objects.get(pk=self.chat.pk).last_message)
+
+        Message.objects.create(chat=self.chat, sender=self.person, text='first')
+        message = Message.objects.create(chat=self.chat, sender=self.person, text='second')
+
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertEqual(chat.last_message, message)
+        self.assertEqual(chat.last_activity, message.created)
+        self.assertEqual(self.chat.last_message, message)
+        self.assertEqual(ChatSerializer(chat).data['last_message']['text'], 'second')
+
+    def test_stale_chat_save_keeps_pointer(self):
+        stale = Chat.objects.get(pk=self.chat.pk)
+        message = Message.objects.create(chat=self.chat, sender=self.person, text='first')
+
+        stale.title = 'Renamed'
+        stale.save()
+
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertEqual(chat.title, 'Renamed')
+        self.assertEqual(chat.last_message, message)
+        self.assertEqual(chat.last_activity, message.created)
+
+    def test_edit_message_keeps_pointer(self):
+        message = Message.objects.create(chat=self.chat, sender=self.person, text='first')
+        message.text = 'edited'
+        message.save()
+
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertEqual(chat.last_message, message)
+        self.assertEqual(ChatSerializer(chat).data['last_message']['text'], 'edited')
+
+    def test_delete_messages_moves_pointer_back(self):
+        first = Message.objects.create(chat=self.chat, sender=self.person, text='first')
+        second = Message.objects.create(chat=self.chat, sender=self.person, text='second')
+
+        first.delete()
+        self.assertEqual(Chat.objects.get(pk=self.chat.pk).last_message, second)
+
+        second.delete()
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertIsNone(chat.last_message)
+        self.assertIsNone(chat.last_activity)
+
+        third = Message.objects.create(chat=self.chat, sender=self.person, text='third')
+        fourth = Message.objects.create(chat=self.chat, sender=self.person, text='fourth')
+        fourth.delete()
+        self.assertEqual(Chat.objects.get(pk=self.chat.pk).last_message, third)
+
+    def test_serializer_queries_do_not_grow_with_history(self):
+        Message.objects.create(chat=self.chat, sender=self.person, text='only one')
+        with CaptureQueriesContext(connection) as short_history:
+            ChatSerializer(Chat.objects.get(pk=self.chat.pk)).data
+
+        for i in range(50):
+            Message.objects.create(chat=self.chat, sender=self.person, text=str(i))
+        with CaptureQueriesContext(connection) as long_history:
+            ChatSerializer(Chat.objects.get(pk=self.chat.pk)).data
+
+        self.assertEqual(len(short_history), len(long_history))
+
+    def test_backfill_last_message(self):
+        Message.objects.create(chat=self.chat, sender=self.person, text='first')
+        message = Message.objects.create(chat=self.chat, sender=self.person, text='second')
+        empty_chat = Chat.objects.create(project=self.project, admin=self.person, title='Empty')
+        Chat.objects.update(last_message=None, last_activity=None)
+
+        call_command('backfill_last_message', batch_size=1, stdout=io.StringIO())
+
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertEqual(chat.last_message, message)
+        self.assertEqual(chat.last_activity, message.created)
+        self.assertIsNone(Chat.objects.get(pk=empty_chat.pk).last_message)
@@ -0,0 +1,137 @@
+import threading
+
+from django.db import connection, transaction
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from chats.models import Person, Chat, ChatPerson, get_members_hash, sync_members_ids
+from projects.models import User, Project
+
+from webhooks.models import Webhook, WebhookDelivery
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+URL = 'http://127.0.0.1:8000/webhooks/test/'
+
+
+class ChatMembersIdsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.admin = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.people = [
+            Person.objects.create(project=self.project, username='person_{}'.format(i), secret=PASSWORD)
+            for i in range(3)
+        ]
+        self.chat = Chat.objects.create(project=self.project, admin=self.admin, title='Chat')
+
+    def members_ids(self):
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertEqual(chat.members_hash, get_members_hash(chat.members_ids))
+        return chat.members_ids
+
+    def expected(self, people):
+        return str(sorted([self.admin.pk] + [person.pk for person in people]))
+
+    def test_interleaved_adds_keep_every_member(self):
+        # Two requests load the chat, then each adds a member: the second used to write back a stale list
+        first, second = Chat.objects.get(pk=self.chat.pk), Chat.objects.get(pk=self.chat.pk)
+        ChatPerson.objects.create(chat=first, person=self.people[0])
+        ChatPerson.objects.create(chat=second, person=self.people[1])
+
+        self.assertEqual(self.members_ids(), self.expected(self.people[:2]))
+        self.assertEqual(second.members_ids, self.expected(self.people[:2]))
+
+    def test_interleaved_add_and_remove(self):
+        ChatPerson.objects.create(chat=self.chat, person=self.people[0])
+        first, second = Chat.objects.get(pk=self.chat.pk), Chat.objects.get(pk=self.chat.pk)
+        ChatPerson.objects.create(chat=first, person=self.people[1])
+        ChatPerson.objects.get(chat=second, person=self.people[0]).delete()
+
+        self.assertEqual(self.members_ids(), self.expected(self.people[1:2]))
+
+    def test_stale_chat_save_keeps_members(self):
+        stale = Chat.objects.get(pk=self.chat.pk)
+        ChatPerson.objects.create(chat=self.chat, person=self.people[0])
+
+        stale.title = 'Renamed'
+        stale.save()
+
+        self.assertEqual(self.members_ids(), self.expected(self.people[:1]))
+        self.assertEqual(Chat.objects.get(pk=self.chat.pk).title, 'Renamed')
+
+    def test_adding_members_only_touches_members_columns(self):
+        Webhook.objects.create(project=self.project, event_trigger='On Edit Chat', url=URL)
+        stale = Chat.objects.get(pk=self.chat.pk)
+        Chat.objects.filter(pk=self.chat.pk).update(title='Renamed')
+
+        with CaptureQueriesContext(connection) as context:
+            for person in self.people:
+                ChatPerson.objects.create(chat=stale, person=person)
+
+        updates = [q['sql'] for q in context.captured_queries if q['sql'].startswith('UPDATE "chats_chat"')]
+        self.assertEqual(len(updates), 3)
+        self.assertTrue(all('"title"' not in sql for sql in updates))
+        self.assertEqual(Chat.objects.get(pk=self.chat.pk).title, 'Renamed')
+        self.assertEqual(WebhookDelivery.objects.filter(event_trigger='On Edit Chat').count(), 0)
+        self.assertEqual(self.members_ids(), self.expected(self.people))
+
+    def test_person_delete_updates_members(self):
+        for person in self.people:
+            ChatPerson.objects.create(chat=self.chat, person=person)
+
+        self.people[1].delete()
+
+        self.assertEqual(self.members_ids(), self.expected([self.people[0], self.people[2]]))
+
+    def test_chat_delete_skips_member_updates(self):
+        for person in self.people:
+            ChatPerson.objects.create(chat=self.chat, person=person)
+
+        with CaptureQueriesContext(connection) as context:
+            self.chat.delete()
+
+        self.assertEqual([q for q in context.captured_queries if q['sql'].startswith('UPDATE "chats_chat"')], [])
+
+
+@skipUnlessDBFeature('has_select_for_no_key_update')
+class ConcurrentChatMembersIdsTestCase(TransactionTestCase):
+    # Real concurrency needs row locks, which SQLite doesn't have (runs against Postgres)
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.admin = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.people = [
+            Person.objects.create(project=self.project, username='person_{}'.format(i), secret=PASSWORD)
+            for i in range(2)
+        ]
+        self.chat = Chat.objects.create(project=self.project, admin=self.admin, title='Chat')
+
+    def test_concurrent_adds_on_two_connections(self):
+        # Both inserts hold FOR KEY SHARE on the chat before either syncs, a FOR UPDATE lock deadlocked here
+        inserted = threading.Barrier(2, timeout=10)
+        errors = []
+
+        def add(person):
+            try:
+                with transaction.atomic():
+                    ChatPerson.objects.bulk_create([ChatPerson(chat=self.chat, person=person)])
+                    inserted.wait()
+                    sync_members_ids(self.chat.pk)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add, args=(person,)) for person in self.people]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        self.assertEqual(errors, [])
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertEqual(chat.members_ids, str(sorted([self.admin.pk] + [person.pk for person in self.people])))
+        self.assertEqual(chat.members_hash, get_members_hash(chat.members_ids))
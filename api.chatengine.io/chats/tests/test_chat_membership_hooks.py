@@ -0,0 +1,79 @@
+from rest_framework.test import APITestCase, RequestsClient
+
+from chats.models import Person, Chat, ChatPerson
+from projects.models import User, Project
+from webhooks.models import Webhook, WebhookDelivery
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+URL = 'https://example.com/hook'
+
+
+class ChatMembershipHooksTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.people = [
+            Person.objects.create(project=self.project, username='person_{}'.format(i), secret=PASSWORD)
+            for i in range(3)
+        ]
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title='Chat')
+        for trigger in ['On New Chat', 'On Edit Chat']:
+            Webhook.objects.create(project=self.project, event_trigger=trigger, url=URL)
+        WebhookDelivery.objects.all().delete()
+
+    def headers(self, username=USER):
+        return {"public-key": str(self.project.public_key), "user-name": username, "user-secret": PASSWORD}
+
+    def edits(self):
+        # The member usernames of each 'On Edit Chat' payload
+        return [
+            sorted(item['person']['username'] for item in delivery.payload['chat']['people'])
+            for delivery in WebhookDelivery.objects.filter(event_trigger='On Edit Chat').order_by('pk')
+        ]
+
+    def test_adding_a_person_sends_one_edit(self):
+        url = 'http://127.0.0.1:8000/chats/{}/people/'.format(self.chat.pk)
+        response = RequestsClient().post(url, headers=self.headers(), json={'username': 'person_0'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.edits(), [[USER, 'person_0']])
+
+        # Already a member, nothing changed
+        RequestsClient().post(url, headers=self.headers(), json={'username': 'person_0'})
+        self.assertEqual(len(self.edits()), 1)
+
+    def test_removing_a_person_sends_one_edit(self):
+        ChatPerson.objects.create(chat=self.chat, person=self.people[0])
+
+        response = RequestsClient().put(
+            'http://127.0.0.1:8000/chats/{}/people/'.format(self.chat.pk), headers=self.headers(), json={'username': 'person_0'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.edits(), [[USER]])
+
+    def test_leaving_sends_one_edit(self):
+        ChatPerson.objects.create(chat=self.chat, person=self.people[0])
+
+        response = RequestsClient().delete(
+            'http://127.0.0.1:8000/chats/{}/people/'.format(self.chat.pk), headers=self.headers('person_0')
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.edits(), [[USER]])
+
+    def test_get_or_create_sends_the_members(self):
+        usernames = [person.username for person in self.people]
+        response = RequestsClient().put('http://127.0.0.1:8000/chats/', headers=self.headers(), json={'usernames': usernames})
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(WebhookDelivery.objects.filter(event_trigger='On New Chat').count(), 1)
+        self.assertEqual(self.edits()[-1], sorted([USER] + usernames))
+
+    def test_get_or_create_with_invalid_fields_still_sends_the_members(self):
+        usernames = [person.username for person in self.people]
+        response = RequestsClient().put(
+            'http://127.0.0.1:8000/chats/', headers=self.headers(), json={'usernames': usernames, 'is_direct_chat': 'maybe'}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.edits()[-1], sorted([USER] + usernames))
@@ -0,0 +1,117 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, RequestsClient
+
+from chats.membership import get_people_ids, replace_members
+from chats.models import Person, Chat, ChatPerson, get_members_hash
+from projects.models import User, Project
+
+from webhooks.models import Webhook, WebhookDelivery
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+URL = 'http://127.0.0.1:8000/webhooks/test/'
+
+
+class ChatMembershipReplaceTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.token, created = Token.objects.get_or_create(user=self.user)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.admin = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.chat = Chat.objects.create(project=self.project, admin=self.admin, title='Chat')
+        self.client = RequestsClient()
+
+    def create_people(self, count):
+        Person.objects.bulk_create([
+            Person(project=self.project, username='person_{}'.format(i), secret=PASSWORD) for i in range(count)
+        ])
+        return list(Person.objects.filter(project=self.project).exclude(pk=self.admin.pk).order_by('pk'))
+
+    def members_ids(self):
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertEqual(chat.members_hash, get_members_hash(chat.members_ids))
+        return chat.members_ids
+
+    def put(self, usernames):
+        return self.client.put(
+            'http://127.0.0.1:8000/projects/{}/chats/{}/'.format(self.project.pk, self.chat.pk),
+            json={"people": [{'person': username} for username in usernames]},
+            headers={"authorization": 'Token {}'.format(self.token.key)}
+        )
+
+    def test_replace_returns_diff(self):
+        people = self.create_people(3)
+
+        added, removed = replace_members(self.chat, [people[0].pk, people[1].pk])
+
+        self.assertEqual(added, [people[0].pk, people[1].pk])
+        self.assertEqual(removed, [self.admin.pk])
+        self.assertEqual(self.members_ids(), str([people[0].pk, people[1].pk]))
+        self.assertEqual(self.chat.members_ids, str([people[0].pk, people[1].pk]))
+
+    def test_replace_sends_one_edit_hook(self):
+        Webhook.objects.create(project=self.project, event_trigger='On Edit Chat', url=URL)
+        people = self.create_people(10)
+
+        response = self.put([person.username for person in people])
+
+        self.assertEqual(response.status_code, 200)
+        deliveries = WebhookDelivery.objects.filter(event_trigger='On Edit Chat')
+        self.assertEqual(deliveries.count(), 1)
+        self.assertEqual(len(deliveries[0].payload['chat']['people']), 10)
+
+    def test_unchanged_members_send_no_hook(self):
+        Webhook.objects.create(project=self.project, event_trigger='On Edit Chat', url=URL)
+
+        self.assertEqual(replace_members(self.chat, [self.admin.pk]), ([], []))
+        self.assertEqual(WebhookDelivery.objects.count(), 0)
+
+    def test_bad_username_changes_nothing(self):
+        people = self.create_people(2)
+
+        response = self.put([people[0].username, 'not a user'])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(ChatPerson.objects.filter(chat=self.chat).values_list('person_id', flat=True)), [self.admin.pk])
+
+    def test_get_people_ids_names_missing(self):
+        with self.assertRaises(Person.DoesNotExist):
+            get_people_ids(self.project, [USER, 'not a user'])
+
+    def test_query_count_is_constant(self):
+        people = self.create_people(40)
+
+        with CaptureQueriesContext(connection) as small:
+            replace_members(self.chat, [person.pk for person in people[:4]])
+        with CaptureQueriesContext(connection) as large:
+            replace_members(self.chat, [person.pk for person in people[4:]])
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(self.members_ids(), str([person.pk for person in people[4:]]))
+
+    def test_replace_five_thousand_members(self):
+        people = self.create_people(5000)
+        replace_members(self.chat, [person.pk for person in people[:2500]])
+
+        added, removed = replace_members(self.chat, [person.pk for person in people[1000:]])
+
+        self.assertEqual((len(added), len(removed)), (2500, 1000))
+        self.assertEqual(ChatPerson.objects.filter(chat=self.chat).count(), 4000)
+        self.assertEqual(self.members_ids(), str([person.pk for person in people[1000:]]))
+
+    def test_put_query_count_is_constant(self):
+        # The response and edit_chat payload list every member, without a query per person
+        people = self.create_people(61)
+        self.put([people[60].username])  # Warms the project cache
+
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.put([person.username for person in people[:5]]).status_code, 200)
+        with CaptureQueriesContext(connection) as large:
+            response = self.put([person.username for person in people[5:60]])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['people']), 55)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
@@ -0,0 +1,127 @@
+import os
+import tempfile
+
+from unittest import mock
+
+from django.test import override_settings
+from redis.exceptions import RedisError
+from rest_framework.test import APITestCase, RequestsClient
+
+from chats import attachments as attachments_module
+from chats.attachments import AttachmentFetcher, AttachmentTooLarge, StreamedFile, get_file_name
+from chats.models import Person, Chat, Message, Attachment
+from projects.models import User, Project
+
+from server.tests.stub_server import StubServer
+from server.utils.jobs import job_queue
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+BODY = b'x' * 200000
+
+
+class FakeResponse:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+class MessageAttachmentUrlsTestCase(APITestCase):
+    def setUp(self):
+        job_queue.clear()
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title='Chat')
+
+        self.media = tempfile.TemporaryDirectory()
+        # MEDIA_ROOT, not OPTIONS: Django 5.0 drops the OPTIONS of an overridden default storage
+        storages = override_settings(MEDIA_ROOT=self.media.name, STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storages.enable()
+        self.addCleanup(storages.disable)
+        self.addCleanup(self.media.cleanup)
+
+    def tearDown(self):
+        job_queue.clear()
+
+    def post(self, urls):
+        return RequestsClient().post(
+            'http://127.0.0.1:8000/chats/{}/messages/'.format(self.chat.pk),
+            headers={"public-key": str(self.project.public_key), "user-name": USER, "user-secret": PASSWORD},
+            json={'text': 'Files', 'attachment_urls': urls}
+        )
+
+    def test_post_returns_before_fetching(self):
+        with StubServer(body=BODY) as stub:
+            response = self.post([stub.url + '/one.png', stub.url + '/two.png'])
+
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()['attachments'], [])
+            self.assertEqual(len(stub.requests), 0)
+            self.assertEqual(job_queue.depth(), 1)
+
+            self.assertEqual(job_queue.drain(), {'succeeded': 1, 'failed': 0})
+
+        attachments = Attachment.objects.filter(message=response.json()['id']).order_by('file')
+        self.assertEqual([os.path.basename(attachment.file.name) for attachment in attachments], ['one.png', 'two.png'])
+        for attachment in attachments:
+            self.assertEqual(attachment.chat_id, self.chat.pk)
+            self.assertEqual(attachment.file.size, len(BODY))
+
+    def test_failed_publish_is_not_retried(self):
+        message = Message.objects.create(chat=self.chat, sender=self.person, text='Files')
+
+        # Raising would re-queue the job and attach the file twice
+        with StubServer(body=BODY) as stub, mock.patch.object(attachments_module, 'publish_message_edit', side_effect=RedisError):
+            attachments_module.enqueue_message_attachments(message, [stub.url + '/one.png'])
+            self.assertEqual(job_queue.drain(), {'succeeded': 1, 'failed': 0})
+            self.assertEqual(len(stub.requests), 1)
+
+        self.assertEqual(Attachment.objects.filter(message=message).count(), 1)
+
+    def test_failed_and_oversized_urls_are_skipped(self):
+        message = Message.objects.create(chat=self.chat, sender=self.person, text='Files')
+
+        with StubServer(body=BODY) as stub:
+            stub.statuses = [404]
+            attachments = AttachmentFetcher(concurrency=1, max_bytes=len(BODY)).fetch(message, [
+                stub.url + '/missing.png', stub.url + '/ok.png', 'not a url'
+            ])
+            self.assertEqual(len(attachments), 1)
+
+            attachments = AttachmentFetcher(max_bytes=len(BODY) - 1).fetch(message, [stub.url + '/big.png'])
+            self.assertEqual(attachments, [])
+
+        attachment = Attachment.objects.get(message=message)
+        self.assertEqual(os.path.basename(attachment.file.name), 'ok.png')
+        self.assertEqual(os.listdir(os.path.join(self.media.name, 'attachments')), [attachment.file.name.split('/')[1]])
+
+    def test_streamed_file_caps_size_without_content_length(self):
+        response = FakeResponse([b'a' * 10, b'b' * 10, b'c' * 10])
+        content = StreamedFile(response, 'file.txt', max_bytes=25, deadline=float('inf'))
+
+        self.assertEqual(content.read(15), b'a' * 10 + b'b' * 5)
+        with self.assertRaises(AttachmentTooLarge):
+            list(content.chunks())
+        content.close()
+        self.assertTrue(response.closed)
+
+    def test_streamed_file_times_out(self):
+        content = StreamedFile(FakeResponse([b'a']), 'file.txt', max_bytes=25, deadline=0)
+
+        with self.assertRaises(TimeoutError):
+            content.read()
+
+    def test_file_name(self):
+        self.assertEqual(get_file_name('https://example.com/path/photo.jpg?size=large'), 'photo.jpg')
+        self.assertEqual(get_file_name('https://example.com/'), 'attachment')
@@ -0,0 +1,87 @@
+from django.db.models.signals import pre_delete, post_delete
+from rest_framework.test import APITestCase
+
+from chats.deletion import delete_messages
+from chats.models import Person, Chat, ChatPerson, Message, Attachment
+from projects.models import User, Project
+
+from webhooks.models import Webhook, WebhookDelivery
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+
+PROJECT = "Chat Engine"
+URL = 'http://127.0.0.1:8000/webhooks/test/'
+
+
+class BulkDeleteMessagesTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title='Chat 1')
+        self.other_chat = Chat.objects.create(project=self.project, admin=self.person, title='Chat 2')
+        self.messages = [Message.objects.create(chat=self.chat, sender=self.person, text=str(i)) for i in range(5)]
+        self.other_messages = [Message.objects.create(chat=self.other_chat, sender=self.person, text=str(i)) for i in range(2)]
+
+    def test_no_per_row_signals(self):
+        calls = []
+
+        def receiver(**kwargs):
+            calls.append(kwargs['instance'])
+
+        pre_delete.connect(receiver, sender=Message)
+        post_delete.connect(receiver, sender=Message)
+        try:
+            deleted = delete_messages([message.pk for message in self.messages])
+        finally:
+            pre_delete.disconnect(receiver, sender=Message)
+            post_delete.disconnect(receiver, sender=Message)
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual(calls, [])
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 0)
+        self.assertEqual(Message.objects.filter(chat=self.other_chat).count(), 2)
+
+    def test_related_rows_are_cleaned_up(self):
+        Attachment.objects.create(chat=self.chat, message=self.messages[4], file='attachments/a.png')
+        Attachment.objects.create(chat=self.chat, message=self.messages[0], file='attachments/b.png')
+        chat_person = ChatPerson.objects.get(chat=self.chat, person=self.person)
+        ChatPerson.objects.filter(pk=chat_person.pk).update(last_read=self.messages[4])
+
+        delete_messages([message.pk for message in self.messages[2:]])
+
+        self.assertEqual(list(Attachment.objects.values_list('message_id', flat=True)), [self.messages[0].pk])
+        self.assertIsNone(ChatPerson.objects.get(pk=chat_person.pk).last_read)
+        chat = Chat.objects.get(pk=self.chat.pk)
+        self.assertEqual(chat.last_message, self.messages[1])
+        self.assertEqual(chat.last_activity, self.messages[1].created)
+        self.assertEqual(Chat.objects.get(pk=self.other_chat.pk).last_message, self.other_messages[1])
+
+    def test_handles_every_relation(self):
+        # A new foreign key to Message needs handling in delete_messages, the collector isn't used
+        relations = {
+            (field.related_model, field.field.name) for field in Message._meta.get_fields(include_hidden=True)
+            if field.auto_created and not field.concrete
+        }
+        self.assertEqual(relations, {(Chat, 'last_message'), (ChatPerson, 'last_read'), (Attachment, 'message')})
+
+    def test_one_aggregated_hook_per_chat(self):
+        Webhook.objects.create(project=self.project, event_trigger='On Delete Message', url=URL)
+
+        delete_messages([message.pk for message in self.messages[:3] + self.other_messages])
+
+        deliveries = {delivery.payload['chat']['id']: delivery.payload for delivery in WebhookDelivery.objects.all()}
+        self.assertEqual(len(deliveries), 2)
+        self.assertIsNone(deliveries[self.chat.pk]['message'])
+        self.assertEqual([m['text'] for m in deliveries[self.chat.pk]['messages']], ['0', '1', '2'])
+        self.assertEqual(len(deliveries[self.other_chat.pk]['messages']), 2)
+        self.assertEqual(deliveries[self.chat.pk]['chat']['last_message']['text'], '4')
+
+    def test_hooks_can_be_skipped(self):
+        Webhook.objects.create(project=self.project, event_trigger='On Delete Message', url=URL)
+
+        delete_messages([message.pk for message in self.messages], send_hooks=False)
+
+        self.assertEqual(WebhookDelivery.objects.count(), 0)
+        self.assertEqual(Message.objects.filter(chat=self.chat).count(), 0)
@@ -0,0 +1,43 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.utils import json
+from rest_framework.test import APITestCase, RequestsClient
+
+from chats.models import Person, Chat, ChatPerson, Message
+from projects.models import User, Project
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+MEMBERS = 50
+
+
+class MessagePostMembersTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title='Group')
+        people = Person.objects.bulk_create([
+            Person(project=self.project, username='member_{}'.format(i), secret=PASSWORD) for i in range(MEMBERS)
+        ])
+        ChatPerson.objects.bulk_create([ChatPerson(chat=self.chat, person=person) for person in people])
+        self.old_message = Message.objects.create(chat=self.chat, sender=self.person, text='Earlier')
+        ChatPerson.objects.filter(chat=self.chat).update(last_read=self.old_message)
+
+    def test_members_are_updated_in_bulk(self):
+        client = RequestsClient()
+        with CaptureQueriesContext(connection) as context:
+            response = client.post(
+                'http://127.0.0.1:8000/chats/{}/messages/'.format(self.chat.pk),
+                headers={"public-key": str(self.project.public_key), "user-name": USER, "user-secret": PASSWORD},
+                data={'text': 'Hello'}
+            )
+        self.assertEqual(response.status_code, 201)
+        message = Message.objects.get(pk=json.loads(response.content)['id'])
+
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE "chats_chatperson"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(ChatPerson.objects.filter(chat=self.chat).exclude(chat_updated=message.created).count(), 0)
+        self.assertEqual(ChatPerson.objects.get(chat=self.chat, person=self.person).last_read, message)
+        self.assertEqual(ChatPerson.objects.filter(chat=self.chat, last_read=self.old_message).count(), MEMBERS)
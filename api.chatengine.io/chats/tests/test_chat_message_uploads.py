@@ -0,0 +1,97 @@
+import requests
+
+from django.test import override_settings
+from rest_framework.test import APITestCase, RequestsClient
+
+from chats.models import Person, Chat, ChatPerson, Attachment
+from projects.models import User, Project
+
+from server.tests.stub_s3 import StubS3
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+
+
+class MessageUploadsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title='Chat')
+        self.other_chat = Chat.objects.create(project=self.project, admin=self.person, title='Other')
+        self.headers = {"public-key": str(self.project.public_key), "user-name": USER, "user-secret": PASSWORD}
+
+        self.s3 = StubS3().__enter__()
+        self.addCleanup(self.s3.__exit__)
+        storages = override_settings(**self.s3.settings)
+        storages.enable()
+        self.addCleanup(storages.disable)
+
+    def get_upload(self, chat, file_name='photo.png'):
+        response = RequestsClient().post(
+            'http://127.0.0.1:8000/chats/{}/messages/uploads/'.format(chat.pk),
+            headers=self.headers,
+            json={'file_name': file_name, 'content_type': 'image/png'}
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def post_message(self, tokens):
+        return RequestsClient().post(
+            'http://127.0.0.1:8000/chats/{}/messages/'.format(self.chat.pk),
+            headers=self.headers,
+            json={'attachment_uploads': tokens}
+        )
+
+    def test_upload_then_confirm(self):
+        upload = self.get_upload(self.chat)
+        self.assertEqual(upload['fields']['Content-Type'], 'image/png')
+
+        response = requests.post(upload['url'], data=upload['fields'], files={'file': ('photo.png', b'png bytes')})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(len(self.s3.objects), 1)
+
+        response = self.post_message([upload['token']])
+
+        self.assertEqual(response.status_code, 201)
+        attachment = Attachment.objects.get(message=response.json()['id'])
+        self.assertEqual(attachment.chat_id, self.chat.pk)
+        self.assertEqual(attachment.file.name, upload['fields']['key'])
+        self.assertTrue(attachment.file.name.endswith('/photo.png'))
+        self.assertEqual(len(response.json()['attachments']), 1)
+        # The API only checked the object exists, the bytes went straight to the bucket
+        self.assertEqual([request['method'] for request in self.s3.requests], ['POST', 'HEAD'])
+
+    @override_settings(ATTACHMENT_MAX_BYTES=4)
+    def test_oversized_upload_is_refused(self):
+        upload = self.get_upload(self.chat)
+
+        response = requests.post(upload['url'], data=upload['fields'], files={'file': ('photo.png', b'png bytes')})
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(self.post_message([upload['token']]).status_code, 400)
+        self.assertEqual(Attachment.objects.count(), 0)
+
+    def test_token_is_scoped_to_its_chat(self):
+        upload = self.get_upload(self.other_chat)
+        requests.post(upload['url'], data=upload['fields'], files={'file': ('photo.png', b'png bytes')})
+
+        response = self.post_message([upload['token']])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Attachment.objects.count(), 0)
+
+    def test_forged_token(self):
+        self.assertEqual(self.post_message(['not a token']).status_code, 400)
+
+    def test_needs_membership(self):
+        ChatPerson.objects.filter(chat=self.chat).delete()
+
+        response = RequestsClient().post(
+            'http://127.0.0.1:8000/chats/{}/messages/uploads/'.format(self.chat.pk),
+            headers=self.headers,
+            json={'file_name': 'photo.png'}
+        )
+
+        self.assertEqual(response.status_code, 404)
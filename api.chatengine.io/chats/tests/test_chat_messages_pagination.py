@@ -0,0 +1,100 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.utils import json
+from rest_framework.test import APITestCase, RequestsClient
+
+from chats.models import Person, Chat, Message
+from projects.models import User, Project
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+HISTORY = 100000
+
+
+class MessagesPaginationTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email=USER, password=PASSWORD)
+        cls.project = Project.objects.create(owner=cls.user, title=PROJECT)
+        cls.person = Person.objects.create(project=cls.project, username=USER, secret=PASSWORD)
+        cls.chat = Chat.objects.create(project=cls.project, admin=cls.person, title='Old chat')
+        cls.new_chat = Chat.objects.create(project=cls.project, admin=cls.person, title='New chat')
+
+        now = timezone.now()
+        Message.objects.bulk_create([
+            Message(chat=cls.chat, sender=cls.person, sender_username=USER, text=str(i), created=now)
+            for i in range(HISTORY)
+        ], batch_size=5000)
+        Message.objects.bulk_create([
+            Message(chat=cls.new_chat, sender=cls.person, sender_username=USER, text=str(i), created=now)
+            for i in range(3)
+        ])
+        cls.ids = list(Message.objects.filter(chat=cls.chat).order_by('id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = RequestsClient()
+        self.headers = {
+            "public-key": str(self.project.public_key),
+            "user-name": USER,
+            "user-secret": PASSWORD
+        }
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('http://127.0.0.1:8000' + url, headers=self.headers)
+        return response, context.captured_queries
+
+    def messages_url(self, chat, query=''):
+        return '/chats/{}/messages/{}'.format(chat.pk, query)
+
+    def test_default_page_is_the_latest(self):
+        response, _ = self.get(self.messages_url(self.chat))
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message['id'] for message in data], self.ids[-250:])
+        self.assertEqual(data[-1]['sender']['username'], USER)
+
+    def test_walk_back_with_before(self):
+        response, _ = self.get(self.messages_url(self.chat, '?page_size=100'))
+        first_page = [message['id'] for message in json.loads(response.content)]
+        response, _ = self.get(self.messages_url(self.chat, '?page_size=100&before={}'.format(first_page[0])))
+        second_page = [message['id'] for message in json.loads(response.content)]
+
+        self.assertEqual(second_page + first_page, self.ids[-200:])
+
+        response, _ = self.get(self.messages_url(self.chat, '?before={}'.format(self.ids[3])))
+        self.assertEqual([message['id'] for message in json.loads(response.content)], self.ids[:3])
+
+    def test_walk_forward_with_after(self):
+        response, _ = self.get(self.messages_url(self.chat, '?page_size=5&after={}'.format(self.ids[10])))
+        self.assertEqual([message['id'] for message in json.loads(response.content)], self.ids[11:16])
+
+        response, _ = self.get(self.messages_url(self.chat, '?after={}&before={}'.format(self.ids[10], self.ids[13])))
+        self.assertEqual([message['id'] for message in json.loads(response.content)], self.ids[11:13])
+
+    def test_page_size_is_capped_and_validated(self):
+        response, _ = self.get(self.messages_url(self.chat, '?page_size=5000'))
+        self.assertEqual(len(json.loads(response.content)), 1000)
+
+        response, _ = self.get(self.messages_url(self.chat, '?before=abc'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_cost_does_not_depend_on_history(self):
+        self.get(self.messages_url(self.new_chat))  # Warm up the auth caches
+
+        response, small_queries = self.get(self.messages_url(self.new_chat))
+        self.assertEqual(len(json.loads(response.content)), 3)
+        response, large_queries = self.get(self.messages_url(self.chat))
+        self.assertEqual(len(json.loads(response.content)), 250)
+
+        self.assertEqual(len(small_queries), len(large_queries))
+        message_queries = [query['sql'] for query in large_queries if 'FROM "chats_message"' in query['sql']]
+        self.assertEqual(len(message_queries), 1)
+        self.assertIn('LIMIT 250', message_queries[0])
+
+    def test_latest_messages_before(self):
+        response, _ = self.get('/chats/{}/messages/latest/{}/?before={}'.format(self.chat.pk, 2, self.ids[-10]))
+        self.assertEqual([message['id'] for message in json.loads(response.content)], self.ids[-12:-10])
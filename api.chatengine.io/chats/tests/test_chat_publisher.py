@@ -0,0 +1,208 @@
+import io
+import json
+import time
+
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from projects.models import Project, Person
+from chats.models import Chat
+
+from server.redis import redis_client, redis_cache
+from chats.publishers import chat_publisher, get_person_chats_key, get_events_key, read_events, MEMBERS_CHANNEL
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = 'Engine 1'
+CHAT = 'Chat 1'
+
+
+def receive(pubsub, count, timeout=2):
+    messages = []
+    deadline = time.monotonic() + timeout
+    while len(messages) < count and time.monotonic() < deadline:
+        message = pubsub.get_message(ignore_subscribe_messages=True, timeout=0.1)
+        if message is not None:
+            messages.append(message)
+    return messages
+
+
+def subscribe(pubsub, *channels, timeout=2):
+    # Publishes made before the server confirms the subscription are lost
+    pubsub.subscribe(*channels)
+    confirmed = 0
+    deadline = time.monotonic() + timeout
+    while confirmed < len(channels) and time.monotonic() < deadline:
+        message = pubsub.get_message(timeout=0.1)
+        if message is not None and message['type'] == 'subscribe':
+            confirmed += 1
+
+
+class ChatPublisherTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.people = [
+            Person.objects.create(project=self.project, username='person_{}'.format(i), secret=PASSWORD)
+            for i in range(3)
+        ]
+        self.chat = Chat.objects.create(project=self.project, admin=self.people[0], title=CHAT)
+        for person in self.people[1:]:
+            self.chat.people.create(person=person)
+
+        self.pubsub = redis_client.pubsub()
+        subscribe(self.pubsub, *['person:{}'.format(person.pk) for person in self.people], 'chat:{}'.format(self.chat.pk))
+
+    def tearDown(self):
+        self.pubsub.close()
+
+    def test_fans_out_to_every_member_and_the_chat(self):
+        chat_publisher.publish_message_data('new_message', self.chat, {'text': 'Hello'})
+
+        messages = receive(self.pubsub, 4)
+        channels = sorted(message['channel'].decode() for message in messages)
+        expected = sorted(['person:{}'.format(person.pk) for person in self.people] + ['chat:{}'.format(self.chat.pk)])
+        self.assertEqual(channels, expected)
+
+        payload = json.loads(messages[0]['data'])
+        self.assertEqual(payload['action'], 'new_message')
+        self.assertEqual(payload['data'], {'id': self.chat.pk, 'message': {'text': 'Hello'}})
+
+    def test_explicit_people_ids(self):
+        chat_publisher.publish_chat_data('new_chat', {'id': self.chat.pk}, [self.people[1].pk])
+
+        messages = receive(self.pubsub, 2)
+        channels = sorted(message['channel'].decode() for message in messages)
+        self.assertEqual(channels, sorted(['person:{}'.format(self.people[1].pk), 'chat:{}'.format(self.chat.pk)]))
+
+
+@override_settings(CHAT_BROADCAST_MODE=True)
+class ChatBroadcastModeTestCase(APITestCase):
+    def setUp(self):
+        for key in redis_cache.scan_iter(match=get_person_chats_key('*')):
+            redis_cache.delete(key)
+
+        self.pubsub = redis_client.pubsub()
+        subscribe(self.pubsub, MEMBERS_CHANNEL)
+
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.people = [
+            Person.objects.create(project=self.project, username='person_{}'.format(i), secret=PASSWORD)
+            for i in range(3)
+        ]
+        self.chat = Chat.objects.create(project=self.project, admin=self.people[0], title=CHAT)
+        self.chat.people.create(person=self.people[1])
+
+    def tearDown(self):
+        self.pubsub.close()
+
+    def person_chats(self, person):
+        return {int(chat_id) for chat_id in redis_cache.smembers(get_person_chats_key(person.pk))}
+
+    def test_membership_is_published_and_stored(self):
+        events = [json.loads(message['data']) for message in receive(self.pubsub, 2)]
+        self.assertEqual(events, [
+            {'id': self.chat.pk, 'added': [self.people[0].pk], 'removed': []},
+            {'id': self.chat.pk, 'added': [self.people[1].pk], 'removed': []},
+        ])
+        self.assertEqual(self.person_chats(self.people[1]), {self.chat.pk})
+
+        self.chat.people.get(person=self.people[1]).delete()
+
+        events = [json.loads(message['data']) for message in receive(self.pubsub, 1)]
+        self.assertEqual(events, [{'id': self.chat.pk, 'added': [], 'removed': [self.people[1].pk]}])
+        self.assertEqual(self.person_chats(self.people[1]), set())
+        self.assertEqual(self.person_chats(self.people[0]), {self.chat.pk})
+
+    def test_events_are_published_once(self):
+        receive(self.pubsub, 2)  # setUp's membership events
+        subscribe(self.pubsub, *['person:{}'.format(person.pk) for person in self.people], 'chat:{}'.format(self.chat.pk))
+
+        receivers = chat_publisher.publish_message_data('new_message', self.chat, {'text': 'Hello'})
+        self.assertEqual(len(receivers), 1)
+
+        messages = receive(self.pubsub, 2, timeout=0.5)
+        self.assertEqual([message['channel'].decode() for message in messages], ['chat:{}'.format(self.chat.pk)])
+
+        chat_publisher.publish_chat_data('new_chat', {'id': self.chat.pk}, [self.people[2].pk])
+        messages = receive(self.pubsub, 2, timeout=0.5)
+        self.assertEqual([message['channel'].decode() for message in messages], ['person:{}'.format(self.people[2].pk)])
+
+    def test_rebuild_chat_members(self):
+        redis_cache.sadd(get_person_chats_key(self.people[2].pk), 999)
+        redis_cache.delete(get_person_chats_key(self.people[1].pk))
+
+        call_command('rebuild_chat_members', stdout=io.StringIO())
+
+        self.assertEqual(self.person_chats(self.people[0]), {self.chat.pk})
+        self.assertEqual(self.person_chats(self.people[1]), {self.chat.pk})
+        self.assertEqual(self.person_chats(self.people[2]), set())
+
+
+class ChatEventLogTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username='person', secret=PASSWORD)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title=CHAT)
+        self.channel = 'chat:{}'.format(self.chat.pk)
+        redis_client.delete(get_events_key(self.channel), get_events_key('person:{}'.format(self.person.pk)))
+
+        self.pubsub = redis_client.pubsub()
+        subscribe(self.pubsub, self.channel)
+
+    def tearDown(self):
+        self.pubsub.close()
+
+    def test_events_are_sequenced_per_channel(self):
+        for text in ['One', 'Two', 'Three']:
+            chat_publisher.publish_message_data('new_message', self.chat, {'text': text})
+
+        payloads = [json.loads(message['data']) for message in receive(self.pubsub, 3)]
+        self.assertEqual([payload['seq'] for payload in payloads], [1, 2, 3])
+        self.assertEqual(payloads[0]['data'], {'id': self.chat.pk, 'message': {'text': 'One'}})
+        self.assertEqual([event['seq'] for event in read_events('person:{}'.format(self.person.pk))], [1, 2, 3])
+
+    def test_replays_events_after_a_seq(self):
+        for text in ['One', 'Two', 'Three']:
+            chat_publisher.publish_message_data('new_message', self.chat, {'text': text})
+
+        events = read_events(self.channel, after_seq=1)
+        self.assertEqual([event['seq'] for event in events], [2, 3])
+        self.assertEqual(events[1]['data']['message'], {'text': 'Three'})
+        self.assertEqual(read_events(self.channel, after_seq=3), [])
+
+    @override_settings(CHAT_EVENT_LOG_LENGTH=2)
+    def test_trimmed_log_asks_for_resync(self):
+        # MAXLEN ~ trims whole nodes, so publish well past the limit
+        for i in range(300):
+            chat_publisher.publish_message_data('new_message', self.chat, {'text': str(i)})
+
+        self.assertIsNone(read_events(self.channel, after_seq=0))
+        self.assertEqual(read_events(self.channel, after_seq=299)[0]['seq'], 300)
+
+    def test_expired_log_asks_for_resync(self):
+        self.assertEqual(read_events(self.channel), [])
+        self.assertIsNone(read_events(self.channel, after_seq=5))
+
+    def test_person_logs_point_at_the_chat_log(self):
+        person_channel = 'person:{}'.format(self.person.pk)
+        redis_client.xadd(get_events_key(person_channel), {'message': '{"seq": 1, "action": "earlier"}'}, id='1-0')
+        for text in ['One', 'Two']:
+            chat_publisher.publish_message_data('new_message', self.chat, {'text': text})
+
+        # The payload is only stored in the chat's log
+        entries = redis_client.xrange(get_events_key(person_channel))
+        self.assertEqual(entries[1][1], {b'ref': get_events_key(self.channel).encode(), b'ref_seq': b'1'})
+
+        events = read_events(person_channel, after_seq=1)
+        self.assertEqual([event['seq'] for event in events], [2, 3])
+        self.assertEqual(events[1]['data']['message'], {'text': 'Two'})
+
+        # A person log pointing at trimmed chat entries can't fill the gap
+        redis_client.xtrim(get_events_key(self.channel), minid='2-0', approximate=False)
+        self.assertIsNone(read_events(person_channel, after_seq=1))
+        self.assertEqual(read_events(person_channel, after_seq=2)[0]['seq'], 3)
@@ -0,0 +1,103 @@
+import time
+import uuid
+
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
+
+from django.test import override_settings
+from rest_framework.test import APITestCase, RequestsClient
+
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from chats.models import Person, Chat, Message, Attachment
+from projects.models import User, Project
+
+from server.redis import redis_cache
+from server.utils.files import signed_url_cache
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+BUCKET = 'signed-bucket'
+
+# Django 5.0 drops the OPTIONS of an overridden default storage, S3Boto3Storage reads the AWS_ settings
+STORAGES = {
+    'default': {'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(
+    STORAGES=STORAGES, AWS_STORAGE_BUCKET_NAME=BUCKET, AWS_ACCESS_KEY_ID='test', AWS_SECRET_ACCESS_KEY='test',
+    AWS_QUERYSTRING_EXPIRE=3600, SIGNED_URL_CACHE_MARGIN=300
+)
+class ChatSignedUrlsTestCase(APITestCase):
+    def setUp(self):
+        # Unique paths per test, the Redis tier outlives the test database
+        run = uuid.uuid4().hex
+        self.avatar = 'avatars/{}/adam.png'.format(run)
+        self.file = 'attachments/{}/photo.png'.format(run)
+
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD, avatar=self.avatar)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title='Chat')
+        message = Message.objects.create(chat=self.chat, sender=self.person, text='Photo')
+        Attachment.objects.create(chat=self.chat, message=message, file=self.file)
+
+        self.addCleanup(signed_url_cache.delete, *['{}:{}'.format(BUCKET, name) for name in (self.avatar, self.file)])
+        self.addCleanup(signed_url_cache.clear_local)
+
+    def get_chats(self):
+        response = RequestsClient().get(
+            'http://127.0.0.1:8000/chats/',
+            headers={"public-key": str(self.project.public_key), "user-name": USER, "user-secret": PASSWORD}
+        )
+        self.assertEqual(response.status_code, 200)
+        chat = response.json()[0]
+        return chat['admin']['avatar'], chat['last_message']['attachments'][0]['file']
+
+    def test_urls_are_signed_once_per_path(self):
+        with mock.patch.object(S3Boto3Storage, 'url', autospec=True, side_effect=S3Boto3Storage.url) as url:
+            avatar, file = self.get_chats()
+            self.assertEqual(url.call_count, 2)
+            self.assertEqual(self.get_chats(), (avatar, file))
+            self.assertEqual(url.call_count, 2)
+
+            # Other workers share the Redis tier
+            signed_url_cache.clear_local()
+            self.assertEqual(self.get_chats(), (avatar, file))
+            self.assertEqual(url.call_count, 2)
+
+        self.assertIn(self.avatar, urlparse(avatar).path)
+        self.assertEqual(parse_qs(urlparse(file).query)['X-Amz-Expires'], ['3600'])
+
+    def test_page_reads_the_redis_tier_once(self):
+        urls = self.get_chats()
+        signed_url_cache.clear_local()
+
+        with mock.patch.object(redis_cache, 'get', wraps=redis_cache.get) as get, \
+                mock.patch.object(redis_cache, 'mget', wraps=redis_cache.mget) as mget:
+            self.assertEqual(self.get_chats(), urls)
+        self.assertEqual(mget.call_count, 1)
+        self.assertEqual(sorted(mget.call_args.args[0]), sorted(
+            'signed_urls:{}:{}'.format(BUCKET, name) for name in (self.avatar, self.file)
+        ))
+        self.assertFalse(any(call.args[0].startswith('signed_urls:') for call in get.call_args_list))
+
+    def test_expired_urls_are_signed_again(self):
+        with mock.patch.object(S3Boto3Storage, 'url', autospec=True, side_effect=S3Boto3Storage.url) as url:
+            avatar, file = self.get_chats()
+            # Still in Redis, but past the point it should be handed out
+            signed_url_cache.set('{}:{}'.format(BUCKET, self.avatar), (avatar, time.time() - 1))
+            self.get_chats()
+            self.assertEqual(url.call_count, 3)
+
+    @override_settings(SIGNED_URL_CACHE_MARGIN=3600)
+    def test_margin_of_whole_lifetime_turns_cache_off(self):
+        with mock.patch.object(S3Boto3Storage, 'url', autospec=True, side_effect=S3Boto3Storage.url) as url:
+            self.get_chats()
+            signed = url.call_count
+            self.get_chats()
+            self.assertGreaterEqual(signed, 2)
+            self.assertEqual(url.call_count, signed * 2)
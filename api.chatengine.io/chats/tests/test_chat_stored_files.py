@@ -0,0 +1,173 @@
+import os
+import hashlib
+import tempfile
+
+from unittest import mock
+
+from django.test import override_settings
+from rest_framework.test import APITestCase, RequestsClient
+
+from chats.attachments import AttachmentFetcher
+from chats.deletion import delete_messages
+from chats.models import Person, Chat, Message, Attachment, StoredFile
+from chats import stored_files
+from chats.stored_files import add_reference, release_files
+from projects.models import User, Project
+
+from server.tests.stub_server import StubServer
+from server.utils.jobs import job_queue
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+BODY = b'same bytes every time'
+DIGEST = hashlib.sha256(BODY).hexdigest()
+
+
+class StoredFilesTestCase(APITestCase):
+    def setUp(self):
+        job_queue.clear()
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title='Chat')
+        self.chat_2 = Chat.objects.create(project=self.project, admin=self.person, title='Chat 2')
+
+        self.media = tempfile.TemporaryDirectory()
+        # MEDIA_ROOT, not OPTIONS: Django 5.0 drops the OPTIONS of an overridden default storage
+        storages = override_settings(MEDIA_ROOT=self.media.name, STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storages.enable()
+        self.addCleanup(storages.disable)
+        self.addCleanup(self.media.cleanup)
+
+    def tearDown(self):
+        job_queue.clear()
+
+    def headers(self):
+        return {"public-key": str(self.project.public_key), "user-name": USER, "user-secret": PASSWORD}
+
+    def post(self, chat, file_name='notes.txt', body=BODY):
+        response = RequestsClient().post(
+            'http://127.0.0.1:8000/chats/{}/messages/'.format(chat.pk),
+            headers=self.headers(),
+            data={'text': 'File'},
+            files={'attachments': (file_name, body, 'text/plain')}
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def stored(self):
+        names = []
+        for root, _, files in os.walk(os.path.join(self.media.name, 'attachments')):
+            names += [os.path.relpath(os.path.join(root, name), self.media.name) for name in files]
+        return sorted(names)
+
+    def references(self, name):
+        return StoredFile.objects.get(name=name).references
+
+    def test_same_file_is_stored_once(self):
+        message = self.post(self.chat)
+        message_2 = self.post(self.chat_2)
+        self.post(self.chat_2, file_name='copy.txt')
+
+        name = 'attachments/{}/notes.txt'.format(DIGEST)
+        self.assertEqual(self.stored(), ['attachments/{}/copy.txt'.format(DIGEST), name])
+        self.assertEqual(self.references(name), 2)
+        self.assertEqual(
+            [attachment.file.name for attachment in Attachment.objects.filter(message__in=[message['id'], message_2['id']])],
+            [name, name]
+        )
+
+    def test_object_goes_with_its_last_reference(self):
+        message = self.post(self.chat)
+        self.post(self.chat_2)
+        name = 'attachments/{}/notes.txt'.format(DIGEST)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = RequestsClient().delete(
+                'http://127.0.0.1:8000/chats/{}/messages/{}/'.format(self.chat.pk, message['id']), headers=self.headers()
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.references(name), 1)
+        self.assertEqual(job_queue.depth(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chat_2.delete()
+        self.assertEqual(self.references(name), 0)
+        self.assertEqual(self.stored(), [name])
+        self.assertEqual(job_queue.drain(), {'succeeded': 1, 'failed': 0})
+        self.assertEqual(self.stored(), [])
+
+        # The row stays at zero, sending the file again writes it again
+        self.post(self.chat, file_name='notes.txt')
+        self.assertEqual(self.references(name), 1)
+        self.assertEqual(self.stored(), [name])
+
+    def test_bulk_delete_releases_references(self):
+        ids = [self.post(self.chat)['id'] for _ in range(3)]
+        name = 'attachments/{}/notes.txt'.format(DIGEST)
+        self.assertEqual(self.references(name), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_messages(ids[:2], send_hooks=False)
+        self.assertEqual(self.references(name), 1)
+        self.assertEqual(job_queue.depth(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_messages(ids[2:], send_hooks=False)
+        job_queue.drain()
+        self.assertEqual(self.stored(), [])
+
+    def test_new_reference_stops_a_pending_delete(self):
+        self.post(self.chat)
+        name = 'attachments/{}/notes.txt'.format(DIGEST)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_files([name])
+        add_reference(name)
+        job_queue.drain()
+
+        self.assertEqual(self.references(name), 1)
+        self.assertEqual(self.stored(), [name])
+
+    def test_fetched_urls_are_deduplicated(self):
+        message = Message.objects.create(chat=self.chat, sender=self.person, text='Files')
+
+        with StubServer(body=BODY) as stub:
+            AttachmentFetcher().fetch(message, [stub.url + '/notes.txt', stub.url + '/notes.txt'])
+        self.post(self.chat)
+
+        name = 'attachments/{}/notes.txt'.format(DIGEST)
+        self.assertEqual(self.stored(), [name])
+        self.assertEqual(self.references(name), 3)
+
+    def test_cascade_releases_in_one_batch(self):
+        for _ in range(3):
+            self.post(self.chat)
+        self.post(self.chat, file_name='copy.txt')
+        name = 'attachments/{}/notes.txt'.format(DIGEST)
+
+        with mock.patch.object(stored_files, 'release_files', wraps=release_files) as release:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.project.delete()
+        self.assertEqual(release.call_count, 1)
+        self.assertEqual(sorted(release.call_args.args[0]), ['attachments/{}/copy.txt'.format(DIGEST)] + [name] * 3)
+        self.assertEqual(self.references(name), 0)
+
+        job_queue.drain()
+        self.assertEqual(self.stored(), [])
+
+    def test_fetched_urls_leave_no_staging_objects(self):
+        message = Message.objects.create(chat=self.chat, sender=self.person, text='Files')
+
+        with StubServer(body=BODY) as stub:
+            attachments = AttachmentFetcher().fetch(message, [stub.url + '/notes.txt', stub.url + '/other.txt'])
+
+        self.assertEqual([attachment.file.name for attachment in attachments], [
+            'attachments/{}/notes.txt'.format(DIGEST), 'attachments/{}/other.txt'.format(DIGEST)
+        ])
+        staged = [name for _, _, files in os.walk(os.path.join(self.media.name, 'staging')) for name in files]
+        self.assertEqual(staged, [])
@@ -0,0 +1,90 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.utils import json
+from rest_framework.test import APITestCase, RequestsClient
+
+from chats.models import Person, Chat, ChatPerson, get_members_hash
+from projects.models import User, Project
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+
+
+class ChatsPutLookupTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.people = [
+            Person.objects.create(project=self.project, username='person_{}'.format(i), secret=PASSWORD)
+            for i in range(20)
+        ]
+        self.client = RequestsClient()
+        self.headers = {
+            "public-key": str(self.project.public_key),
+            "user-name": USER,
+            "user-secret": PASSWORD
+        }
+
+    def put(self, usernames, **data):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.put(
+                'http://127.0.0.1:8000/chats/',
+                json=dict(data, usernames=usernames),
+                headers=self.headers
+            )
+        return response, context.captured_queries
+
+    def create_chat(self, people):
+        chat = Chat.objects.create(project=self.project, admin=self.person)
+        for person in people:
+            ChatPerson.objects.create(chat=chat, person=person)
+        return chat
+
+    def test_members_hash_follows_membership(self):
+        chat = self.create_chat(self.people[:2])
+        chat.refresh_from_db()
+        self.assertEqual(chat.members_hash, get_members_hash(str(sorted([self.person.pk, self.people[0].pk, self.people[1].pk]))))
+
+        ChatPerson.objects.get(chat=chat, person=self.people[0]).delete()
+        chat.refresh_from_db()
+        self.assertEqual(chat.members_hash, get_members_hash(chat.members_ids))
+
+    def test_lookup_queries_do_not_grow_with_participants(self):
+        direct = self.create_chat(self.people[:1])
+        group = self.create_chat(self.people)
+        self.put(['person_0'])  # Warm up the auth caches
+
+        response, direct_queries = self.put(['person_0'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['id'], direct.pk)
+        self.assertNotIn('members_hash', json.loads(response.content))
+
+        response, group_queries = self.put([person.username for person in self.people])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['id'], group.pk)
+
+        self.assertEqual(len(direct_queries), len(group_queries))
+        person_queries = [q['sql'] for q in group_queries if 'FROM "projects_person"' in q['sql'] and '"username" IN' in q['sql']]
+        chat_queries = [q['sql'] for q in group_queries if q['sql'].startswith('SELECT') and 'FROM "chats_chat"' in q['sql']]
+        self.assertEqual(len(person_queries), 1)
+        self.assertEqual(len(chat_queries), 1)
+        self.assertIn('"members_hash" =', chat_queries[0])
+
+    def test_title_and_duplicates(self):
+        chat = self.create_chat(self.people[:1])
+        Chat.objects.filter(pk=chat.pk).update(title='Work')
+
+        response, _ = self.put(['person_0', 'person_0', USER], title='Work')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['id'], chat.pk)
+
+        response, _ = self.put(['person_0'], title='Home')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Chat.objects.count(), 2)
+
+    def test_unknown_username(self):
+        response, _ = self.put(['person_0', 'nobody'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Chat.objects.count(), 0)
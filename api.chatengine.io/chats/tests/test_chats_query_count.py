@@ -0,0 +1,76 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.utils import json
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, RequestsClient
+
+from chats.models import Person, Chat, ChatPerson, Message, Attachment
+from projects.models import User, Project
+
+USER = 'adam@gmail.com'
+USER_2 = 'eve@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+
+
+class ChatsQueryCountTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email=USER, password=PASSWORD)
+        cls.project = Project.objects.create(owner=cls.user, title=PROJECT)
+        cls.person = Person.objects.create(project=cls.project, username=USER, secret=PASSWORD)
+        cls.person_2 = Person.objects.create(project=cls.project, username=USER_2, secret=PASSWORD)
+        for i in range(250):
+            chat = Chat.objects.create(project=cls.project, admin=cls.person, title='Chat {}'.format(i))
+            ChatPerson.objects.create(chat=chat, person=cls.person_2)
+            message = Message.objects.create(chat=chat, sender=cls.person_2, text='Hello {}'.format(i))
+            Attachment.objects.create(chat=chat, message=message)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = RequestsClient()
+        self.headers = {
+            "public-key": str(self.project.public_key),
+            "user-name": USER,
+            "user-secret": PASSWORD
+        }
+
+    def warm_up(self):
+        # Auth caches the project and verified secret on the first request
+        self.client.get('http://127.0.0.1:8000/users/me/', headers=self.headers)
+
+    def count_queries(self, url, headers=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, headers=headers or self.headers)
+        return response, len(context.captured_queries)
+
+    def test_chats_query_count_is_flat(self):
+        self.warm_up()
+        response, small_page = self.count_queries('http://127.0.0.1:8000/chats/?page_size=10')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)), 10)
+
+        response, large_page = self.count_queries('http://127.0.0.1:8000/chats/?page_size=250')
+        data = json.loads(response.content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data), 250)
+        self.assertEqual(len(data[0]['people']), 2)
+        self.assertEqual(len(data[0]['attachments']), 1)
+        self.assertEqual(data[0]['last_message']['sender']['username'], USER_2)
+
+        self.assertEqual(small_page, large_page)
+
+    def test_latest_chats_query_count_is_flat(self):
+        self.warm_up()
+        _, small_page = self.count_queries('http://127.0.0.1:8000/chats/latest/10/')
+        response, large_page = self.count_queries('http://127.0.0.1:8000/chats/latest/250/')
+        self.assertEqual(len(json.loads(response.content)), 250)
+        self.assertEqual(small_page, large_page)
+
+    def test_project_chats_query_count_is_flat(self):
+        url = 'http://127.0.0.1:8000/projects/{}/chats/?page_size={}'
+        headers = {"Authorization": 'Token {}'.format(self.token.key)}
+        _, small_page = self.count_queries(url.format(self.project.pk, 10), headers=headers)
+        response, large_page = self.count_queries(url.format(self.project.pk, 250), headers=headers)
+        self.assertEqual(len(json.loads(response.content)), 250)
+        self.assertEqual(small_page, large_page)
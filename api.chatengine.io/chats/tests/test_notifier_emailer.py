@@ -161,6 +161,8 @@ class EmailerTestCase(APITestCase):
 
         self.message.text = 'test email form basic project'
         self.message.save()
+        # self.project is now stale, like a cached project
+        Project.objects.filter(pk=self.project.pk).update(email_company_name='Renamed Co.')
 
         response, sent_list = emailer.email_chat_members(
             project=self.project,
@@ -171,8 +173,11 @@ class EmailerTestCase(APITestCase):
         self.assertEqual(len(sent_list), 1)
         self.assertEqual(response, 'Success')
 
-        # Email last sent updated
+        # Email last sent updated, and only that column
         self.assertTrue(now < self.project.email_last_sent)
+        project = Project.objects.get(pk=self.project.pk)
+        self.assertEqual(project.email_last_sent, self.project.email_last_sent)
+        self.assertEqual(project.email_company_name, 'Renamed Co.')
 
         response, sent_list = emailer.email_chat_members(
             project=self.project,
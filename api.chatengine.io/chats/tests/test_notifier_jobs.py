@@ -0,0 +1,137 @@
+import time
+
+from datetime import timedelta
+
+from django.test import override_settings
+from rest_framework.test import APITestCase, RequestsClient
+
+from chats.notifiers import Emailer
+from chats.models import Person, Chat, ChatPerson, Message
+from projects.models import User, Project
+
+from server.tests.stub_server import StubServer
+from server.utils.jobs import job_queue
+
+USER = 'adam@lamorre.co'
+PASSWORD = 'potato_123'
+
+PROJECT = "Chat Engine"
+CHAT = "Chat Engine"
+TEXT = 'Hello from the queue'
+
+
+class NotifierJobsTestCase(APITestCase):
+    def setUp(self):
+        job_queue.clear()
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(
+            owner=self.user, title=PROJECT, email_sender='test@chatengine.io',
+            plan_type='professional', is_emails_enabled=True
+        )
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD, email=USER)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title=CHAT)
+        self.message = Message.objects.create(sender=self.person, chat=self.chat, text=TEXT)
+
+    def tearDown(self):
+        job_queue.clear()
+
+    def add_people(self, count):
+        return Person.objects.bulk_create([
+            Person(project=self.project, username='person_{}'.format(i), secret=PASSWORD, email='person_{}@chatengine.io'.format(i))
+            for i in range(count)
+        ])
+
+    def test_message_post_only_enqueues(self):
+        people = self.add_people(3)
+        ChatPerson.objects.bulk_create([ChatPerson(chat=self.chat, person=person) for person in people])
+
+        with StubServer() as stub, override_settings(SEND_GRID_HOST=stub.url):
+            response = RequestsClient().post(
+                'http://127.0.0.1:8000/chats/{}/messages/'.format(self.chat.pk),
+                headers={"public-key": str(self.project.public_key), "user-name": USER, "user-secret": PASSWORD},
+                data={'text': TEXT}
+            )
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(stub.requests), 0)
+            self.assertEqual(job_queue.depth(), 1)
+
+            self.assertEqual(job_queue.drain(), {'succeeded': 1, 'failed': 0})
+
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(stub.requests[0]['path'], '/v3/mail/send')
+        data = stub.requests[0]['json']
+        emails = {personalization['to'][0]['email'] for personalization in data['personalizations']}
+        self.assertTrue({person.email for person in people} <= emails)
+        self.assertEqual(data['personalizations'][0]['substitutions']['-text-'], TEXT)
+        self.assertEqual(data['from']['email'], 'test@chatengine.io')
+
+    def test_basic_plan_is_throttled_with_a_cached_project(self):
+        Project.objects.filter(pk=self.project.pk).update(
+            plan_type='basic', email_last_sent=self.project.email_last_sent - timedelta(minutes=6)
+        )
+        people = self.add_people(1)
+        ChatPerson.objects.bulk_create([ChatPerson(chat=self.chat, person=person) for person in people])
+
+        # The first post also warms the project cache the second one authenticates with
+        for _ in range(2):
+            response = RequestsClient().post(
+                'http://127.0.0.1:8000/chats/{}/messages/'.format(self.chat.pk),
+                headers={"public-key": str(self.project.public_key), "user-name": USER, "user-secret": PASSWORD},
+                data={'text': TEXT}
+            )
+            self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(job_queue.depth(), 1)
+
+    def test_recipients_are_batched_by_thousand(self):
+        people = self.add_people(2500)
+        status, sent_list = Emailer().email_chat_members(project=self.project, message=self.message, people=people)
+        self.assertEqual(status, 'Success')
+        self.assertEqual(len(sent_list), 2500)
+        self.assertEqual(job_queue.depth(), 3)
+
+        with StubServer() as stub, override_settings(SEND_GRID_HOST=stub.url):
+            job_queue.drain()
+
+        self.assertEqual(sorted(len(r['json']['personalizations']) for r in stub.requests), [500, 1000, 1000])
+
+    def test_failed_sends_are_retried_then_dropped(self):
+        people = self.add_people(1)
+        Emailer().email_chat_members(project=self.project, message=self.message, people=people)
+
+        with StubServer(default_status=500) as stub, override_settings(SEND_GRID_HOST=stub.url):
+            self.assertEqual(job_queue.drain(), {'succeeded': 0, 'failed': 1})
+            for attempt in range(1, job_queue.max_attempts):
+                # Waiting out the backoff, not retried straight away
+                self.assertEqual(job_queue.scheduled(), 1)
+                self.assertEqual(job_queue.drain(), {'succeeded': 0, 'failed': 0})
+                self.assertEqual(job_queue.promote(now=time.time() + job_queue.retry_delay(attempt) - 5), 0)
+
+                self.assertEqual(job_queue.promote(now=time.time() + job_queue.retry_delay(attempt)), 1)
+                self.assertEqual(job_queue.drain(), {'succeeded': 0, 'failed': 1})
+
+        self.assertEqual(len(stub.requests), job_queue.max_attempts)
+        self.assertEqual(job_queue.depth(), 0)
+        self.assertEqual(job_queue.scheduled(), 0)
+
+    def test_retry_goes_through_once_the_backoff_passes(self):
+        people = self.add_people(1)
+        Emailer().email_chat_members(project=self.project, message=self.message, people=people)
+
+        with StubServer(default_status=500) as stub, override_settings(SEND_GRID_HOST=stub.url):
+            job_queue.drain()
+        with StubServer() as stub, override_settings(SEND_GRID_HOST=stub.url):
+            job_queue.promote(now=time.time() + job_queue.retry_delay(1))
+            self.assertEqual(job_queue.drain(), {'succeeded': 1, 'failed': 0})
+
+        self.assertEqual(len(stub.requests), 1)
+
+    def test_deleted_message_is_skipped(self):
+        people = self.add_people(1)
+        Emailer().email_chat_members(project=self.project, message=self.message, people=people)
+        self.message.delete()
+
+        with StubServer() as stub, override_settings(SEND_GRID_HOST=stub.url):
+            self.assertEqual(job_queue.drain(), {'succeeded': 1, 'failed': 0})
+
+        self.assertEqual(len(stub.requests), 0)
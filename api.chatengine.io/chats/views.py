@@ -1,30 +1,61 @@
-import os
-
+from django.conf import settings
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from urllib.error import HTTPError
-from urllib.parse import urlparse
-from urllib.request import urlretrieve, urlcleanup
-
-from django.core.files import File
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.http.request import QueryDict
 from django.shortcuts import get_object_or_404
 
+from server.utils.uploads import create_upload, confirm_upload, UploadError
 from users.authentication import UserSecretAuthentication
 
 from projects.models import Person
 from projects.serializers import PersonPublicSerializer
 
+from .attachments import enqueue_attachment_derivatives, enqueue_message_attachments
+from .membership import send_edit_event
 from .publishers import chat_publisher
+from .stored_files import add_reference, store_file
 from .notifiers import Emailer
 from .authentication import ChatAccessKeyAuthentication
-from .models import Chat, ChatPerson, Message, Attachment
-from .serializers import ChatSerializer, MessageSerializer, ChatPersonSerializer, ChatActiveSinceSerializer, PersonSearchSerializer
+from .models import Chat, ChatPerson, Message, Attachment, get_members_hash
+from .serializers import ChatSerializer, ChatListSerializer, MessageSerializer, ChatPersonSerializer, ChatActiveSinceSerializer, PersonSearchSerializer
 
 emailer = Emailer()
 
+MESSAGES_PAGE_SIZE = 250
+MESSAGES_MAX_PAGE_SIZE = 1000
+
+
+def get_message_page(chat_id, before=None, after=None, page_size=MESSAGES_PAGE_SIZE):
+    # Keyset pagination on the (chat, -id) index, so the cost doesn't grow with the chat's history
+    messages = Message.objects.filter(chat=chat_id).select_related('sender').prefetch_related('attachments')
+    if before is not None:
+        messages = messages.filter(id__lt=before)
+    if after is not None:
+        return list(messages.filter(id__gt=after).order_by('id')[:page_size])
+    return list(messages.order_by('-id')[:page_size])[::-1]
+
+
+def touch_chat_people(chat, message, sender=None):
+    # Two set-based UPDATEs however many members the chat has (ChatPerson saves only act on create)
+    chat_people = ChatPerson.objects.filter(chat=chat)
+    chat_people.update(chat_updated=message.created)
+    if sender is not None:
+        chat_people.filter(person=sender).update(last_read=message)
+
+
+def get_upload_scope(chat):
+    # Upload tokens are only good for the chat they were issued for
+    return 'chat:{}'.format(chat.pk)
+
+
+def get_message_cursor(request, param):
+    value = request.GET.get(param, None)
+    return None if value in (None, '') else int(value)
+
 
 class Chats(APIView):
     throttle_scope = 'burst'
@@ -42,7 +73,7 @@ class Chats(APIView):
         page_size = self.get_param(request=request, param='page_size', default=250)
         start = page * page_size
         end = (page * page_size) + page_size
-        chat_people = ChatPerson.objects.filter(person=request.user).order_by('-chat_updated')[start:end]
+        chat_people = ChatPerson.objects.filter(person=request.user).select_related('chat').order_by('-chat_updated')[start:end]
         chats = [chat_person.chat for chat_person in chat_people]
         serializer = ChatSerializer(chats, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -67,30 +98,39 @@ class Chats(APIView):
             usernames = sorted(usernames + [request.user.username])
 
         try:
-            people = [get_object_or_404(Person, project=request.auth.pk, username=username) for username in usernames]
-        except:
+            usernames = set(usernames)
+            people = list(Person.objects.filter(project=request.auth.pk, username__in=usernames))
+        except (TypeError, ValueError):
+            people = []
+        if len(people) == 0 or len(people) != len(usernames):
             return Response({"message": "At least one username is not a user"}, status=status.HTTP_400_BAD_REQUEST)
 
-        people_ids = sorted([person.id for person in people])
+        members_ids = str(sorted([person.id for person in people]))
 
+        # The hash index finds the candidates, members_ids rules out a collision
+        chats = Chat.objects.filter(project=request.auth, members_hash=get_members_hash(members_ids), members_ids=members_ids)
         if request.data.get('title', False):
-            chats = Chat.objects.filter(project=request.auth, members_ids=str(people_ids), title=request.data['title'])[:1]
-        else:
-            chats = Chat.objects.filter(project=request.auth, members_ids=str(people_ids))[:1]
-        chat = next(iter(chats), None)
+            chats = chats.filter(title=request.data['title'])
+        chat = next(iter(chats[:1]), None)
 
         if chat is None:
-            chat = Chat.objects.create(project=request.auth, members_ids=str(people_ids), admin=request.user)
+            chat = Chat.objects.create(project=request.auth, members_ids=members_ids, admin=request.user)
             for person in people:
                 ChatPerson.objects.get_or_create(chat=chat, person=person)
 
+            # 'On New Chat' went out before the members were added, one 'On Edit Chat' carries them
             serializer = ChatSerializer(chat, data=request.data, partial=True)
             if serializer.is_valid():
                 serializer.save()
+            else:
+                send_edit_event(chat)
 
-            chat_publisher.publish_chat_data('new_chat', serializer.data)
-            return Response(ChatSerializer(chat, many=False).data, status.HTTP_201_CREATED)
+            # The chat as saved, serializer.data is only the rejected input when it isn't valid
+            chat_json = ChatSerializer(chat, many=False).data
+            chat_publisher.publish_chat_data('new_chat', chat_json)
+            return Response(chat_json, status.HTTP_201_CREATED)
 
+        prefetch_related_objects([chat], *ChatListSerializer.prefetch)
         return Response(ChatSerializer(chat, many=False).data, status.HTTP_200_OK)
 
 
@@ -100,7 +140,7 @@ class LatestChats(APIView):
     authentication_classes = (UserSecretAuthentication,)
 
     def get(self, request, count):
-        chat_people = ChatPerson.objects.filter(person=request.user).order_by('-chat_updated')[:int(count)]
+        chat_people = ChatPerson.objects.filter(person=request.user).select_related('chat').order_by('-chat_updated')[:int(count)]
         chats = [chat_person.chat for chat_person in chat_people]
         serializer = ChatSerializer(chats, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -111,7 +151,7 @@ class LatestChats(APIView):
             chat_people = ChatPerson.objects.filter(
                 person=request.user,
                 chat_updated__lt=serializer.data['before']
-            ).order_by('-chat_updated')[:int(count)]
+            ).select_related('chat').order_by('-chat_updated')[:int(count)]
             chats = [chat_person.chat for chat_person in chat_people]
             serializer = ChatSerializer(chats, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -180,6 +220,8 @@ class ChatPersonList(APIView):
         person = get_object_or_404(Person, project=request.auth, username=request.data.get('username'))
 
         chat_person, created = ChatPerson.objects.get_or_create(chat=chat, person=person)
+        if created:
+            send_edit_event(chat)
 
         serializer = ChatSerializer(chat, many=False)
         chat_publisher.publish_chat_data('add_person', serializer.data)
@@ -210,6 +252,7 @@ class ChatPersonList(APIView):
         chat_person = get_object_or_404(ChatPerson, chat=chat, person=person)
         chat_person_json = ChatPersonSerializer(chat_person, many=False).data
         chat_person.delete()  # Delete before Socket publish!
+        send_edit_event(chat)
         serializer = ChatSerializer(chat, many=False)
         chat_publisher.publish_chat_data('remove_person', serializer.data)
         chat_publisher.publish_chat_data('delete_chat', serializer.data, [person.pk])
@@ -220,6 +263,7 @@ class ChatPersonList(APIView):
         chat_person = get_object_or_404(ChatPerson, chat=chat, person=request.user)
         chat_person_json = ChatPersonSerializer(chat_person, many=False).data
         chat_person.delete()  # Delete before Socket publish!
+        send_edit_event(chat)
         serializer = ChatSerializer(chat, many=False)
         chat_publisher.publish_chat_data('remove_person', serializer.data)
         chat_publisher.publish_chat_data('delete_chat', serializer.data, [request.user.pk])
@@ -276,9 +320,19 @@ class Messages(APIView):
             get_object_or_404(ChatPerson, chat=chat_id, person=request.user)
         else:
             chat_id = request.user.id
-        messages = Message.objects.filter(chat=chat_id)
-        messages_data = reversed(list(MessageSerializer(messages, many=True).data))
-        return Response(messages_data, status=status.HTTP_200_OK)
+
+        try:
+            before = get_message_cursor(request, 'before')
+            after = get_message_cursor(request, 'after')
+            page_size = get_message_cursor(request, 'page_size')
+        except ValueError:
+            return Response({'message': 'before, after and page_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        page_size = MESSAGES_PAGE_SIZE if page_size is None else max(0, min(page_size, MESSAGES_MAX_PAGE_SIZE))
+
+        # Oldest first, the first message's id is the next page's before
+        messages = get_message_page(chat_id, before=before, after=after, page_size=page_size)
+        serializer = MessageSerializer(messages, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     def post(self, request, chat_id):
         # Get Sender and Chat
@@ -288,56 +342,85 @@ class Messages(APIView):
             get_object_or_404(ChatPerson, chat=chat_id, person=user)
         chat = get_object_or_404(Chat, project=request.auth.pk, id=chat_id)
 
+        if isinstance(request.data, QueryDict):
+            upload_tokens = request.data.getlist('attachment_uploads', [])
+        else:
+            upload_tokens = request.data.get('attachment_uploads', [])
+
         # Filter for no attachments or text
-        if len(request.FILES.getlist('attachments')) == 0 and request.data.get('text', None) is None:
+        if len(request.FILES.getlist('attachments')) == 0 and len(upload_tokens) == 0 and request.data.get('text', None) is None:
             return Response({'message': 'bad data'}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Files already posted to the bucket (see MessageUploads), checked before anything is saved
+        try:
+            uploads = [confirm_upload(token, get_upload_scope(chat)) for token in upload_tokens]
+        except UploadError as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # Save new Message
         serializer = MessageSerializer(data=request.data)
         if serializer.is_valid():
             message = serializer.save(chat=chat, sender=user)
 
-            # Attach files objects
-            if request.FILES.get('attachments', None) is not None:
-                for attachment in request.FILES.getlist('attachments'):
-                    Attachment.objects.create(chat=chat, message=message, file=attachment)
-
-            # OR Attach files URLs
-            if len(request.data.get('attachment_urls', [])) > 0:
-                for url in request.data['attachment_urls']:
-                    try:
-                        file, _ = urlretrieve(url)
-                        file_name = os.path.basename(urlparse(url).path)
-                        attachment = Attachment.objects.create(chat=chat, message=message)
-                        attachment.file.save(file_name, File(open(file, 'rb')))
-                        urlcleanup()
-                    except HTTPError as e:
-                        pass
-                    except ValueError as e:
-                        pass
+            with transaction.atomic():
+                # Attach files objects, stored once per content and file name
+                names = [store_file(attachment) for attachment in request.FILES.getlist('attachments')]
+
+                # OR Attach direct uploads, already in the bucket and only counted here
+                for name in uploads:
+                    add_reference(name)
+                names += uploads
+
+                attachments = Attachment.objects.bulk_create([Attachment(chat=chat, message=message, file=name) for name in names])
+            enqueue_attachment_derivatives(attachments)
+
+            # OR Attach files URLs, fetched on the job queue and sent as an edit_message once stored
+            if isinstance(request.data, QueryDict):
+                attachment_urls = request.data.getlist('attachment_urls', [])
+            else:
+                attachment_urls = request.data.get('attachment_urls', [])
 
             # Update chats for people
-            chat_people = ChatPerson.objects.filter(chat=chat)
-            for chat_person in chat_people:
-                chat_person.last_read = message if chat_person.person == user else chat_person.last_read
-                chat_person.chat_updated = message.created
-                chat_person.save()
-
-            people = [chat_person.person for chat_person in chat_people]
-            people_ids = [person.id for person in people]
+            touch_chat_people(chat=chat, message=message, sender=user)
+
+            # Load the members once, both the chat payload and the emails read them
+            prefetch_related_objects([chat], *ChatListSerializer.prefetch)
+            people = [chat_person.person for chat_person in chat.people.all()]
             chat_serializer = ChatSerializer(chat, many=False)
 
             # Publish new data (Socket + Hooks + Emails)
-            chat_publisher.publish_chat_data('edit_chat', chat_serializer.data, people_ids=people_ids)
-            chat_publisher.publish_message_data('new_message', chat, serializer.data, people_ids=people_ids)
+            chat_publisher.publish_chat_data('edit_chat', chat_serializer.data)
+            chat_publisher.publish_message_data('new_message', chat, serializer.data)
             emailer = Emailer()
             emailer.email_chat_members(project=request.auth, message=message, people=people)
+            enqueue_message_attachments(message, attachment_urls)
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class MessageUploads(APIView):
+    throttle_scope = 'burst'
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = (UserSecretAuthentication, ChatAccessKeyAuthentication,)
+
+    def post(self, request, chat_id):
+        # A presigned form to post the file to the bucket, its token goes in the message's attachment_uploads
+        if isinstance(request.user, Person):
+            get_object_or_404(ChatPerson, chat=chat_id, person=request.user)
+        chat = get_object_or_404(Chat, project=request.auth.pk, id=chat_id)
+
+        try:
+            upload = create_upload(
+                'attachments', get_upload_scope(chat), request.data.get('file_name', None),
+                settings.ATTACHMENT_MAX_BYTES, content_type=request.data.get('content_type', None)
+            )
+        except UploadError as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(upload, status=status.HTTP_201_CREATED)
+
+
 class LatestMessages(APIView):
     throttle_scope = 'burst'
     permission_classes = (permissions.IsAuthenticated,)
@@ -348,10 +431,15 @@ class LatestMessages(APIView):
             get_object_or_404(ChatPerson, chat=chat_id, person=request.user)
         else:
             chat_id = request.user.id
-        messages = Message.objects.filter(chat=chat_id)[:int(count)]
-        messages_data = reversed(list(MessageSerializer(messages, many=True).data))
-        return Response(messages_data, status=status.HTTP_200_OK)
-    # TODO: You can make another PUT request where you get messages LT the last PK
+
+        try:
+            before = get_message_cursor(request, 'before')
+        except ValueError:
+            return Response({'message': 'before must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        messages = get_message_page(chat_id, before=before, page_size=min(int(count), MESSAGES_MAX_PAGE_SIZE))
+        serializer = MessageSerializer(messages, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class MessageDetails(APIView):
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from crons.rebuild import ChatUpdatesRebuild
+
+
+class Command(BaseCommand):
+    help = 'Reset every chat member\'s chat_updated to the chat\'s latest message time, a chunk of chats at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for progress in ChatUpdatesRebuild(chunk_size=options['chunk_size']).run():
+            self.stdout.write('{} {chats} chats, {rows} members updated in {seconds}s ({rows_per_second} rows/s)'.format(
+                'Done:' if progress.get('done') else '...', **progress
+            ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from crons.purge import MessagePurge
+
+
+class Command(BaseCommand):
+    help = 'Delete messages older than each project\'s message history, in batches, resuming from the last finished project.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-seconds', type=float, default=None, help='Stop after this long, the next run resumes')
+        parser.add_argument('--reset', action='store_true', help='Ignore the checkpoint and start from the first project')
+
+    def handle(self, *args, **options):
+        purge = MessagePurge(batch_size=options['batch_size'], max_seconds=options['max_seconds'])
+        if options['reset']:
+            purge.reset()
+
+        for progress in purge.run():
+            if 'done' in progress:
+                self.stdout.write('{} {deleted} messages in {seconds}s ({rows_per_second} rows/s)'.format(
+                    'Purged' if progress['done'] else 'Stopped after', **progress
+                ))
+            else:
+                self.stdout.write('Project {project}: -{batch} | {deleted} total, {rows_per_second} rows/s'.format(**progress))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from crons.rebuild import MemberIDsRebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every chat\'s members_ids from its members, a chunk of chats at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for progress in MemberIDsRebuild(chunk_size=options['chunk_size']).run():
+            self.stdout.write('{} {chats} chats scanned, {rows} rewritten in {seconds}s ({rows_per_second} rows/s)'.format(
+                'Done:' if progress.get('done') else '...', **progress
+            ))
@@ -0,0 +1,98 @@
+import time
+
+from datetime import timedelta
+
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from chats.models import Message
+from chats.deletion import delete_messages
+from projects.models import Project
+
+from server.redis import redis_cache
+
+CHECKPOINT_KEY = 'purge:old_messages'
+CHECKPOINT_TTL = 60 * 60 * 24
+
+
+class MessagePurge:
+    """
+    Deletes messages past each project's message_history, one bounded batch at a time.
+
+    Projects are walked in primary key order and each finished project is checkpointed in Redis,
+    so a run that is stopped (max_seconds, a crash, a deploy) picks up at the next project.
+    Deletes are idempotent, re-running a half-done project is safe. Rows go through delete_messages,
+    so each batch sends one 'On Delete Message' hook per chat (or none, per project).
+    """
+
+    def __init__(self, batch_size=1000, max_seconds=None):
+        self.batch_size = batch_size
+        self.max_seconds = max_seconds
+
+    def get_checkpoint(self):
+        try:
+            checkpoint = redis_cache.get(CHECKPOINT_KEY)
+        except RedisError:
+            return None
+        return checkpoint.decode() if checkpoint is not None else None
+
+    def set_checkpoint(self, project_id):
+        try:
+            redis_cache.set(CHECKPOINT_KEY, str(project_id), ex=CHECKPOINT_TTL)
+        except RedisError:
+            pass
+
+    def reset(self):
+        try:
+            redis_cache.delete(CHECKPOINT_KEY)
+        except RedisError:
+            pass
+
+    def delete_batch(self, project_id, cutoff, send_hooks):
+        ids = Message.objects.filter(chat__project_id=project_id, created__lt=cutoff) \
+            .order_by().values_list('pk', flat=True)[:self.batch_size]
+        return delete_messages(ids, send_hooks=send_hooks)
+
+    def run(self, now=None):
+        """
+        Yields a progress dict after every batch and a final summary with done=True.
+        """
+        now = timezone.now() if now is None else now
+        started = time.perf_counter()
+        deleted = 0
+
+        projects = Project.objects.order_by('pk')
+        checkpoint = self.get_checkpoint()
+        if checkpoint is not None:
+            projects = projects.filter(pk__gt=checkpoint)
+
+        values = projects.values_list('pk', 'message_history', 'is_retention_hooks_enabled')
+        for project_id, message_history, send_hooks in values.iterator():
+            cutoff = now - timedelta(days=message_history)
+            count = self.delete_batch(project_id, cutoff, send_hooks)
+            while count > 0:
+                deleted += count
+                elapsed = time.perf_counter() - started
+                yield {
+                    'project': str(project_id),
+                    'batch': count,
+                    'deleted': deleted,
+                    'rows_per_second': round(deleted / elapsed, 1) if elapsed > 0 else None,
+                }
+                if self.max_seconds is not None and elapsed > self.max_seconds:
+                    yield self.summary(deleted, started, done=False)
+                    return
+                count = self.delete_batch(project_id, cutoff, send_hooks)
+            self.set_checkpoint(project_id)
+
+        self.reset()
+        yield self.summary(deleted, started, done=True)
+
+    def summary(self, deleted, started, done):
+        elapsed = time.perf_counter() - started
+        return {
+            'done': done,
+            'deleted': deleted,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(deleted / elapsed, 1) if elapsed > 0 else None,
+        }
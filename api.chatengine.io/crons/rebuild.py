@@ -0,0 +1,99 @@
+import time
+
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Max, Subquery, OuterRef
+from django.db.models.functions import Coalesce
+
+from chats.models import Chat, ChatPerson, Message, get_members_hash
+
+
+def chat_id_chunks(chunk_size):
+    # Keyset pagination, each chunk is an index range scan however far in we are
+    last_id = 0
+    while True:
+        ids = list(Chat.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if len(ids) == 0:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+class ChatRebuild:
+    """
+    Recomputes denormalized chat columns a chunk of chats at a time, with set-based queries.
+
+    run() yields a progress dict after every chunk and a final summary with done=True.
+    """
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+
+    def process(self, chat_ids):
+        raise NotImplementedError
+
+    def run(self):
+        started = time.perf_counter()
+        chats, rows = 0, 0
+        for chat_ids in chat_id_chunks(self.chunk_size):
+            rows += self.process(chat_ids)
+            chats += len(chat_ids)
+            yield self.progress(chats, rows, started)
+        yield dict(self.progress(chats, rows, started), done=True)
+
+    def progress(self, chats, rows, started):
+        elapsed = time.perf_counter() - started
+        return {
+            'chats': chats,
+            'rows': rows,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(rows / elapsed, 1) if elapsed > 0 else None,
+        }
+
+
+class ChatUpdatesRebuild(ChatRebuild):
+    """
+    Sets every ChatPerson.chat_updated to its chat's latest message time, or the chat's creation.
+    """
+
+    def process(self, chat_ids):
+        latest = Message.objects.filter(chat=OuterRef('chat')).order_by().values('chat').annotate(latest=Max('created'))
+        created = Chat.objects.filter(pk=OuterRef('chat')).values('created')
+        return ChatPerson.objects.filter(chat_id__in=chat_ids).update(
+            chat_updated=Coalesce(Subquery(latest.values('latest')), Subquery(created))
+        )
+
+
+class MemberIDsRebuild(ChatRebuild):
+    """
+    Rewrites Chat.members_ids (and members_hash) from the chat's ChatPerson rows, only touching chats that drifted.
+    """
+
+    def process(self, chat_ids):
+        with transaction.atomic():
+            # Locked like sync_members_ids does (in pk order, so chunks can't deadlock with each other) before
+            # the memberships are read: a membership change committing in between would be overwritten
+            chats = list(
+                Chat.objects.select_for_update(no_key=True).filter(pk__in=chat_ids).order_by('pk')
+                .only('pk', 'members_ids', 'members_hash')
+            )
+            memberships = ChatPerson.objects.filter(chat_id__in=chat_ids).order_by('chat_id', 'person_id') \
+                .values_list('chat_id', 'person_id')
+            members = {
+                chat_id: str([person_id for _, person_id in rows])
+                for chat_id, rows in groupby(memberships, key=lambda row: row[0])
+            }
+
+            changed = []
+            for chat in chats:
+                members_ids = members.get(chat.pk, '[]')
+                members_hash = get_members_hash(members_ids)
+                if chat.members_ids != members_ids or chat.members_hash != members_hash:
+                    chat.members_ids = members_ids
+                    chat.members_hash = members_hash
+                    changed.append(chat)
+
+            # No chat signals or hooks, this is maintenance not an edit
+            Chat.objects.bulk_update(changed, ['members_ids', 'members_hash'])
+        return len(changed)
@@ -0,0 +1,84 @@
+from io import StringIO
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from chats.models import Person, Chat, ChatPerson, Message, get_members_hash
+from projects.models import Project
+
+from crons.rebuild import ChatUpdatesRebuild, MemberIDsRebuild
+
+USER = 'adam@mail.co'
+PASS = 'pass1234'
+
+
+class ChatRebuildsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(email=USER, password=PASS)
+        self.project = Project.objects.create(owner=self.user, title='Project')
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASS)
+        self.people = Person.objects.bulk_create([
+            Person(project=self.project, username='person_{}'.format(i), secret=PASS) for i in range(3)
+        ])
+        self.now = timezone.now()
+
+    def create_chats(self, count):
+        chats = [Chat.objects.create(admin=self.person, project=self.project, title=str(i)) for i in range(count)]
+        ChatPerson.objects.bulk_create([ChatPerson(chat=chat, person=person) for chat in chats for person in self.people])
+        return chats
+
+    def test_chat_updates_use_the_latest_message(self):
+        chat, empty_chat = self.create_chats(2)
+        newest = self.now - timedelta(days=1)
+        # Ids and created disagree, the newest created wins
+        Message.objects.create(chat=chat, sender=self.person, text='new', created=newest)
+        Message.objects.create(chat=chat, sender=self.person, text='backfilled', created=self.now - timedelta(days=5))
+        ChatPerson.objects.update(chat_updated=self.now - timedelta(days=30))
+
+        progress = list(ChatUpdatesRebuild(chunk_size=1).run())
+
+        self.assertEqual([p['chats'] for p in progress], [1, 2, 2])
+        self.assertTrue(progress[-1]['done'])
+        self.assertEqual(progress[-1]['rows'], 8)
+        self.assertEqual(set(ChatPerson.objects.filter(chat=chat).values_list('chat_updated', flat=True)), {newest})
+        self.assertEqual(set(ChatPerson.objects.filter(chat=empty_chat).values_list('chat_updated', flat=True)), {empty_chat.created})
+
+    def test_member_ids_are_rebuilt_from_members(self):
+        stale, missing, correct = self.create_chats(3)
+        expected = str(sorted([self.person.pk] + [person.pk for person in self.people]))
+        Chat.objects.filter(pk=stale.pk).update(members_ids=str(sorted([self.person.pk, 999999] + [person.pk for person in self.people])))
+        Chat.objects.filter(pk=missing.pk).update(members_ids='[]')
+        Chat.objects.filter(pk=correct.pk).update(members_ids=expected, members_hash=get_members_hash(expected))
+
+        progress = list(MemberIDsRebuild().run())
+
+        self.assertEqual(progress[-1]['rows'], 2)
+        self.assertEqual(set(Chat.objects.values_list('members_ids', 'members_hash')), {(expected, get_members_hash(expected))})
+
+    def test_queries_per_chunk_do_not_grow_with_chats(self):
+        self.create_chats(2)
+        Chat.objects.update(members_ids='[]')
+        with CaptureQueriesContext(connection) as small:
+            list(MemberIDsRebuild().run())
+            list(ChatUpdatesRebuild().run())
+
+        self.create_chats(20)
+        Chat.objects.update(members_ids='[]')
+        with CaptureQueriesContext(connection) as large:
+            list(MemberIDsRebuild().run())
+            list(ChatUpdatesRebuild().run())
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_commands_report_progress(self):
+        self.create_chats(2)
+        out = StringIO()
+        call_command('sync_member_ids', stdout=out)
+        call_command('apply_chat_updates', stdout=out)
+        self.assertIn('Done: 2 chats scanned', out.getvalue())
+        self.assertIn('Done: 2 chats, 8 members updated', out.getvalue())
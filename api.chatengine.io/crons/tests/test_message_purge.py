@@ -0,0 +1,109 @@
+import json
+
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APITestCase, RequestsClient
+
+from accounts.models import User
+from chats.models import Person, Chat, Message
+from projects.models import Project
+
+from webhooks.models import Webhook, WebhookDelivery
+
+from crons.purge import MessagePurge
+
+USER = 'adam@mail.co'
+PASS = 'pass1234'
+
+
+class MessagePurgeTestCase(APITestCase):
+    def setUp(self):
+        MessagePurge().reset()
+        self.user = User.objects.create(email=USER, password=PASS)
+        self.now = timezone.now()
+
+    def tearDown(self):
+        MessagePurge().reset()
+
+    def create_chat(self, message_history=14, old=0, fresh=0):
+        project = Project.objects.create(owner=self.user, title='Project')
+        Project.objects.filter(pk=project.pk).update(message_history=message_history)
+        person = Person.objects.create(project=project, username=USER, secret=PASS)
+        chat = Chat.objects.create(admin=person, project=project, title='Chat')
+        Message.objects.bulk_create(
+            [Message(chat=chat, sender=person, text='old', created=self.now - timedelta(days=message_history + 1)) for _ in range(old)] +
+            [Message(chat=chat, sender=person, text='fresh', created=self.now - timedelta(days=message_history - 1)) for _ in range(fresh)]
+        )
+        return project, chat
+
+    def test_deletes_in_bounded_batches(self):
+        project, chat = self.create_chat(old=25, fresh=3)
+
+        progress = list(MessagePurge(batch_size=10).run(now=self.now))
+
+        self.assertEqual([p['batch'] for p in progress[:-1]], [10, 10, 5])
+        self.assertEqual(progress[-1]['done'], True)
+        self.assertEqual(progress[-1]['deleted'], 25)
+        self.assertIsNotNone(progress[-1]['rows_per_second'])
+        self.assertEqual(list(Message.objects.filter(chat=chat).values_list('text', flat=True)), ['fresh'] * 3)
+
+    def test_each_project_uses_its_own_history(self):
+        _, short_chat = self.create_chat(message_history=14, old=2, fresh=1)
+        _, long_chat = self.create_chat(message_history=365, old=1, fresh=2)
+
+        summary = list(MessagePurge().run(now=self.now))[-1]
+
+        self.assertEqual(summary['deleted'], 3)
+        self.assertEqual(Message.objects.filter(chat=short_chat).count(), 1)
+        self.assertEqual(Message.objects.filter(chat=long_chat).count(), 2)
+
+    def test_resumes_after_the_checkpoint(self):
+        chats = sorted([self.create_chat(old=2), self.create_chat(old=2)], key=lambda pair: str(pair[0].pk))
+        (first_project, first_chat), (_, second_chat) = chats
+
+        purge = MessagePurge()
+        purge.set_checkpoint(first_project.pk)
+        summary = list(purge.run(now=self.now))[-1]
+
+        self.assertEqual(summary['deleted'], 2)
+        self.assertEqual(Message.objects.filter(chat=first_chat).count(), 2)
+        self.assertEqual(Message.objects.filter(chat=second_chat).count(), 0)
+        self.assertIsNone(purge.get_checkpoint())
+
+    def test_stops_after_max_seconds(self):
+        _, chat = self.create_chat(old=5)
+
+        progress = list(MessagePurge(batch_size=2, max_seconds=0).run(now=self.now))
+        self.assertEqual(progress[-1]['done'], False)
+        self.assertEqual(Message.objects.filter(chat=chat).count(), 3)
+
+        progress = list(MessagePurge(batch_size=2).run(now=self.now))
+        self.assertEqual(progress[-1]['done'], True)
+        self.assertEqual(Message.objects.filter(chat=chat).count(), 0)
+
+    def test_view_streams_progress(self):
+        self.create_chat(old=3, fresh=1)
+
+        response = RequestsClient().get('http://127.0.0.1:8000/crons/purge_old_messages')
+        lines = [json.loads(line) for line in response.content.decode().splitlines()]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(lines[-1]['done'], True)
+        self.assertEqual(lines[-1]['deleted'], 3)
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_retention_hooks_follow_the_project(self):
+        project, _ = self.create_chat(old=3)
+        quiet_project, _ = self.create_chat(old=3)
+        Project.objects.filter(pk=quiet_project.pk).update(is_retention_hooks_enabled=False)
+        for hooked in (project, quiet_project):
+            Webhook.objects.create(project=hooked, event_trigger='On Delete Message', url='http://127.0.0.1:8000/webhooks/test/')
+
+        list(MessagePurge().run(now=self.now))
+
+        deliveries = list(WebhookDelivery.objects.all())
+        self.assertEqual(len(deliveries), 1)
+        self.assertEqual(deliveries[0].project_id, project.pk)
+        self.assertEqual(len(deliveries[0].payload['messages']), 3)
@@ -2,6 +2,7 @@ from datetime import datetime, timedelta
 import json
 import pytz
 
+from django.http import StreamingHttpResponse
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
 from rest_framework.throttling import AnonRateThrottle
 from rest_framework import status, permissions
@@ -9,59 +10,31 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from accounts.models import User
-from chats.models import Chat, Message, ChatPerson
 from projects.models import Project, Person, Collaborator
 from projects.serializers import ProjectSerializer
 from subscriptions.upgrade_email import upgrade_emailer
 
+from .purge import MessagePurge
+from .rebuild import ChatUpdatesRebuild, MemberIDsRebuild
+
 
 class PurgeOldMessages(APIView):
     throttle_classes = [AnonRateThrottle]
     permission_classes = (permissions.AllowAny,)
 
     def get(self, request):
-        data = []
-        now = datetime.now().replace(tzinfo=pytz.UTC)
-
-        for chat in Chat.objects.all():
-            chat_data = {}
-            chat_data['message_history'] = chat.project.message_history
-
-            for message in Message.objects.filter(chat=chat):
-                if message.created < now - timedelta(days=chat.project.message_history):
-                    if chat_data.get('deleted_message_stamps', False):
-                        chat_data['deleted_message_stamps'].append(message.created)
-                    else:
-                        chat_data['deleted_message_stamps'] = [message.created]
-                    message.delete()
-
-                else:
-                    if chat_data.get('good_message_stamps', False):
-                        chat_data['good_message_stamps'].append(message.created)
-                    else:
-                        chat_data['good_message_stamps'] = [message.created]
-
-            data.append(chat_data)
-
-        return Response(data, status=status.HTTP_200_OK)
+        # One JSON line per deleted batch, streamed so large purges don't build up a response
+        purge = MessagePurge()
+        lines = (json.dumps(progress) + '\n' for progress in purge.run())
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson', status=status.HTTP_200_OK)
 
 class ApplyChatUpdates(APIView):
     throttle_classes = [AnonRateThrottle]
     permission_classes = (permissions.IsAdminUser,)
 
     def get(self, request):
-        for chat in Chat.objects.all():
-            query = Message.objects.filter(chat=chat)
-            message = query.latest('created') if len(query) > 0 else None
-
-            for chat_person in ChatPerson.objects.filter(chat=chat):
-                if message is not None:
-                    chat_person.chat_updated = message.created
-                else:
-                    chat_person.chat_updated = chat.created
-                chat_person.save()
-
-        return Response({'message': 'ok'}, status=status.HTTP_200_OK)
+        lines = (json.dumps(progress) + '\n' for progress in ChatUpdatesRebuild().run())
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson', status=status.HTTP_200_OK)
 
 
 class SyncMemberIDs(APIView):
@@ -69,15 +42,8 @@ class SyncMemberIDs(APIView):
     permission_classes = (permissions.IsAdminUser,)
 
     def get(self, request):
-        data = {}
-        for chat_person in ChatPerson.objects.all():
-            members_ids = json.loads(chat_person.chat.members_ids)
-            if chat_person.person.pk not in members_ids:
-                members_ids = sorted(members_ids + [chat_person.person.pk])
-            chat_person.chat.members_ids = str(members_ids)
-            chat_person.chat.save()
-            data[chat_person.chat.pk] = str(members_ids)
-        return Response(data, status=status.HTTP_200_OK)
+        lines = (json.dumps(progress) + '\n' for progress in MemberIDsRebuild().run())
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson', status=status.HTTP_200_OK)
 
 
 class PruneBusinessChat(APIView):
@@ -1,4 +1,5 @@
 from projects.models import Project
+from projects.cache import get_project, get_project_by_private_key
 
 from rest_framework import exceptions, authentication
 from rest_framework.authtoken.models import Token
@@ -10,7 +11,7 @@ class PrivateKeyAuthentication(authentication.BaseAuthentication):
 
         if private_key is not None:
             try:
-                project = Project.objects.get(private_key=private_key)
+                project = get_project_by_private_key(private_key)
 
                 if not project.is_active:
                     raise Exception
@@ -33,7 +34,7 @@ class TokenProjectAuthentication(authentication.BaseAuthentication):
         project = None
         try:
             project_id = request.get_full_path().split('/projects/')[1].split('/')[0]
-            project = Project.objects.get(pk=project_id)
+            project = get_project(project_id)
         except:
             pass
 
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.db import transaction
+
+from server.utils.images import generate_derivatives, needs_derivatives
+from server.utils.jobs import job_queue
+
+from .models import Person
+
+
+def generate_avatar_derivatives(person_id):
+    # Runs on the job queue, the avatar itself is served until this is done
+    generate_derivatives(Person.objects.filter(pk=person_id), 'avatar', 'avatar_derivatives', settings.AVATAR_DERIVATIVES)
+
+
+def enqueue_avatar_derivatives(person):
+    if needs_derivatives(person.avatar, person.avatar_derivatives):
+        person_id = person.pk
+        transaction.on_commit(lambda: job_queue.enqueue(generate_avatar_derivatives, person_id))
@@ -0,0 +1,38 @@
+from server.utils.cache import TieredCache
+
+from .models import Project
+
+# pk:<public key> -> Project (owner included), private:<private key> -> public key
+project_cache = TieredCache('projects', ttl=60 * 5, local_ttl=5)
+
+
+def get_project(public_key):
+    project = project_cache.get('pk:{}'.format(public_key))
+    if project is None:
+        project = Project.objects.select_related('owner').get(pk=public_key)
+        cache_project(project)
+    return project
+
+
+def get_project_by_private_key(private_key):
+    public_key = project_cache.get('private:{}'.format(private_key))
+    if public_key is not None:
+        project = get_project(public_key)
+        # The mapping can outlive a key rotation in another process's local tier
+        if str(project.private_key) == str(private_key):
+            return project
+
+    project = Project.objects.select_related('owner').get(private_key=private_key)
+    cache_project(project)
+    return project
+
+
+def cache_project(project):
+    project_cache.set('pk:{}'.format(project.pk), project)
+    project_cache.set('private:{}'.format(project.private_key), str(project.pk))
+
+
+def invalidate_project(project, private_keys=()):
+    keys = ['pk:{}'.format(project.pk), 'private:{}'.format(project.private_key)]
+    keys += ['private:{}'.format(private_key) for private_key in private_keys]
+    project_cache.delete(*keys)
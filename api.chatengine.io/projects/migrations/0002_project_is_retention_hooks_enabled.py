@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='is_retention_hooks_enabled',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-18 14:02
+
+import jsonfield.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_project_is_retention_hooks_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='avatar_derivatives',
+            field=jsonfield.fields.JSONField(default=dict, editable=False),
+        ),
+    ]
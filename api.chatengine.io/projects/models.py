@@ -5,7 +5,7 @@ from jsonfield import JSONField
 from django.db import models
 from django.dispatch import receiver
 from django.utils.timezone import now
-from django.db.models.signals import pre_save, pre_delete, post_save
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete
 from django.contrib.auth.hashers import make_password
 
 from accounts.models import User
@@ -35,6 +35,9 @@ class Project(models.Model):
     email_link = models.URLField(max_length=500, default='', blank=True, null=True)
     email_last_sent = models.DateTimeField(default=now, editable=True)
 
+    # Send one aggregated 'On Delete Message' hook per chat for retention purges, or none at all
+    is_retention_hooks_enabled = models.BooleanField(default=True)
+
     created = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -117,6 +120,7 @@ class Person(models.Model):
     last_name = models.CharField(max_length=255, default='', blank=True)
 
     avatar = models.ImageField(upload_to='avatars', max_length=None, blank=True, null=True)
+    avatar_derivatives = JSONField(default=dict, editable=False)
     custom_json = JSONField(default=dict)
 
     is_online = models.BooleanField(default=False)
@@ -134,6 +138,15 @@ class Person(models.Model):
             models.Index(fields=['project', 'username']),
         ]
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # avatar_derivatives belongs to the job that renders them, a stale instance mustn't write it back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'avatar_derivatives'
+            ]
+        super(Person, self).save(*args, **kwargs)
+
 
 @receiver(pre_save, sender=Person)
 def pre_save_person(sender, instance, **kwargs):
@@ -144,6 +157,8 @@ def pre_save_person(sender, instance, **kwargs):
     else:
         if not obj.secret == instance.secret:  # Field has changed
             instance.secret = make_password(instance.secret, None)
+            from users.cache import invalidate_person_credentials
+            invalidate_person_credentials(instance.pk)
 
 
 class Connection(models.Model):
@@ -166,18 +181,39 @@ def post_save_project(instance, created, **kwargs):
     if created:
         Collaborator.objects.create(user=instance.owner, project=instance, role='admin')
 
+    from .cache import invalidate_project
+    invalidate_project(instance)
+
+
+@receiver(post_delete, sender=Project)
+def post_delete_project(instance, **kwargs):
+    from .cache import invalidate_project
+    invalidate_project(instance)
+
+
+@receiver(post_save, sender=User)
+def post_save_owner(instance, created, **kwargs):
+    # Cached projects carry their owner along
+    if not created:
+        from .cache import invalidate_project
+        for project in Project.objects.filter(owner=instance).only('public_key', 'private_key'):
+            invalidate_project(project)
+
 
 @receiver(post_save, sender=Person)
 def post_save_person(instance, created, **kwargs):
     from webhooks.sender import hook
     from .serializers import PersonSerializer
     from projects.serializers import ProjectSerializer
-    person_json = PersonSerializer(instance, many=False).data
-    project_json = ProjectSerializer(instance.project, many=False).data
-    if created:
-        hook.post(event_trigger='On New User', project_json=project_json, person_json=person_json)
-    else:
-        hook.post(event_trigger='On Edit User', project_json=project_json, person_json=person_json)
+    hook.enqueue(
+        event_trigger='On New User' if created else 'On Edit User',
+        project_id=instance.project_id,
+        project_json=lambda: ProjectSerializer(instance.project, many=False).data,
+        person_json=lambda: PersonSerializer(instance, many=False).data
+    )
+
+    from .avatars import enqueue_avatar_derivatives
+    enqueue_avatar_derivatives(instance)
 
 
 @receiver(pre_delete, sender=Project)
@@ -197,9 +233,12 @@ def pre_delete_person(instance, **kwargs):
     from webhooks.sender import hook
     from .serializers import PersonSerializer
     from projects.serializers import ProjectSerializer
-    person_json = PersonSerializer(instance, many=False).data
-    project_json = ProjectSerializer(instance.project, many=False).data
-    hook.post(event_trigger='On Delete User', project_json=project_json, person_json=person_json)
+    hook.enqueue(
+        event_trigger='On Delete User',
+        project_id=instance.project_id,
+        project_json=lambda: ProjectSerializer(instance.project, many=False).data,
+        person_json=lambda: PersonSerializer(instance, many=False).data
+    )
 
 
 @receiver(post_save, sender=Invite)
@@ -0,0 +1,48 @@
+import time
+
+from redis.exceptions import RedisError
+
+from server.redis import redis_cache
+
+
+def get_presence_key(person_id):
+    # Sorted set of the person's gateway connections, scored by when their heartbeat runs out
+    return 'presence:{}'.format(person_id)
+
+
+def get_online_ids(person_ids):
+    """
+    Returns which of the people have a live ws gateway connection, in one Redis round trip.
+    """
+    person_ids = list(set(person_ids))
+    if len(person_ids) == 0:
+        return set()
+
+    now = int(time.time() * 1000)
+    try:
+        pipeline = redis_cache.pipeline(transaction=False)
+        for person_id in person_ids:
+            pipeline.zcount(get_presence_key(person_id), now, '+inf')
+        counts = pipeline.execute()
+    except RedisError:
+        return set()
+    return {person_id for person_id, count in zip(person_ids, counts) if count > 0}
+
+
+def load_presence(people):
+    """
+    Sets person.presence on every person that doesn't have it yet, with one lookup for all of them.
+
+    A person is present with a live connection, or when the is_online column was set through the API.
+    """
+    people = [person for person in people if person is not None and not hasattr(person, 'presence')]
+    online = get_online_ids([person.pk for person in people])
+    for person in people:
+        person.presence = person.is_online or person.pk in online
+    return people
+
+
+def is_online(person):
+    if not hasattr(person, 'presence'):
+        load_presence([person])
+    return person.presence
@@ -1,11 +1,41 @@
 from rest_framework import serializers
 
+from server.utils.files import DerivativesField, SignedFileField, SignedImageField, get_stored_files, load_signed_urls
+from server.utils.uploads import confirm_upload, UploadError
+
 from .models import Collaborator, Project, Person, Invite
+from .presence import load_presence, is_online
 
 from chats.models import Message, Attachment
 
 
+def get_avatar_files(people):
+    return [file for person in people if person is not None for file in get_stored_files(person, 'avatar', 'avatar_derivatives')]
+
+
+class PresenceListSerializer(serializers.ListSerializer):
+    # Live presence and cached avatar URLs for every person on the page, in one Redis round trip each
+    def get_people(self, items):
+        return items
+
+    def get_files(self, items):
+        return get_avatar_files(self.get_people(items))
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        load_presence(self.get_people(items))
+        load_signed_urls(self.get_files(items))
+        return super().to_representation(items)
+
+
 class PersonPublicSerializer(serializers.ModelSerializer):
+    avatar = SignedImageField(required=False, allow_null=True)
+    avatar_derivatives = DerivativesField('avatar', 'avatar_derivatives')
+    is_online = serializers.SerializerMethodField()
+
+    def get_is_online(self, obj):
+        return is_online(obj)
+
     class Meta(object):
         model = Person
         fields = [
@@ -13,12 +43,17 @@ class PersonPublicSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'avatar',
+            'avatar_derivatives',
             'custom_json',
             'is_online',
         ]
+        list_serializer_class = PresenceListSerializer
 
 
 class AttachmentSerializer(serializers.ModelSerializer):
+    file = SignedFileField(max_length=5000, required=False, allow_null=True)
+    derivatives = DerivativesField('file', 'derivatives')
+
     class Meta(object):
         model = Attachment
         exclude = ['chat', 'message']
@@ -53,10 +88,29 @@ class InviteSerializer(serializers.ModelSerializer):
         exclude = ['project']
 
 
+def get_avatar_scope(person):
+    return 'person:{}'.format(person.pk)
+
+
 class PersonSerializer(serializers.ModelSerializer):
     # Secret can be rendered because only the project owner uses this serializer
     is_authenticated = serializers.BooleanField(required=False, read_only=True)
     last_message = serializers.SerializerMethodField(required=False)
+    avatar = SignedImageField(required=False, allow_null=True)
+    avatar_derivatives = DerivativesField('avatar', 'avatar_derivatives')
+    # Token of an avatar posted straight to the bucket (users/me/avatar/upload/), instead of the file
+    avatar_upload = serializers.CharField(required=False, write_only=True)
+
+    def validate(self, attrs):
+        token = attrs.pop('avatar_upload', None)
+        if token is not None:
+            if self.instance is None:
+                raise serializers.ValidationError({'avatar_upload': 'Only an existing person can confirm an upload'})
+            try:
+                attrs['avatar'] = confirm_upload(token, get_avatar_scope(self.instance))
+            except UploadError as e:
+                raise serializers.ValidationError({'avatar_upload': str(e)})
+        return attrs
 
     def get_last_message(self, obj):
         query = Message.objects.filter(sender=obj)
@@ -64,9 +118,16 @@ class PersonSerializer(serializers.ModelSerializer):
         serializer = LastMessageSerializer(message, many=False)
         return serializer.data
 
+    def to_representation(self, instance):
+        # is_online stays writable, what's returned also counts a live gateway connection
+        data = super().to_representation(instance)
+        data['is_online'] = is_online(instance)
+        return data
+
     class Meta(object):
         model = Person
         exclude = ['project']
+        list_serializer_class = PresenceListSerializer
 
 
 class ProjectSerializer(serializers.ModelSerializer):
@@ -85,6 +146,8 @@ class ProjectSerializer(serializers.ModelSerializer):
     email_last_sent = serializers.DateTimeField(required=False)
     email_company_name = serializers.CharField(required=False)
 
+    is_retention_hooks_enabled = serializers.BooleanField(required=False)
+
     count_chats = serializers.SerializerMethodField()
     count_people = serializers.SerializerMethodField()
 
@@ -113,6 +176,8 @@ class ProjectSerializer(serializers.ModelSerializer):
             'email_sender',
             'email_last_sent',
             'email_company_name',
+            # Webhook Settings
+            'is_retention_hooks_enabled',
             # Count Chats and Users
             'count_chats',
             'count_people',
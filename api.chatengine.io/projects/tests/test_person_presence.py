@@ -0,0 +1,73 @@
+import time
+
+from rest_framework.test import APITestCase
+
+from chats.models import Chat, Message
+from chats.notifiers import Emailer
+from chats.serializers import ChatSerializer, MessageSerializer
+from projects.models import User, Project, Person
+from projects.presence import get_presence_key, get_online_ids, load_presence
+from projects.serializers import PersonSerializer
+
+from server.redis import redis_cache
+
+USER = 'adam@lamorre.co'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine"
+
+
+def connect(person, seconds=60, connection='connection'):
+    # What the ws gateway writes for an open socket, scored by when its heartbeat runs out
+    redis_cache.zadd(get_presence_key(person.pk), {connection: int((time.time() + seconds) * 1000)})
+
+
+class PersonPresenceTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT, email_sender='test@chatengine.io',
+                                              plan_type='professional', is_emails_enabled=True)
+        self.people = [
+            Person.objects.create(project=self.project, username='person_{}'.format(i), secret=PASSWORD, email=USER)
+            for i in range(3)
+        ]
+        redis_cache.delete(*[get_presence_key(person.pk) for person in self.people])
+
+    def tearDown(self):
+        # pks repeat across tests, a live entry would show someone else as online
+        redis_cache.delete(*[get_presence_key(person.pk) for person in self.people])
+
+    def test_online_ids_count_live_connections(self):
+        connect(self.people[0])
+        connect(self.people[1], seconds=-1)
+
+        self.assertEqual(get_online_ids([person.pk for person in self.people]), {self.people[0].pk})
+
+    def test_column_still_counts(self):
+        self.people[2].is_online = True
+        connect(self.people[0])
+
+        load_presence(self.people)
+        self.assertEqual([person.presence for person in self.people], [True, False, True])
+
+    def test_serializers_return_presence(self):
+        connect(self.people[1])
+        chat = Chat.objects.create(project=self.project, admin=self.people[0], title='Chat')
+        chat.people.create(person=self.people[1])
+        Message.objects.create(chat=chat, sender=self.people[1], text='Hello')
+
+        people = {item['person']['username']: item['person']['is_online'] for item in ChatSerializer(chat).data['people']}
+        self.assertEqual(people, {'person_0': False, 'person_1': True})
+        self.assertTrue(MessageSerializer(Message.objects.filter(chat=chat), many=True).data[0]['sender']['is_online'])
+        self.assertEqual([item['is_online'] for item in PersonSerializer(self.people, many=True).data], [False, True, False])
+
+    def test_emails_skip_connected_people(self):
+        connect(self.people[1])
+        chat = Chat.objects.create(project=self.project, admin=self.people[0], title='Chat')
+        for person in self.people[1:]:
+            chat.people.create(person=person)
+        message = Message.objects.create(chat=chat, sender=self.people[0], text='Hello')
+
+        response, sent_list = Emailer().email_chat_members(project=self.project, message=message, people=self.people)
+
+        self.assertEqual(response, 'Success')
+        self.assertEqual(len(sent_list), 1)
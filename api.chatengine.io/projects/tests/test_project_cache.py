@@ -0,0 +1,77 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.utils import json
+from rest_framework.test import APITestCase, APIRequestFactory, RequestsClient
+
+from projects.models import User, Project, Person
+from projects.authentication import PrivateKeyAuthentication
+from projects.cache import get_project, get_project_by_private_key, project_cache
+from users.authentication import UserSecretAuthentication
+
+USER_EMAIL = 'adam@gmail.com'
+USER_PASS = 'potato_123'
+
+PROJECT = "Chat Engine 1"
+
+
+def project_queries(context):
+    return [query for query in context.captured_queries if 'projects_project' in query['sql']]
+
+
+class ProjectCacheTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER_EMAIL, password=USER_PASS)
+        self.token = Token.objects.create(user=self.user)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER_EMAIL, secret=USER_PASS)
+        self.factory = APIRequestFactory()
+        self.client = RequestsClient()
+
+    def authenticate(self, authenticator, headers):
+        request = self.factory.get('/users/me/')
+        request.headers = headers
+        return authenticator.authenticate(request)
+
+    def test_hot_projects_cost_no_queries(self):
+        public = {"project-id": str(self.project.public_key), "user-name": USER_EMAIL, "user-secret": USER_PASS}
+        private = {"private-key": str(self.project.private_key)}
+        self.authenticate(UserSecretAuthentication(), public)
+        self.authenticate(PrivateKeyAuthentication(), private)
+
+        project_cache.clear_local()
+        with CaptureQueriesContext(connection) as context:
+            user, project = self.authenticate(UserSecretAuthentication(), public)
+            owner, project = self.authenticate(PrivateKeyAuthentication(), private)
+
+        self.assertEqual(project.pk, self.project.pk)
+        self.assertEqual(owner.email, USER_EMAIL)
+        self.assertEqual(project_queries(context), [])
+        self.assertEqual([query for query in context.captured_queries if 'accounts_user' in query['sql']], [])
+
+    def test_save_and_delete_invalidate(self):
+        self.assertTrue(get_project(self.project.pk).is_active)
+
+        self.project.is_active = False
+        self.project.save()
+        self.assertFalse(get_project(self.project.pk).is_active)
+
+        self.project.delete()
+        with self.assertRaises(Project.DoesNotExist):
+            get_project(self.project.pk)
+
+    def test_rotated_private_key_stops_working(self):
+        old_key = str(self.project.private_key)
+        self.assertEqual(get_project_by_private_key(old_key).pk, self.project.pk)
+
+        response = self.client.patch(
+            'http://127.0.0.1:8000/projects/{}/private_key/'.format(str(self.project.pk)),
+            headers={"Authorization": 'Token {}'.format(self.token.key)}
+        )
+        new_key = json.loads(response.content)['key']
+
+        self.assertEqual(response.status_code, 200)
+        with self.assertRaises(Project.DoesNotExist):
+            get_project_by_private_key(old_key)
+        self.assertEqual(get_project_by_private_key(new_key).pk, self.project.pk)
+        self.assertIsNone(self.authenticate(UserSecretAuthentication(), {"private-key": old_key}))
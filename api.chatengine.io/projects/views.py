@@ -8,16 +8,19 @@ from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from django.db.models import prefetch_related_objects
 from django.shortcuts import get_object_or_404, redirect
 
 from accounts.models import User
 
-from chats.models import Chat, ChatPerson, Message
-from chats.serializers import ChatSerializer
+from chats.models import Chat, Message
+from chats.membership import get_people_ids, replace_members
+from chats.serializers import ChatSerializer, ChatListSerializer
 from chats.publishers import chat_publisher
 
 from users.emailer import emailer
 
+from .cache import invalidate_project
 from .models import Collaborator, Invite, Person, Promo
 from .serializers import InviteSerializer, ProjectSerializer, PersonSerializer, CollaboratorSerializer
 from .authentication import TokenProjectAuthentication
@@ -128,8 +131,10 @@ class PrivateKeyDetails(APIView):
     def patch(self, request, project_id):
         get_object_or_404(Collaborator, user=request.user, project=request.auth)
         project = request.auth
+        previous_key = project.private_key
         project.private_key = uuid.uuid1()
         project.save()
+        invalidate_project(project, private_keys=[previous_key])
         return Response({"key": project.private_key}, status=status.HTTP_200_OK)
 
 
@@ -414,24 +419,17 @@ class ChatDetailsWeb(APIView):
         chat = get_object_or_404(Chat, project=project, pk=chat_id)
         new_chat_people = request.data.get('people', [])
 
-        # Get or create list of new chat people (Add first to minimize writes to DB)
-        user_names = []
-        for new_person in new_chat_people:
-            try:
-                user_name = new_person.get('person', None)
-                person = Person.objects.get(project=project, username=user_name)
-                ChatPerson.objects.get_or_create(chat=chat, person=person)
-                user_names.append(user_name)
-
-            except Exception as e:
-                return Response({'message': 'bad data'}, status=status.HTTP_400_BAD_REQUEST)
+        # Resolve everyone first so a bad username changes nothing
+        try:
+            people_ids = get_people_ids(project, [new_person.get('person', None) for new_person in new_chat_people])
+        except Exception as e:
+            return Response({'message': 'bad data'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Delete the users no longer in the list
-        for current_chat_person in ChatPerson.objects.filter(chat=chat):
-            if current_chat_person.person.username not in user_names:
-                current_chat_person.delete()
+        # Add and remove the difference in bulk, with one members publish and one hook
+        replace_members(chat, people_ids)
 
-        # Publish and return new data
+        # Publish and return new data, every member resolved in one query per relation
+        prefetch_related_objects([chat], *ChatListSerializer.prefetch)
         serializer = ChatSerializer(chat, many=False)
         chat_publisher.publish_chat_data('edit_chat', serializer.data)
 
@@ -7,3 +7,10 @@ redis_client = redis.Redis(
     port=settings.REDIS_PORT, 
     db=settings.REDIS_DB
 )
+
+# Create a Redis connection for caching
+redis_cache = redis.Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_CACHE_DB
+)
@@ -153,7 +153,34 @@ AWS_DEFAULT_ACL = None
 AWS_S3_FILE_OVERWRITE = False
 AWS_S3_SIGNATURE_VERSION = 's3v4'
 AWS_S3_REGION_NAME = 'us-east-1'
-DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+STORAGES = {
+    'default': {'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# File URLs are presigned for AWS_QUERYSTRING_EXPIRE seconds, and the same URL is handed out again
+# until SIGNED_URL_CACHE_MARGIN seconds before that (a margin of the whole lifetime turns it off)
+AWS_QUERYSTRING_EXPIRE = int(os.getenv('AWS_QUERYSTRING_EXPIRE', 60 * 60))
+SIGNED_URL_CACHE_MARGIN = int(os.getenv('SIGNED_URL_CACHE_MARGIN', 5 * 60))
+
+# Message attachment_urls are downloaded by the job worker, this many at a time, each within the
+# timeout (seconds) and size cap (bytes)
+ATTACHMENT_FETCH_CONCURRENCY = int(os.getenv('ATTACHMENT_FETCH_CONCURRENCY', 4))
+ATTACHMENT_FETCH_TIMEOUT = int(os.getenv('ATTACHMENT_FETCH_TIMEOUT', 10))
+ATTACHMENT_MAX_BYTES = int(os.getenv('ATTACHMENT_MAX_BYTES', 25 * 1024 * 1024))
+
+# Attachments and avatars can be posted straight to the bucket: the presigned form is valid for
+# UPLOAD_EXPIRES seconds, its token can be confirmed for UPLOAD_CONFIRM_MAX_AGE
+AVATAR_MAX_BYTES = int(os.getenv('AVATAR_MAX_BYTES', 5 * 1024 * 1024))
+UPLOAD_EXPIRES = int(os.getenv('UPLOAD_EXPIRES', 15 * 60))
+UPLOAD_CONFIRM_MAX_AGE = int(os.getenv('UPLOAD_CONFIRM_MAX_AGE', 24 * 60 * 60))
+
+# Avatars and image attachments get WebP copies fitting in these boxes (px), stored next to the
+# original by the job worker, which decodes and resizes on IMAGE_DERIVATIVE_PROCESSES processes
+AVATAR_DERIVATIVES = {'small': 64, 'medium': 256}
+ATTACHMENT_DERIVATIVES = {'thumbnail': 320, 'preview': 1280}
+IMAGE_DERIVATIVE_PROCESSES = int(os.getenv('IMAGE_DERIVATIVE_PROCESSES', 2))
+IMAGE_DERIVATIVE_QUALITY = int(os.getenv('IMAGE_DERIVATIVE_QUALITY', 80))
 
 # Everything CORS
 from corsheaders.defaults import default_headers
@@ -181,7 +208,23 @@ CSRF_TRUSTED_ORIGINS = [
 import stripe
 stripe.api_key = os.getenv('STRIPE_KEY')
 
+# SendGrid for emails (point SEND_GRID_HOST at a local fake in development)
+SEND_GRID_HOST = os.getenv('SEND_GRID_HOST', 'https://api.sendgrid.com')
+
 # Redis for caching
 REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT = os.getenv('REDIS_PORT', 6379)
 REDIS_DB = os.getenv('REDIS_DB', 1) # 1 for pub/sub
+REDIS_CACHE_DB = os.getenv('REDIS_CACHE_DB', 0) # 0 for caching
+
+# Seconds a verified user-secret is trusted without re-running the password hasher (0 turns it off)
+USER_AUTH_CACHE_TTL = int(os.getenv('USER_AUTH_CACHE_TTL', 60))
+
+# Publish chat events once to chat:<id> and let the ws gateway route them to members
+# (the gateway needs the same CHAT_BROADCAST_MODE, run rebuild_chat_members when turning it on)
+CHAT_BROADCAST_MODE = os.getenv('CHAT_BROADCAST_MODE') == 'true'
+
+# Every person:<id> and chat:<id> channel keeps its last ~N events (for this many idle seconds),
+# so a reconnecting socket can replay what it missed from a seq
+CHAT_EVENT_LOG_LENGTH = int(os.getenv('CHAT_EVENT_LOG_LENGTH', 500))
+CHAT_EVENT_LOG_TTL = int(os.getenv('CHAT_EVENT_LOG_TTL', 60 * 60 * 24))
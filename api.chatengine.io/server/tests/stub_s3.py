@@ -0,0 +1,122 @@
+import json
+import base64
+import threading
+
+from email.parser import BytesParser
+from email.policy import HTTP
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+BUCKET = 'stub-bucket'
+
+
+class StubS3:
+    """
+    Local stand-in for an S3 bucket, addressed path-style: presigned POST uploads (checking the
+    policy's content-length-range), HEAD, GET and DELETE. Signatures aren't checked.
+    `settings` point the default storage (S3Boto3Storage) at it, for override_settings.
+    """
+
+    def __init__(self):
+        self.objects = {}  # key -> (body, content type)
+        self.requests = []
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def get_key(self):
+                path = unquote(urlparse(self.path).path).lstrip('/')
+                bucket, _, key = path.partition('/')
+                return bucket, key
+
+            def do_POST(self):
+                stub.requests.append({'method': 'POST', 'path': self.path})
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                message = BytesParser(policy=HTTP).parsebytes(
+                    'Content-Type: {}\r\n\r\n'.format(self.headers['Content-Type']).encode() + body
+                )
+
+                fields, file_name, data = {}, None, None
+                for part in message.iter_parts():
+                    name = part.get_param('name', header='content-disposition')
+                    if name == 'file':
+                        file_name, data = part.get_filename(), part.get_payload(decode=True)
+                    else:
+                        fields[name] = part.get_payload(decode=True).decode()
+
+                policy = json.loads(base64.b64decode(fields.get('policy', 'e30=')))
+                for condition in policy.get('conditions', []):
+                    if isinstance(condition, list) and condition[0] == 'content-length-range':
+                        if not condition[1] <= len(data) <= condition[2]:
+                            return self.respond(400, b'<Error><Code>EntityTooLarge</Code></Error>')
+
+                key = fields['key'].replace('${filename}', file_name or '')
+                stub.objects[key] = (data, fields.get('Content-Type', 'binary/octet-stream'))
+                self.respond(204)
+
+            def do_HEAD(self):
+                stub.requests.append({'method': 'HEAD', 'path': self.path})
+                _, key = self.get_key()
+                if key not in stub.objects:
+                    return self.respond(404)
+                body, content_type = stub.objects[key]
+                self.respond(200, content_length=len(body), content_type=content_type)
+
+            def do_GET(self):
+                stub.requests.append({'method': 'GET', 'path': self.path})
+                _, key = self.get_key()
+                if key not in stub.objects:
+                    return self.respond(404, b'<Error><Code>NoSuchKey</Code></Error>')
+                body, content_type = stub.objects[key]
+                self.respond(200, body, content_type=content_type)
+
+            def do_DELETE(self):
+                stub.requests.append({'method': 'DELETE', 'path': self.path})
+                stub.objects.pop(self.get_key()[1], None)
+                self.respond(204)
+
+            def respond(self, status, body=b'', content_length=None, content_type='application/xml'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body) if content_length is None else content_length))
+                self.send_header('ETag', '"stub"')
+                self.send_header('Last-Modified', formatdate(usegmt=True))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    @property
+    def settings(self):
+        return {
+            # Django 5.0 drops the OPTIONS of an overridden default storage, S3Boto3Storage reads these instead
+            'STORAGES': {
+                'default': {'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+            'AWS_STORAGE_BUCKET_NAME': BUCKET,
+            'AWS_S3_ENDPOINT_URL': self.url,
+            'AWS_ACCESS_KEY_ID': 'stub',
+            'AWS_SECRET_ACCESS_KEY': 'stub',
+            'AWS_S3_REGION_NAME': 'us-east-1',
+            'AWS_S3_ADDRESSING_STYLE': 'path',
+        }
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
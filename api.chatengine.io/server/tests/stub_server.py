@@ -0,0 +1,59 @@
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer:
+    """
+    Local HTTP server standing in for third party endpoints (webhook receivers, SendGrid, ...).
+    Records every request and answers with the queued statuses, then `default_status`.
+    """
+
+    def __init__(self, default_status=200, body=b'{}'):
+        self.requests = []
+        self.statuses = []
+        self.default_status = default_status
+        self.body = body
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                raw = self.rfile.read(length)
+                try:
+                    data = json.loads(raw) if raw else None
+                except ValueError:
+                    data = raw
+                stub.requests.append({'method': 'POST', 'path': self.path, 'headers': dict(self.headers), 'json': data})
+                self.respond()
+
+            def do_GET(self):
+                stub.requests.append({'method': 'GET', 'path': self.path, 'headers': dict(self.headers), 'json': None})
+                self.respond()
+
+            def respond(self):
+                status = stub.statuses.pop(0) if stub.statuses else stub.default_status
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(stub.body)))
+                self.end_headers()
+                self.wfile.write(stub.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,32 @@
+import time
+import statistics
+
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def rolled_back():
+    # Benchmarks build their fixtures in the real database and throw them away afterwards
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def measure(fn, repeat=5):
+    timings, cpu_timings = [], []
+    with CaptureQueriesContext(connection) as context:
+        for _ in range(repeat):
+            start, cpu_start = time.perf_counter(), time.process_time()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+            cpu_timings.append((time.process_time() - cpu_start) * 1000)
+
+    return {
+        'median_ms': statistics.median(timings),
+        'min_ms': min(timings),
+        'cpu_ms': statistics.median(cpu_timings),
+        'queries': len(context.captured_queries) // repeat,
+    }
@@ -0,0 +1,116 @@
+import time
+import pickle
+import threading
+
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from server.redis import redis_cache
+
+MISSING = object()
+
+
+class TieredCache:
+    """
+    A small per-process LRU in front of Redis.
+
+    Redis is shared by every worker and is where invalidation happens. The local tier
+    can't be reached by other processes, so it only keeps entries for `local_ttl` seconds:
+    a delete is seen everywhere within that window. Values are pickled in both tiers so
+    callers always get their own copy back.
+    """
+
+    def __init__(self, prefix, ttl=300, local_ttl=5, max_size=1024):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.max_size = max_size
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, key):
+        return '{}:{}'.format(self.prefix, key)
+
+    def get_local(self, key):
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is None:
+                return MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.local[key]
+                return MISSING
+            self.local.move_to_end(key)
+            return value
+
+    def set_local(self, key, value):
+        if self.local_ttl <= 0:
+            return
+        with self.lock:
+            self.local[key] = (time.monotonic() + self.local_ttl, value)
+            self.local.move_to_end(key)
+            while len(self.local) > self.max_size:
+                self.local.popitem(last=False)
+
+    def get(self, key, default=None, check=None):
+        # check(value), when given, vets what's read from Redis before it's used or kept locally
+        key = self.key(key)
+        value = self.get_local(key)
+        if value is MISSING:
+            try:
+                value = redis_cache.get(key)
+            except RedisError:
+                value = None
+            if value is None:
+                return default
+            if check is not None and not check(pickle.loads(value)):
+                return default
+            self.set_local(key, value)
+        return pickle.loads(value)
+
+    def get_many(self, keys):
+        """
+        {key: value} for the keys found in either tier. Whatever the local tier misses is read with one MGET.
+        """
+        found, missing = {}, []
+        for key in dict.fromkeys(keys):
+            value = self.get_local(self.key(key))
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(value)
+
+        if len(missing) > 0:
+            try:
+                values = redis_cache.mget([self.key(key) for key in missing])
+            except RedisError:
+                values = []
+            for key, value in zip(missing, values):
+                if value is not None:
+                    self.set_local(self.key(key), value)
+                    found[key] = pickle.loads(value)
+        return found
+
+    def set(self, key, value, ttl=None):
+        key = self.key(key)
+        value = pickle.dumps(value)
+        self.set_local(key, value)
+        try:
+            redis_cache.set(key, value, ex=ttl or self.ttl)
+        except RedisError:
+            pass
+
+    def delete(self, *keys):
+        keys = [self.key(key) for key in keys]
+        with self.lock:
+            for key in keys:
+                self.local.pop(key, None)
+        try:
+            redis_cache.delete(*keys)
+        except RedisError:
+            pass
+
+    def clear_local(self):
+        with self.lock:
+            self.local.clear()
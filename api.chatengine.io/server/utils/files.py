@@ -0,0 +1,118 @@
+import time
+
+from django.conf import settings
+
+from rest_framework import serializers
+
+from server.utils.cache import TieredCache
+
+# <bucket>:<storage name> -> (presigned url, when it stops being handed out)
+signed_url_cache = TieredCache('signed_urls', local_ttl=60 * 10, max_size=10000)
+
+
+def get_signed_url_ttl(storage):
+    # Hand a URL out for a while less than it's signed for, so clients still get time to use it
+    return getattr(storage, 'querystring_expire', 0) - settings.SIGNED_URL_CACHE_MARGIN
+
+
+def get_file_url(file):
+    return get_storage_url(file.storage, file.name)
+
+
+def is_cached(storage):
+    # Storages that don't sign their URLs, or sign them too briefly, skip the cache
+    return getattr(storage, 'querystring_auth', False) and get_signed_url_ttl(storage) > 0
+
+
+def get_signed_url_key(storage, name):
+    return '{}:{}'.format(getattr(storage, 'bucket_name', ''), name)
+
+
+def get_storage_url(storage, name):
+    """
+    The URL of a stored file, presigned at most once per storage path while the signature is fresh.
+
+    Storage names are never reused for new content (uploads get new names), so a cached URL
+    can't point at the wrong bytes. Storages that don't sign their URLs skip the cache.
+    """
+    if not is_cached(storage):
+        return storage.url(name)
+
+    key = get_signed_url_key(storage, name)
+    cached = signed_url_cache.get(key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+
+    ttl = get_signed_url_ttl(storage)
+    url = storage.url(name)
+    signed_url_cache.set(key, (url, time.time() + ttl), ttl=ttl)
+    return url
+
+
+def get_stored_files(instance, file_field, derivatives_field):
+    # (storage, name) of a file and its current derivatives, every URL the fields below sign for it
+    file = getattr(instance, file_field)
+    if not file:
+        return []
+    names = [file.name]
+    derivatives = getattr(instance, derivatives_field)
+    if derivatives.get('source') == file.name:
+        names += derivatives.get('sizes', {}).values()
+    return [(file.storage, name) for name in names]
+
+
+def load_signed_urls(files):
+    """
+    Reads the cached URLs of a page of (storage, name) pairs from Redis in one round trip. They land
+    in the local tier, where get_storage_url finds them while the page is serialized.
+    """
+    signed_url_cache.get_many(get_signed_url_key(storage, name) for storage, name in files if is_cached(storage))
+
+
+def build_url(field, url):
+    request = field.context.get('request', None)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class SignedUrlMixin:
+    def to_representation(self, value):
+        if not value:
+            return None
+        if not getattr(self, 'use_url', True):
+            return value.name
+
+        return build_url(self, get_file_url(value))
+
+
+class SignedFileField(SignedUrlMixin, serializers.FileField):
+    pass
+
+
+class SignedImageField(SignedUrlMixin, serializers.ImageField):
+    pass
+
+
+class DerivativesField(serializers.Field):
+    """
+    Read-only {label: url} of the resized copies of a file (see server.utils.images),
+    empty until they've been rendered for the file that's there now.
+    """
+
+    def __init__(self, file_field, derivatives_field, **kwargs):
+        self.file_field = file_field
+        self.derivatives_field = derivatives_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        file = getattr(instance, self.file_field)
+        derivatives = getattr(instance, self.derivatives_field)
+        if not file or derivatives.get('source') != file.name:
+            return {}
+        return {
+            label: build_url(self, get_storage_url(file.storage, name))
+            for label, name in derivatives.get('sizes', {}).items()
+        }
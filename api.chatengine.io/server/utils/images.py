@@ -0,0 +1,145 @@
+import io
+import os
+import logging
+import warnings
+import multiprocessing
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+
+executor = None
+
+
+def is_image_name(name):
+    return os.path.splitext(name or '')[1].lower() in IMAGE_EXTENSIONS
+
+
+def needs_derivatives(file, derivatives):
+    # Derivatives remember the file they were made from, a new upload leaves them stale
+    return bool(file) and is_image_name(file.name) and derivatives.get('source') != file.name
+
+
+def get_derivative_name(name, label):
+    # Next to the original: avatars/<folder>/me.png -> avatars/<folder>/me.small.webp
+    return '{}.{}.webp'.format(os.path.splitext(name)[0], label)
+
+
+def render_derivatives(data, sizes, quality):
+    """
+    WebP copies of an image, each fitting in a size x size box (never scaled up).
+
+    Runs in the worker processes, so it only needs Pillow. Returns None for anything Pillow
+    can't decode, or that decodes into more pixels than it allows.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            image = Image.open(io.BytesIO(data))
+            # JPEGs can be decoded at a fraction of their size, still larger than the biggest box
+            image.draft('RGB', (max(sizes.values()), max(sizes.values())))
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+    except (OSError, ValueError, Image.DecompressionBombError, Image.DecompressionBombWarning):
+        return None
+
+    rendered = {}
+    # Largest first, each smaller one is resized from the one before
+    for label, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, 'WEBP', quality=quality)
+        rendered[label] = buffer.getvalue()
+    return rendered
+
+
+def get_executor():
+    # Spawned, not forked: the children never touch the parent's database or Redis connections
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_DERIVATIVE_PROCESSES,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return executor
+
+
+def generate_derivatives(queryset, file_field, derivatives_field, sizes):
+    """
+    Renders and stores the derivatives of every row in queryset that doesn't have them yet.
+
+    Decoding and resizing run on the process pool, storage and the database are only touched by
+    the calling thread. Rows sharing a file share its derivatives, they're only rendered when no
+    row has them yet. A row is only updated if its file hasn't changed in the meantime.
+    Returns the pks of the updated rows.
+    """
+    global executor
+    pending, files = defaultdict(list), {}
+    for row in queryset.only('pk', file_field, derivatives_field):
+        file = getattr(row, file_field)
+        if needs_derivatives(file, getattr(row, derivatives_field)):
+            pending[file.name].append(row.pk)
+            files[file.name] = file
+
+    rendered = get_rendered_derivatives(queryset.model, file_field, derivatives_field, pending)
+
+    futures = {}
+    for name, file in files.items():
+        if name not in rendered:
+            with file.storage.open(name, 'rb') as source:
+                data = source.read()
+            futures[name] = get_executor().submit(render_derivatives, data, sizes, settings.IMAGE_DERIVATIVE_QUALITY)
+
+    for name, future in futures.items():
+        try:
+            content = future.result()
+        except BrokenProcessPool:
+            # A child died (out of memory, killed), start a new pool for the retry
+            executor = None
+            raise
+
+        names = {}
+        if content is None:
+            logger.warning('Skipping derivatives of %s: not a readable image', name)
+        else:
+            storage = files[name].storage
+            for label, data in content.items():
+                names[label] = get_derivative_name(name, label)
+                if not storage.exists(names[label]):
+                    names[label] = storage.save(names[label], ContentFile(data))
+        rendered[name] = {'source': name, 'sizes': names}
+
+    updated = []
+    for name, pks in pending.items():
+        count = queryset.model.objects.filter(pk__in=pks, **{file_field: name}).update(**{derivatives_field: rendered[name]})
+        if count > 0:
+            updated += pks
+    return updated
+
+
+def get_rendered_derivatives(model, file_field, derivatives_field, pending):
+    # {file name: derivatives} from other rows with the same files
+    rendered = {}
+    if len(pending) == 0:
+        return rendered
+
+    pks = [pk for pks in pending.values() for pk in pks]
+    rows = model.objects.filter(**{'{}__in'.format(file_field): list(pending)}).exclude(pk__in=pks) \
+        .only('pk', file_field, derivatives_field)
+    for row in rows.iterator():
+        name, derivatives = getattr(row, file_field).name, getattr(row, derivatives_field)
+        if derivatives.get('source') == name:
+            rendered[name] = derivatives
+            if len(rendered) == len(pending):
+                break
+    return rendered
@@ -0,0 +1,114 @@
+import json
+import time
+import uuid
+import logging
+
+from django.utils.module_loading import import_string
+
+from server.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Moves the retries that are due (scored by when) from the sorted set KEYS[1] onto the list KEYS[2]
+PROMOTE_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, job in ipairs(due) do
+    redis.call('ZREM', KEYS[1], job)
+    redis.call('LPUSH', KEYS[2], job)
+end
+return #due
+"""
+promote_due = redis_client.register_script(PROMOTE_DUE)
+
+
+class JobQueue:
+    """
+    A Redis list of function calls, run by the run_jobs command.
+
+    Jobs are stored as the function's dotted path plus JSON arguments, so anything importable
+    with JSON-friendly arguments can be queued. A job that raises is retried after `backoff`
+    seconds, doubled after each attempt, until it has had `max_attempts` runs, then logged and
+    dropped: use it for best-effort side effects (emails, fetches), not for anything that needs an
+    outbox. Retries wait in a sorted set scored by when they're due, pop moves them back.
+    """
+
+    def __init__(self, name='jobs', max_attempts=5, backoff=30, max_backoff=3600):
+        self.key = 'queue:{}'.format(name)
+        self.retry_key = 'queue:{}:retry'.format(name)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def enqueue(self, fn, *args, **kwargs):
+        # The id keeps identical jobs apart in the retry set
+        job = {
+            'id': uuid.uuid4().hex, 'path': '{}.{}'.format(fn.__module__, fn.__qualname__),
+            'args': args, 'kwargs': kwargs, 'attempts': 0
+        }
+        redis_client.lpush(self.key, json.dumps(job))
+
+    def depth(self):
+        return redis_client.llen(self.key)
+
+    def scheduled(self):
+        return redis_client.zcard(self.retry_key)
+
+    def clear(self):
+        redis_client.delete(self.key, self.retry_key)
+
+    def retry_delay(self, attempts):
+        return min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+
+    def promote(self, now=None, batch_size=100):
+        # Queues the retries that are due, returns how many
+        now = time.time() if now is None else now
+        return promote_due(keys=[self.retry_key, self.key], args=[now, batch_size])
+
+    def pop(self, timeout=None):
+        self.promote()
+        if timeout is None:
+            raw = redis_client.rpop(self.key)
+        else:
+            item = redis_client.brpop(self.key, timeout=timeout)
+            raw = item[1] if item is not None else None
+        return json.loads(raw) if raw is not None else None
+
+    def execute(self, job):
+        try:
+            import_string(job['path'])(*job['args'], **job['kwargs'])
+            return True
+        except Exception:
+            job['attempts'] += 1
+            if job['attempts'] < self.max_attempts:
+                delay = self.retry_delay(job['attempts'])
+                logger.warning(
+                    'Job %s failed, retrying in %ds (%d/%d)', job['path'], delay, job['attempts'], self.max_attempts, exc_info=True
+                )
+                job.setdefault('id', uuid.uuid4().hex)
+                redis_client.zadd(self.retry_key, {json.dumps(job): time.time() + delay})
+            else:
+                logger.error('Job %s failed %d times, dropping it', job['path'], job['attempts'], exc_info=True)
+            return False
+
+    def drain(self):
+        # Runs until the queue is empty, for tests and one-off runs. Retries that aren't due stay scheduled
+        stats = {'succeeded': 0, 'failed': 0}
+        job = self.pop()
+        while job is not None:
+            stats['succeeded' if self.execute(job) else 'failed'] += 1
+            job = self.pop()
+        return stats
+
+    def run(self, poll_timeout=1, report=print):
+        while True:
+            job = self.pop(timeout=poll_timeout)
+            if job is None:
+                continue
+            started = time.perf_counter()
+            succeeded = self.execute(job)
+            report('Job {} {} in {:.3f}s | queue depth {}'.format(
+                job['path'], 'done' if succeeded else 'failed', time.perf_counter() - started, self.depth()
+            ))
+
+
+job_queue = JobQueue()
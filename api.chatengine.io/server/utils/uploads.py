@@ -0,0 +1,65 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+
+from storages.utils import clean_name
+
+SALT = 'server.utils.uploads'
+
+
+class UploadError(Exception):
+    pass
+
+
+def get_upload_key(prefix, file_name):
+    # A fresh folder per upload, so two people sending photo.jpg can't overwrite each other
+    return '{}/{}/{}'.format(prefix, uuid.uuid4().hex, os.path.basename(file_name or '') or 'file')
+
+
+def create_upload(prefix, scope, file_name, max_bytes, content_type=None, storage=default_storage):
+    """
+    Presigns a direct POST of one file into the bucket, the bytes never go through the API.
+
+    Returns the form's url and fields plus a token. Once the client has posted the file, the token
+    goes back to the API, and confirm_upload turns it into a storage name, for the same scope only.
+    """
+    if not hasattr(storage, 'bucket_name'):
+        raise UploadError('Direct uploads need an S3 storage')
+
+    key = get_upload_key(prefix, file_name)
+    fields = {}
+    conditions = [['content-length-range', 1, max_bytes]]
+    if content_type:
+        fields['Content-Type'] = content_type
+        conditions.append({'Content-Type': content_type})
+
+    post = storage.connection.meta.client.generate_presigned_post(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(clean_name(key)),
+        Fields=fields,
+        Conditions=conditions,
+        ExpiresIn=settings.UPLOAD_EXPIRES
+    )
+    token = signing.dumps({'key': key, 'scope': scope}, salt=SALT)
+    return {'url': post['url'], 'fields': post['fields'], 'token': token}
+
+
+def confirm_upload(token, scope, storage=default_storage):
+    """
+    Returns the storage name of an upload made with create_upload's target.
+
+    Raises UploadError when the token is forged, expired or for another scope, or nothing was uploaded.
+    """
+    try:
+        data = signing.loads(token, salt=SALT, max_age=settings.UPLOAD_CONFIRM_MAX_AGE)
+    except signing.BadSignature:
+        raise UploadError('Invalid or expired upload token')
+
+    if data.get('scope') != scope:
+        raise UploadError('Upload token is for something else')
+    if not storage.exists(data['key']):
+        raise UploadError('Nothing was uploaded for this token')
+    return data['key']
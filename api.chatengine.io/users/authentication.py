@@ -3,11 +3,14 @@ from rest_framework import authentication
 
 from django.contrib.auth.hashers import check_password
 
-from projects.models import Project, Person
+from projects.models import Person
+from projects.cache import get_project, get_project_by_private_key
 from chats.models import Chat
 
 from subscriptions.upgrade_email import upgrade_emailer
 
+from .cache import get_verified_credential, set_verified_credential
+
 
 def get_chat_id(request):
     try:
@@ -30,19 +33,28 @@ class UserSecretAuthentication(authentication.BaseAuthentication):
 
         try:
             if public_key is not None:
-                project = Project.objects.get(public_key=public_key)
+                project = get_project(public_key)
 
                 if not project.is_active:
                     upgrade_emailer.email_project_is_inactive(project=project)
                     raise Exception
 
-                user = Person.objects.get(project=project, username=username)
-                if not check_password(secret, user.secret):
-                    raise Exception(Person.DoesNotExist, '')
+                # A cached verification only counts while the stored hash is still the one it was checked against
+                user = None
+                verified = get_verified_credential(project.pk, username, secret)
+                if verified is not None:
+                    person_id, stored_secret = verified
+                    user = Person.objects.filter(pk=person_id, project=project, username=username, secret=stored_secret).order_by('pk').first()
+
+                if user is None:
+                    user = Person.objects.get(project=project, username=username)
+                    if not check_password(secret, user.secret):
+                        raise Exception(Person.DoesNotExist, '')
+                    set_verified_credential(project.pk, username, secret, user)
                 return user, project
 
             if private_key is not None:
-                project = Project.objects.get(private_key=private_key)
+                project = get_project_by_private_key(private_key)
 
                 if not project.is_active:
                     upgrade_emailer.email_project_is_inactive(project=project)
@@ -0,0 +1,55 @@
+import hmac
+import hashlib
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from server.redis import redis_cache
+from server.utils.cache import TieredCache
+
+# digest of (project, username, secret) -> (person pk, stored hash) once the secret has passed check_password
+credential_cache = TieredCache('credentials', local_ttl=5)
+
+
+def get_credential_key(project_id, username, secret):
+    # Keyed so a leaked cache key can't be brute forced offline without SECRET_KEY
+    message = '\0'.join([str(project_id), username, secret]).encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def get_person_credentials_key(person_id):
+    return 'credential_people:{}'.format(person_id)
+
+
+def get_verified_credential(project_id, username, secret):
+    if settings.USER_AUTH_CACHE_TTL <= 0:
+        return None
+    return credential_cache.get(get_credential_key(project_id, username, secret))
+
+
+def set_verified_credential(project_id, username, secret, person):
+    ttl = settings.USER_AUTH_CACHE_TTL
+    if ttl <= 0:
+        return
+
+    key = get_credential_key(project_id, username, secret)
+    credential_cache.set(key, (person.pk, person.secret), ttl=ttl)
+
+    # Remember which digests belong to the person so a secret change can drop them
+    try:
+        pipeline = redis_cache.pipeline(transaction=False)
+        pipeline.sadd(get_person_credentials_key(person.pk), key)
+        pipeline.expire(get_person_credentials_key(person.pk), ttl)
+        pipeline.execute()
+    except RedisError:
+        pass
+
+
+def invalidate_person_credentials(person_id):
+    try:
+        keys = [key.decode() for key in redis_cache.smembers(get_person_credentials_key(person_id))]
+        redis_cache.delete(get_person_credentials_key(person_id))
+    except RedisError:
+        return
+    if len(keys) > 0:
+        credential_cache.delete(*keys)
@@ -0,0 +1,45 @@
+import time
+import uuid
+
+from django.test import Client, override_settings
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from projects.models import Project, Person
+
+from server.utils.benchmark import rolled_back
+
+SECRET = 'benchmark-secret'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark requests/sec through user-secret auth in one process, with and without the credential cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--path', default='/users/me/')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            user = User.objects.create_user(email='benchmark-{}@chatengine.io'.format(uuid.uuid4()), password='benchmark')
+            project = Project.objects.create(owner=user, title='Benchmark')
+            Person.objects.create(project=project, username='benchmark', secret=SECRET)
+            headers = {'project-id': str(project.public_key), 'user-name': 'benchmark', 'user-secret': SECRET}
+
+            # A single process serving requests back to back, like one sync gunicorn worker
+            results = []
+            for label, ttl in (('check_password every request', 0), ('credential cache', 60)):
+                with override_settings(USER_AUTH_CACHE_TTL=ttl):
+                    client = Client(headers=headers)
+                    client.get(options['path'])  # Warm up
+                    start = time.perf_counter()
+                    for _ in range(options['requests']):
+                        response = client.get(options['path'])
+                    elapsed = time.perf_counter() - start
+                    if response.status_code != 200:
+                        self.stderr.write('{} returned {}'.format(options['path'], response.status_code))
+                    results.append((label, options['requests'] / elapsed, elapsed * 1000 / options['requests']))
+
+        self.stdout.write('GET {} x {}'.format(options['path'], options['requests']))
+        for label, rate, latency in results:
+            self.stdout.write('{:>30}: {:8.1f} req/s, {:6.2f} ms/request'.format(label, rate, latency))
@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.test import override_settings
+from rest_framework.test import APITestCase, APIRequestFactory
+
+from chats.models import Person
+
+from projects.models import User, Project
+
+from users import authentication
+from users.authentication import UserSecretAuthentication
+from users.cache import credential_cache, get_credential_key
+
+EMAIL = 'test@mail.co'
+PASSWORD = 'testpass1234'
+NEW_PASSWORD = 'newpass1234'
+
+PROJECT = 'Test Project'
+
+
+class UserSecretAuthenticationCacheTestCase(APITestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.authenticator = UserSecretAuthentication()
+
+        self.user = User.objects.create_user(email=EMAIL, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=EMAIL, secret=PASSWORD)
+
+    def authenticate(self, secret):
+        request = self.factory.get('/chats/')
+        request.headers = {
+            "project-id": str(self.project.public_key),
+            "user-name": EMAIL,
+            "user-secret": secret,
+        }
+        with mock.patch.object(authentication, 'check_password', wraps=authentication.check_password) as check:
+            response = self.authenticator.authenticate(request)
+        return response, check.call_count
+
+    def test_repeat_requests_skip_the_hasher(self):
+        response, checks = self.authenticate(PASSWORD)
+        self.assertEqual(response[0].pk, self.person.pk)
+        self.assertEqual(checks, 1)
+
+        response, checks = self.authenticate(PASSWORD)
+        self.assertEqual(response[0].pk, self.person.pk)
+        self.assertEqual(response[1].pk, self.project.pk)
+        self.assertEqual(checks, 0)
+
+    def test_wrong_secret_is_not_cached(self):
+        self.assertEqual(self.authenticate('wrong'), (None, 1))
+        self.assertEqual(self.authenticate('wrong'), (None, 1))
+        self.assertIsNone(credential_cache.get(get_credential_key(self.project.pk, EMAIL, 'wrong')))
+
+    def test_secret_change_invalidates(self):
+        self.authenticate(PASSWORD)
+        self.person.secret = NEW_PASSWORD
+        self.person.save()
+
+        self.assertIsNone(credential_cache.get(get_credential_key(self.project.pk, EMAIL, PASSWORD)))
+        self.assertEqual(self.authenticate(PASSWORD), (None, 1))
+        response, checks = self.authenticate(NEW_PASSWORD)
+        self.assertEqual(response[0].pk, self.person.pk)
+
+    def test_stale_entry_is_not_trusted(self):
+        self.authenticate(PASSWORD)
+        # Another process changed the secret and this one still has the entry in its local tier
+        Person.objects.filter(pk=self.person.pk).update(secret='pbkdf2_sha256$other')
+
+        self.assertEqual(self.authenticate(PASSWORD), (None, 1))
+
+    @override_settings(USER_AUTH_CACHE_TTL=0)
+    def test_can_be_turned_off(self):
+        self.authenticate(PASSWORD)
+        response, checks = self.authenticate(PASSWORD)
+        self.assertEqual(response[0].pk, self.person.pk)
+        self.assertEqual(checks, 1)
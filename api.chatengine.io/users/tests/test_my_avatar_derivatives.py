@@ -0,0 +1,88 @@
+import io
+import tempfile
+
+from django.test import override_settings
+from rest_framework.test import APITestCase, RequestsClient
+
+from PIL import Image
+
+from chats.models import Person
+from projects.models import User, Project
+from projects.serializers import PersonPublicSerializer
+
+from server.utils.jobs import job_queue
+
+USER = 'adam@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+
+
+def get_image_bytes(size):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'blue').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@override_settings(AVATAR_DERIVATIVES={'small': 16, 'medium': 64})
+class MyAvatarDerivativesTestCase(APITestCase):
+    def setUp(self):
+        job_queue.clear()
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+
+        self.media = tempfile.TemporaryDirectory()
+        # MEDIA_ROOT, not OPTIONS: Django 5.0 drops the OPTIONS of an overridden default storage
+        storages = override_settings(MEDIA_ROOT=self.media.name, STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storages.enable()
+        self.addCleanup(storages.disable)
+        self.addCleanup(self.media.cleanup)
+
+    def tearDown(self):
+        job_queue.clear()
+
+    def patch_avatar(self, size):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = RequestsClient().patch(
+                'http://127.0.0.1:8000/users/me/',
+                headers={"public-key": str(self.project.public_key), "user-name": USER, "user-secret": PASSWORD},
+                files={'avatar': ('me.jpg', get_image_bytes(size), 'image/jpeg')}
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_new_avatars_get_derivatives(self):
+        data = self.patch_avatar((300, 300))
+        self.assertEqual(data['avatar_derivatives'], {})
+        self.assertEqual(job_queue.drain(), {'succeeded': 1, 'failed': 0})
+
+        self.person.refresh_from_db()
+        sizes = self.person.avatar_derivatives['sizes']
+        self.assertEqual(self.person.avatar_derivatives['source'], self.person.avatar.name)
+        with self.person.avatar.storage.open(sizes['small']) as small:
+            self.assertEqual(Image.open(small).size, (16, 16))
+
+        derivatives = PersonPublicSerializer(self.person).data['avatar_derivatives']
+        self.assertEqual(sorted(derivatives), ['medium', 'small'])
+        self.assertTrue(derivatives['small'].endswith('.small.webp'))
+
+        # Saving a stale instance leaves them alone, a new avatar replaces them
+        stale = Person.objects.get(pk=self.person.pk)
+        stale.avatar_derivatives = {}
+        stale.first_name = 'Adam'
+        stale.save()
+        self.person.refresh_from_db()
+        self.assertEqual(self.person.avatar_derivatives['sizes'], sizes)
+
+        self.patch_avatar((40, 40))
+        self.person.refresh_from_db()
+        self.assertEqual(PersonPublicSerializer(self.person).data['avatar_derivatives'], {})
+        self.assertEqual(job_queue.drain(), {'succeeded': 1, 'failed': 0})
+
+        self.person.refresh_from_db()
+        self.assertEqual(self.person.avatar_derivatives['source'], self.person.avatar.name)
+        with self.person.avatar.storage.open(self.person.avatar_derivatives['sizes']['medium']) as medium:
+            self.assertEqual(Image.open(medium).size, (40, 40))
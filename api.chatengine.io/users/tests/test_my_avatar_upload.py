@@ -0,0 +1,66 @@
+import requests
+
+from django.test import override_settings
+from rest_framework.test import APITestCase, RequestsClient
+
+from chats.models import Person
+from projects.models import User, Project
+
+from server.tests.stub_s3 import StubS3
+
+USER = 'adam@gmail.com'
+USER_2 = 'eve@gmail.com'
+PASSWORD = 'potato_123'
+PROJECT = "Chat Engine Project"
+
+
+class MyAvatarUploadTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER, password=PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(project=self.project, username=USER, secret=PASSWORD)
+        self.person_2 = Person.objects.create(project=self.project, username=USER_2, secret=PASSWORD)
+
+        self.s3 = StubS3().__enter__()
+        self.addCleanup(self.s3.__exit__)
+        storages = override_settings(**self.s3.settings)
+        storages.enable()
+        self.addCleanup(storages.disable)
+
+    def headers(self, username):
+        return {"public-key": str(self.project.public_key), "user-name": username, "user-secret": PASSWORD}
+
+    def upload(self, username):
+        response = RequestsClient().post(
+            'http://127.0.0.1:8000/users/me/avatar/upload/',
+            headers=self.headers(username),
+            json={'file_name': 'me.jpg', 'content_type': 'image/jpeg'}
+        )
+        self.assertEqual(response.status_code, 201)
+        upload = response.json()
+        requests.post(upload['url'], data=upload['fields'], files={'file': ('me.jpg', b'jpeg bytes')})
+        return upload
+
+    def patch(self, username, token):
+        return RequestsClient().patch(
+            'http://127.0.0.1:8000/users/me/',
+            headers=self.headers(username),
+            json={'avatar_upload': token}
+        )
+
+    def test_confirm_sets_avatar(self):
+        upload = self.upload(USER)
+
+        response = self.patch(USER, upload['token'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Person.objects.get(pk=self.person.pk).avatar.name, upload['fields']['key'])
+        self.assertTrue(upload['fields']['key'].startswith('avatars/'))
+
+    def test_token_is_scoped_to_its_person(self):
+        upload = self.upload(USER)
+
+        response = self.patch(USER_2, upload['token'])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Person.objects.get(pk=self.person_2.pk).avatar)
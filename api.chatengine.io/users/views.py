@@ -4,17 +4,20 @@ from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from django.conf import settings
 from django.db import IntegrityError
 from django.shortcuts import get_object_or_404
 
 from projects.models import Person
-from projects.serializers import PersonSerializer
+from projects.serializers import PersonSerializer, get_avatar_scope
 from projects.authentication import PrivateKeyAuthentication
 
 from chats.models import ChatPerson
 from chats.serializers import ChatSerializer
 from chats.publishers import chat_publisher
 
+from server.utils.uploads import create_upload, UploadError
+
 from users.models import Session
 from users.serializers import SessionSerializer
 
@@ -47,6 +50,23 @@ class MyDetails(APIView):
         return Response(person_json, status=status.HTTP_200_OK)
 
 
+class MyAvatarUpload(APIView):
+    throttle_scope = 'burst'
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = (UserSecretAuthentication,)
+
+    def post(self, request):
+        # A presigned form to post the avatar to the bucket, its token goes in avatar_upload on PATCH me/
+        try:
+            upload = create_upload(
+                'avatars', get_avatar_scope(request.user), request.data.get('file_name', None),
+                settings.AVATAR_MAX_BYTES, content_type=request.data.get('content_type', None)
+            )
+        except UploadError as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(upload, status=status.HTTP_201_CREATED)
+
+
 class MySession(APIView):
     throttle_scope = 'burst'
     permission_classes = (permissions.IsAuthenticated,)
@@ -1,3 +1,6 @@
 from django.contrib import admin
+from .models import Webhook, WebhookDelivery, WebhookDeadLetter
 
-# Register your models here.
+admin.site.register(Webhook)
+admin.site.register(WebhookDelivery)
+admin.site.register(WebhookDeadLetter)
@@ -0,0 +1,68 @@
+from django.db import transaction
+
+from redis.exceptions import RedisError
+
+from server.redis import redis_cache
+from server.utils.cache import TieredCache
+
+from .models import Webhook
+from .serializers import WebhookSerializer
+
+# event_trigger -> webhook json for each project, {} when nothing is configured. Stored along with
+# the generation it was read under
+webhook_cache = TieredCache('webhooks', ttl=60 * 60, local_ttl=5)
+
+
+def get_generation_key(project_id):
+    return 'webhooks_generation:{}'.format(project_id)
+
+
+def get_generation(project_id):
+    # Counts the project's invalidations, None when Redis can't say
+    try:
+        return int(redis_cache.get(get_generation_key(project_id)) or 0)
+    except RedisError:
+        return None
+
+
+def get_project_webhooks(project_id):
+    """
+    A project's webhooks, from the cache while it holds the current generation.
+
+    A read that races an invalidation can store rows from before the change committed. They're
+    stored under the generation read first, which the invalidation has moved past, so no other
+    process takes them for current.
+    """
+    project_id = str(project_id)
+    cached = webhook_cache.get(project_id, check=lambda cached: cached[0] == get_generation(project_id))
+    if cached is not None:
+        return cached[1]
+
+    generation = get_generation(project_id)
+    webhooks = {
+        webhook.event_trigger: dict(WebhookSerializer(webhook, many=False).data)
+        for webhook in Webhook.objects.filter(project=project_id)
+    }
+    if generation is not None:
+        webhook_cache.set(project_id, (generation, webhooks))
+    return webhooks
+
+
+def get_webhook(project_id, event_trigger):
+    return get_project_webhooks(project_id).get(event_trigger, None)
+
+
+def bump_generation(project_id):
+    project_id = str(project_id)
+    try:
+        redis_cache.incr(get_generation_key(project_id))
+    except RedisError:
+        pass
+    webhook_cache.delete(project_id)
+
+
+def invalidate_project_webhooks(project_id):
+    # Now, for reads later in this transaction, and again once it commits: a read from another
+    # transaction in between still sees the old rows
+    bump_generation(project_id)
+    transaction.on_commit(lambda: bump_generation(project_id))
@@ -0,0 +1,77 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from projects.models import Project, Person
+from projects.serializers import ProjectSerializer
+from chats.models import Chat, Message
+from chats.serializers import ChatSerializer, MessageSerializer
+
+from webhooks.models import Webhook
+
+from server.utils.benchmark import rolled_back
+
+EVENTS = ('On New Message', 'On Edit Message', 'On Delete Message')
+
+
+def eager_payload(message):
+    # What every signal built before payloads were lazy, subscriber or not
+    ProjectSerializer(message.chat.project, many=False).data
+    ChatSerializer(message.chat, many=False).data
+    MessageSerializer(message, many=False).data
+
+
+class Command(BaseCommand):
+    help = 'Benchmark message create/edit/delete throughput with and without webhooks (fixtures are rolled back).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        with rolled_back():
+            results = [
+                ('no webhooks, eager payloads', self.run(count, webhooks=False, eager=True)),
+                ('no webhooks', self.run(count, webhooks=False)),
+                ('webhooks', self.run(count, webhooks=True)),
+            ]
+
+        self.stdout.write('{} messages per event'.format(count))
+        for label, timings in results:
+            self.stdout.write('{:>28}: '.format(label) + ' | '.join(
+                '{} {:8.0f}/s'.format(event, count / timings[event]) for event in EVENTS
+            ))
+
+    def run(self, count, webhooks=False, eager=False):
+        user = User.objects.create_user(email='benchmark-{}@chatengine.io'.format(uuid.uuid4()), password='benchmark')
+        project = Project.objects.create(owner=user, title='Benchmark')
+        person = Person.objects.create(project=project, username='benchmark', secret='benchmark')
+        chat = Chat.objects.create(project=project, admin=person, title='Benchmark')
+        if webhooks:
+            for event in EVENTS:
+                Webhook.objects.create(project=project, event_trigger=event, url='http://127.0.0.1:9/hook/')
+
+        def timed(operation, pre_delete=False):
+            start = time.perf_counter()
+            for message in messages:
+                if eager and pre_delete:
+                    eager_payload(message)
+                operation(message)
+                if eager and not pre_delete:
+                    eager_payload(message)
+            return time.perf_counter() - start
+
+        timings = {}
+        messages = [Message(chat=chat, sender=person, text='Message {}'.format(i)) for i in range(count)]
+        timings['On New Message'] = timed(lambda message: message.save())
+
+        def edit(message):
+            message.text = 'Edited'
+            message.save()
+        timings['On Edit Message'] = timed(edit)
+
+        messages = [Message.objects.select_related('chat__project').get(pk=message.pk) for message in messages]
+        timings['On Delete Message'] = timed(lambda message: message.delete(), pre_delete=True)
+        return timings
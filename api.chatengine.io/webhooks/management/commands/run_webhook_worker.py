@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from webhooks.worker import WebhookWorker
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued webhooks with retries, moving exhausted deliveries to the dead letter table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--timeout', type=float, default=5)
+        parser.add_argument('--max-attempts', type=int, default=8)
+        parser.add_argument('--backoff', type=float, default=30, help='Seconds before the first retry, doubled after each attempt')
+        parser.add_argument('--poll-interval', type=float, default=1)
+        parser.add_argument('--once', action='store_true', help='Drain what is due and exit')
+
+    def handle(self, *args, **options):
+        worker = WebhookWorker(
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+            timeout=options['timeout'],
+            max_attempts=options['max_attempts'],
+            backoff=options['backoff'],
+        )
+        self.stdout.write('Webhook worker started, queue depth {}'.format(worker.queue_depth()))
+        worker.run(poll_interval=options['poll_interval'], once=options['once'], report=self.stdout.write)
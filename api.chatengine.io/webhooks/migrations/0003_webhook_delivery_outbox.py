@@ -0,0 +1,53 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:27
+
+import django.db.models.deletion
+import django.utils.timezone
+import jsonfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        ('webhooks', '0002_alter_webhook_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookDeadLetter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_trigger', models.CharField(max_length=1000)),
+                ('url', models.URLField()),
+                ('payload', jsonfield.fields.JSONField(default=dict)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created', models.DateTimeField()),
+                ('failed', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(db_column='public_key', on_delete=django.db.models.deletion.CASCADE, related_name='webhook_dead_letters', to='projects.project')),
+            ],
+            options={
+                'ordering': ('project', '-failed'),
+                'indexes': [models.Index(fields=['project', '-failed'], name='webhooks_we_public__f105f5_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WebhookDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_trigger', models.CharField(max_length=1000)),
+                ('url', models.URLField()),
+                ('payload', jsonfield.fields.JSONField(default=dict)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(db_column='public_key', on_delete=django.db.models.deletion.CASCADE, related_name='webhook_deliveries', to='projects.project')),
+            ],
+            options={
+                'ordering': ('next_attempt', 'id'),
+                'indexes': [models.Index(fields=['next_attempt', 'id'], name='webhooks_we_next_at_ed6e71_idx')],
+            },
+        ),
+    ]
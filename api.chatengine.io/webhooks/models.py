@@ -1,8 +1,11 @@
 import uuid
 
+from jsonfield import JSONField
+
 from django.db import models
+from django.utils import timezone
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 
 from projects.models import Project
 
@@ -20,6 +23,58 @@ class Webhook(models.Model):
 
 @receiver(post_save, sender=Webhook)
 def post_save_webhook(instance, created, **kwargs):
+    from .cache import invalidate_project_webhooks
+    invalidate_project_webhooks(instance.project_id)
     if created:
         instance.secret = 'whk-{}'.format(str(uuid.uuid4()))
         instance.save()
+
+
+@receiver(post_delete, sender=Webhook)
+def post_delete_webhook(instance, **kwargs):
+    from .cache import invalidate_project_webhooks
+    invalidate_project_webhooks(instance.project_id)
+
+
+class WebhookDelivery(models.Model):
+    project = models.ForeignKey(Project, db_column="public_key", related_name="webhook_deliveries", on_delete=models.CASCADE)
+    event_trigger = models.CharField(max_length=1000)
+    url = models.URLField()
+    payload = JSONField(default=dict)
+
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(default='', blank=True)
+
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '{} - {} ({} attempts)'.format(self.project_id, self.event_trigger, self.attempts)
+
+    class Meta:
+        ordering = ('next_attempt', 'id')
+        indexes = [
+            models.Index(fields=['next_attempt', 'id']),
+        ]
+
+
+class WebhookDeadLetter(models.Model):
+    project = models.ForeignKey(Project, db_column="public_key", related_name="webhook_dead_letters", on_delete=models.CASCADE)
+    event_trigger = models.CharField(max_length=1000)
+    url = models.URLField()
+    payload = JSONField(default=dict)
+
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(default='', blank=True)
+
+    created = models.DateTimeField()
+    failed = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '{} - {} ({} attempts)'.format(self.project_id, self.event_trigger, self.attempts)
+
+    class Meta:
+        ordering = ('project', '-failed')
+        indexes = [
+            models.Index(fields=['project', '-failed']),
+        ]
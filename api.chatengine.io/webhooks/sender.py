@@ -1,48 +1,101 @@
 import requests
 import urllib3
 
-from django.http import Http404
-from django.shortcuts import get_object_or_404
+from requests.adapters import HTTPAdapter
 
-from .models import Webhook
-from .serializers import WebhookSerializer
+from .cache import get_webhook
+from .models import WebhookDelivery
+
+
+def get_session(pool_size=10):
+    # One keep-alive pool per host instead of a new connection per hook
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def resolve(value):
+    # Payload parts may be passed as callables so they're only serialized for a subscriber
+    return value() if callable(value) else value
 
 
 class Hook:
     def __init__(self):
-        pass
+        self.session = get_session()
+
+    def get_payload(self, event_trigger=None, project_id=None, project_json=None, chat_json=None, person_json=None, message_json=None, messages_json=None):
+        if project_id is None:
+            project_id = project_json['public_key']
+
+        webhook = get_webhook(project_id, event_trigger)
+        if webhook is None:
+            return None, None
+
+        data = {
+            "project": resolve(project_json),
+            "webhook": webhook,
+            "chat": resolve(chat_json),
+            "person": resolve(person_json),
+            "message": resolve(message_json)
+        }
+        # Bulk deletes report every message of the chat in one event
+        if messages_json is not None:
+            data["messages"] = resolve(messages_json)
+        return webhook, data
+
+    def enqueue(self, event_trigger=None, project_id=None, project_json=None, chat_json=None, person_json=None, message_json=None, messages_json=None):
+        webhook, data = self.get_payload(
+            event_trigger=event_trigger,
+            project_id=project_id,
+            project_json=project_json,
+            chat_json=chat_json,
+            person_json=person_json,
+            message_json=message_json,
+            messages_json=messages_json
+        )
+        if webhook is None:
+            return None
+
+        # Delivered later by the run_webhook_worker command, off the request path
+        return WebhookDelivery.objects.create(
+            project_id=data['project']['public_key'],
+            event_trigger=event_trigger,
+            url=webhook['url'],
+            payload=data
+        )
+
+    def send(self, url, data, timeout=0.5, session=None):
+        session = session if session is not None else self.session
+        return session.post(url, json=data, timeout=timeout)
 
     def post(self, event_trigger=None, project_json=None, chat_json=None, person_json=None, message_json=None, timeout=0.5):
-        try:
-            webhook = get_object_or_404(Webhook, project=project_json['public_key'], event_trigger=event_trigger)
-            webhook_json = WebhookSerializer(webhook, many=False).data
-
-            data = {
-                "project": project_json,
-                "webhook": webhook_json,
-                "chat": chat_json,
-                "person": person_json,
-                "message": message_json
-            }
-
-            try:
-                response = requests.post(webhook.url, json=data, timeout=timeout)
-                return response, data
-
-            except requests.exceptions.ReadTimeout:
-                print('ReadTimeout')
-                return None, data
-
-            except urllib3.exceptions.MaxRetryError:
-                print('MaxRetryError')
-                return None, data
-
-            except requests.exceptions.ConnectionError:
-                print('ConnectionError')
-                return None, data
-
-        except Http404:
+        webhook, data = self.get_payload(
+            event_trigger=event_trigger,
+            project_json=project_json,
+            chat_json=chat_json,
+            person_json=person_json,
+            message_json=message_json
+        )
+        if webhook is None:
             return None, None
 
+        try:
+            response = self.send(webhook['url'], data, timeout=timeout)
+            return response, data
+
+        except requests.exceptions.ReadTimeout:
+            print('ReadTimeout')
+            return None, data
+
+        except urllib3.exceptions.MaxRetryError:
+            print('MaxRetryError')
+            return None, data
+
+        except requests.exceptions.ConnectionError:
+            print('ConnectionError')
+            return None, data
+
 
 hook = Hook()
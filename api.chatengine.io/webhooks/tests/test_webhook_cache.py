@@ -0,0 +1,70 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from chats.models import Person, Chat, Message
+from projects.models import User, Project
+
+from webhooks.models import Webhook
+from webhooks.cache import get_generation, get_project_webhooks, webhook_cache
+
+USER_EMAIL = 'adam@gmail.com'
+USER_PASSWORD = 'potato_123'
+
+PROJECT = "Engine 1"
+CHAT = 'Chat 1'
+URL = 'http://127.0.0.1:8000/webhooks/test/'
+
+
+def webhook_queries(context):
+    return [query for query in context.captured_queries if 'webhooks_webhook' in query['sql']]
+
+
+class WebhookCacheTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER_EMAIL, password=USER_PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(username=USER_EMAIL, secret=USER_PASSWORD, project=self.project)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title=CHAT)
+
+    def test_no_webhooks_costs_no_queries(self):
+        Message.objects.create(chat=self.chat, sender=self.person, text='warm up')
+
+        with CaptureQueriesContext(connection) as context:
+            Message.objects.create(chat=self.chat, sender=self.person, text='Hello')
+
+        self.assertEqual(webhook_queries(context), [])
+
+    def test_redis_tier_survives_local_expiry(self):
+        get_project_webhooks(self.project.pk)
+        webhook_cache.clear_local()
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(get_project_webhooks(self.project.pk), {})
+
+        self.assertEqual(webhook_queries(context), [])
+
+    def test_save_and_delete_invalidate(self):
+        self.assertEqual(get_project_webhooks(self.project.pk), {})
+
+        webhook = Webhook.objects.create(project=self.project, event_trigger='On New Message', url=URL)
+        webhooks = get_project_webhooks(self.project.pk)
+        self.assertEqual(webhooks['On New Message']['url'], URL)
+        self.assertEqual(webhooks['On New Message']['secret'], webhook.secret)
+
+        webhook.url = URL + 'edited/'
+        webhook.save()
+        self.assertEqual(get_project_webhooks(self.project.pk)['On New Message']['url'], URL + 'edited/')
+
+        webhook.delete()
+        self.assertEqual(get_project_webhooks(self.project.pk), {})
+
+    def test_racing_read_is_not_kept(self):
+        # A read that started before the webhook was committed, and stores what it saw afterwards
+        generation = get_generation(self.project.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Webhook.objects.create(project=self.project, event_trigger='On New Message', url=URL)
+        webhook_cache.set(str(self.project.pk), (generation, {}))
+        webhook_cache.clear_local()
+
+        self.assertEqual(get_project_webhooks(self.project.pk)['On New Message']['url'], URL)
@@ -0,0 +1,68 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from chats.models import Person, Chat, Message
+from projects.models import User, Project
+
+from webhooks.models import Webhook, WebhookDelivery
+from webhooks.sender import hook
+
+USER_EMAIL = 'adam@gmail.com'
+USER_PASSWORD = 'potato_123'
+
+PROJECT = "Engine 1"
+CHAT = 'Chat 1'
+MESSAGE = 'Hello'
+URL = 'http://127.0.0.1:8000/webhooks/test/'
+
+
+def count_queries(context):
+    return [query for query in context.captured_queries if 'COUNT(' in query['sql']]
+
+
+class WebhookPayloadTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER_EMAIL, password=USER_PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(username=USER_EMAIL, secret=USER_PASSWORD, project=self.project)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title=CHAT)
+
+    def test_builders_only_run_for_a_subscriber(self):
+        calls = []
+
+        def build():
+            calls.append(True)
+            return {'public_key': str(self.project.pk)}
+
+        self.assertIsNone(hook.enqueue(event_trigger='On New Message', project_id=self.project.pk, project_json=build))
+        self.assertEqual(calls, [])
+
+        Webhook.objects.create(project=self.project, event_trigger='On New Message', url=URL)
+        delivery = hook.enqueue(event_trigger='On New Message', project_id=self.project.pk, project_json=build)
+        self.assertEqual(calls, [True])
+        self.assertEqual(delivery.payload['project']['public_key'], str(self.project.pk))
+
+    def test_no_webhook_skips_serialization(self):
+        Message.objects.create(chat=self.chat, sender=self.person, text='warm up')
+
+        with CaptureQueriesContext(connection) as context:
+            message = Message.objects.create(chat=self.chat, sender=self.person, text=MESSAGE)
+            message.text = 'Edited'
+            message.save()
+            message.delete()
+            Person.objects.create(username='bob', secret=USER_PASSWORD, project=self.project)
+
+        # ProjectSerializer counts chats and people, so any COUNT means a payload was built
+        self.assertEqual(count_queries(context), [])
+        self.assertEqual(WebhookDelivery.objects.count(), 0)
+
+    def test_webhook_gets_full_payload(self):
+        Webhook.objects.create(project=self.project, event_trigger='On New Message', url=URL)
+        Message.objects.create(chat=self.chat, sender=self.person, text=MESSAGE)
+
+        payload = WebhookDelivery.objects.get().payload
+        self.assertEqual(payload['project']['public_key'], str(self.project.pk))
+        self.assertEqual(payload['chat']['title'], CHAT)
+        self.assertEqual(payload['message']['text'], MESSAGE)
+        self.assertIsNone(payload['person'])
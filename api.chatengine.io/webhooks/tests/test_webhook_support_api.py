@@ -11,7 +11,7 @@ from projects.serializers import ProjectSerializer, PersonPublicSerializer
 
 from webhooks.models import Webhook
 from webhooks.views import Webhooks
-from webhooks.sender import WebhookSerializer
+from webhooks.serializers import WebhookSerializer
 
 
 USER_EMAIL = 'alamorre@gmail.com'
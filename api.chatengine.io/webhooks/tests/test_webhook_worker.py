@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from chats.models import Person, Chat, Message
+from projects.models import User, Project
+
+from server.tests.stub_server import StubServer
+
+from webhooks.models import Webhook, WebhookDelivery, WebhookDeadLetter
+from webhooks.worker import WebhookWorker
+
+USER_EMAIL = 'adam@gmail.com'
+USER_PASSWORD = 'potato_123'
+
+PROJECT = "Engine 1"
+CHAT = 'Chat 1'
+MESSAGE = 'Hello'
+
+
+class WebhookWorkerTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email=USER_EMAIL, password=USER_PASSWORD)
+        self.project = Project.objects.create(owner=self.user, title=PROJECT)
+        self.person = Person.objects.create(username=USER_EMAIL, secret=USER_PASSWORD, project=self.project)
+        self.chat = Chat.objects.create(project=self.project, admin=self.person, title=CHAT)
+        self.worker = WebhookWorker(concurrency=2, timeout=2, max_attempts=3, backoff=10)
+
+    def add_webhook(self, url):
+        return Webhook.objects.create(project=self.project, event_trigger='On New Message', url=url + '/hook/')
+
+    def test_message_is_queued_not_sent(self):
+        with StubServer() as stub:
+            self.add_webhook(stub.url)
+            Message.objects.create(chat=self.chat, sender=self.person, text=MESSAGE)
+
+            self.assertEqual(len(stub.requests), 0)
+            self.assertEqual(self.worker.queue_depth(), 1)
+            delivery = WebhookDelivery.objects.get()
+            self.assertEqual(delivery.event_trigger, 'On New Message')
+            self.assertEqual(delivery.payload['message']['text'], MESSAGE)
+
+    def test_no_webhook_nothing_queued(self):
+        Message.objects.create(chat=self.chat, sender=self.person, text=MESSAGE)
+        self.assertEqual(self.worker.queue_depth(), 0)
+
+    def test_worker_delivers(self):
+        with StubServer() as stub:
+            self.add_webhook(stub.url)
+            Message.objects.create(chat=self.chat, sender=self.person, text=MESSAGE)
+
+            stats = self.worker.drain()
+
+            self.assertEqual(stats['delivered'], 1)
+            self.assertEqual(len(stats['latencies']), 1)
+            self.assertEqual(len(stub.requests), 1)
+            self.assertEqual(stub.requests[0]['path'], '/hook/')
+            self.assertEqual(stub.requests[0]['json']['message']['text'], MESSAGE)
+            self.assertEqual(stub.requests[0]['json']['webhook']['event_trigger'], 'On New Message')
+            self.assertEqual(self.worker.queue_depth(), 0)
+
+    def test_worker_retries_with_backoff(self):
+        with StubServer() as stub:
+            stub.statuses = [500, 500]
+            self.add_webhook(stub.url)
+            Message.objects.create(chat=self.chat, sender=self.person, text=MESSAGE)
+
+            stats = self.worker.drain()
+            self.assertEqual(stats['retried'], 1)
+            delivery = WebhookDelivery.objects.get()
+            self.assertEqual(delivery.attempts, 1)
+            self.assertEqual(delivery.last_error, 'HTTP 500')
+            self.assertTrue(delivery.next_attempt > timezone.now() + timedelta(seconds=5))
+
+            # Not due yet
+            self.assertEqual(self.worker.drain()['claimed'], 0)
+
+            WebhookDelivery.objects.update(next_attempt=timezone.now())
+            self.worker.drain()
+            delivery = WebhookDelivery.objects.get()
+            self.assertEqual(delivery.attempts, 2)
+            self.assertTrue(delivery.next_attempt > timezone.now() + timedelta(seconds=15))
+
+            WebhookDelivery.objects.update(next_attempt=timezone.now())
+            stats = self.worker.drain()
+            self.assertEqual(stats['delivered'], 1)
+            self.assertEqual(len(stub.requests), 3)
+            self.assertEqual(self.worker.queue_depth(), 0)
+
+    def test_worker_dead_letters(self):
+        with StubServer(default_status=503) as stub:
+            self.add_webhook(stub.url)
+            Message.objects.create(chat=self.chat, sender=self.person, text=MESSAGE)
+
+            for _ in range(3):
+                WebhookDelivery.objects.update(next_attempt=timezone.now())
+                stats = self.worker.drain()
+
+            self.assertEqual(stats['dead'], 1)
+            self.assertEqual(self.worker.queue_depth(), 0)
+            dead_letter = WebhookDeadLetter.objects.get()
+            self.assertEqual(dead_letter.attempts, 3)
+            self.assertEqual(dead_letter.last_error, 'HTTP 503')
+            self.assertEqual(dead_letter.payload['message']['text'], MESSAGE)
+
+    def test_worker_connection_error(self):
+        with StubServer() as stub:
+            url = stub.url
+        self.add_webhook(url)
+        Message.objects.create(chat=self.chat, sender=self.person, text=MESSAGE)
+
+        stats = self.worker.drain()
+
+        self.assertEqual(stats['retried'], 1)
+        self.assertIn('ConnectionError', WebhookDelivery.objects.get().last_error)
@@ -0,0 +1,108 @@
+import time
+
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import WebhookDelivery, WebhookDeadLetter
+from .sender import hook, get_session
+
+
+class WebhookWorker:
+    def __init__(self, concurrency=8, batch_size=100, timeout=5, max_attempts=8, backoff=30, max_backoff=3600, lease=300):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.session = get_session(pool_size=concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def queue_depth(self):
+        return WebhookDelivery.objects.count()
+
+    def retry_delay(self, attempts):
+        return min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+
+    def claim(self):
+        now = timezone.now()
+        with transaction.atomic():
+            deliveries = list(
+                WebhookDelivery.objects.select_for_update(skip_locked=True)
+                .filter(next_attempt__lte=now)[:self.batch_size]
+            )
+            # Lease the batch so other workers skip it; it comes back if this worker dies
+            WebhookDelivery.objects.filter(pk__in=[delivery.pk for delivery in deliveries]).update(
+                next_attempt=now + timedelta(seconds=self.lease)
+            )
+        return deliveries
+
+    def send(self, delivery):
+        try:
+            response = hook.send(delivery.url, delivery.payload, timeout=self.timeout, session=self.session)
+            if 200 <= response.status_code < 300:
+                return None
+            return 'HTTP {}'.format(response.status_code)
+        except Exception as e:
+            return '{}: {}'.format(type(e).__name__, e)
+
+    def drain(self):
+        deliveries = self.claim()
+        stats = {'claimed': len(deliveries), 'delivered': 0, 'retried': 0, 'dead': 0, 'latencies': []}
+
+        # Only HTTP runs on the pool, all database writes stay on this thread
+        errors = self.executor.map(self.send, deliveries)
+        for delivery, error in zip(deliveries, errors):
+            if error is None:
+                stats['delivered'] += 1
+                stats['latencies'].append((timezone.now() - delivery.created).total_seconds())
+                delivery.delete()
+            elif delivery.attempts + 1 >= self.max_attempts:
+                stats['dead'] += 1
+                self.bury(delivery, error)
+            else:
+                stats['retried'] += 1
+                self.retry(delivery, error)
+
+        return stats
+
+    def retry(self, delivery, error):
+        delivery.attempts += 1
+        delivery.last_error = error
+        delivery.next_attempt = timezone.now() + timedelta(seconds=self.retry_delay(delivery.attempts))
+        delivery.save(update_fields=['attempts', 'last_error', 'next_attempt'])
+
+    def bury(self, delivery, error):
+        with transaction.atomic():
+            WebhookDeadLetter.objects.create(
+                project_id=delivery.project_id,
+                event_trigger=delivery.event_trigger,
+                url=delivery.url,
+                payload=delivery.payload,
+                attempts=delivery.attempts + 1,
+                last_error=error,
+                created=delivery.created
+            )
+            delivery.delete()
+
+    def run(self, poll_interval=1, once=False, report=print):
+        while True:
+            started = time.perf_counter()
+            stats = self.drain()
+            if stats['claimed'] > 0:
+                latencies = sorted(stats['latencies'])
+                p50 = latencies[len(latencies) // 2] if latencies else 0
+                p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+                report(
+                    'Webhooks: {claimed} claimed, {delivered} delivered, {retried} retried, {dead} dead'.format(**stats)
+                    + ' | latency p50 {:.3f}s p95 {:.3f}s'.format(p50, p95)
+                    + ' | batch {:.3f}s | queue depth {}'.format(time.perf_counter() - started, self.queue_depth())
+                )
+            if once and stats['claimed'] < self.batch_size:
+                return stats
+            if stats['claimed'] == 0:
+                time.sleep(poll_interval)
@@ -12,6 +12,13 @@ import messageChat from "./middleware/chat/message.js";
 import closeChat from "./middleware/chat/close.js";
 
 import { redisSubscriber } from "./lib/redis.js";
+import {
+  broadcastMode,
+  membershipIndex,
+  MEMBERS_CHANNEL,
+} from "./lib/members.js";
+import { replayBuffer } from "./lib/events.js";
+import { presence } from "./lib/presence.js";
 
 import dotenv from "dotenv";
 
@@ -68,8 +75,32 @@ app.any("/*", (res) => {
 });
 
 redisSubscriber.on("message", (channel, message) => {
+  if (channel === MEMBERS_CHANNEL) {
+    membershipIndex.apply(message);
+    return;
+  }
+  replayBuffer.push(channel, message); // Sockets still replaying the log
   app.publish(channel, message);
   console.log(`Publishing message to ${channel}`);
 });
 
+// Broadcast mode: the API publishes each chat event once, we fan it out to local members
+if (broadcastMode) {
+  redisSubscriber.subscribe(MEMBERS_CHANNEL);
+  redisSubscriber.psubscribe("chat:*");
+}
+
+// Keeps this gateway's person connections online in Redis for the API
+presence.start();
+
+redisSubscriber.on("pmessage", (pattern, channel, message) => {
+  replayBuffer.push(channel, message);
+  app.publish(channel, message); // Chat sockets
+  const chatId = channel.slice("chat:".length);
+  for (const personId of membershipIndex.members(chatId)) {
+    app.publish(`person:${personId}`, message);
+  }
+  console.log(`Broadcasting message to ${channel}`);
+});
+
 export default app;
@@ -0,0 +1,154 @@
+import { redisEvents } from "./redis.js";
+
+// The API appends every person:<id> and chat:<id> event to this stream, with the seq as its entry id
+export const eventsKey = (channel) => `events:${channel}`;
+
+const entrySeq = (entryId) => Number(String(entryId).split("-")[0]);
+
+const entryFields = (fields) => {
+  const values = {};
+  for (let i = 0; i < fields.length; i += 2) values[fields[i]] = fields[i + 1];
+  return values;
+};
+
+// The chat's copy carries the chat seq, stamped first the same way the API stamps it
+const restamp = (message, seq) => message.replace(/^\{"seq": \d+, /, `{"seq": ${seq}, `);
+
+export function messageSeq(message) {
+  try {
+    const { seq } = JSON.parse(message);
+    return Number.isInteger(seq) ? seq : null;
+  } catch (e) {
+    return null;
+  }
+}
+
+// Same contract as read_events in the API: null when the log can't fill the gap after afterSeq
+export async function readEvents(channel, afterSeq) {
+  const key = eventsKey(channel);
+  const results = await redisEvents
+    .pipeline()
+    .xrange(key, "-", "+", "COUNT", 1)
+    .xrevrange(key, "+", "-", "COUNT", 1)
+    .xrange(key, `(${afterSeq}-0`, "+")
+    .exec();
+  for (const [error] of results) {
+    if (error) throw error;
+  }
+  const [[, first], [, last], [, entries]] = results;
+
+  if (last.length === 0) return afterSeq > 0 ? null : [];
+  // Trimmed past the client's seq, or the log expired and restarted below it
+  if (entrySeq(first[0][0]) > afterSeq + 1 || entrySeq(last[0][0]) < afterSeq) {
+    return null;
+  }
+
+  // Entries the API logged once per chat only point at the chat log's entry, which has the payload
+  const logged = entries.map(([id, fields]) => ({ seq: entrySeq(id), fields: entryFields(fields) }));
+  const refs = logged.filter(({ fields }) => fields.ref !== undefined);
+  let payloads = [];
+  if (refs.length > 0) {
+    const pipeline = redisEvents.pipeline();
+    for (const { fields } of refs) {
+      pipeline.xrange(fields.ref, `${fields.ref_seq}-0`, `${fields.ref_seq}-0`);
+    }
+    const refResults = await pipeline.exec();
+    for (const [error] of refResults) {
+      if (error) throw error;
+    }
+    payloads = refResults.map(([, ref]) => ref);
+  }
+
+  const events = [];
+  let next = 0;
+  for (const { seq, fields } of logged) {
+    if (fields.ref === undefined) {
+      events.push({ seq, message: fields.message });
+      continue;
+    }
+    const ref = payloads[next++];
+    // The chat's log was trimmed past it (or expired)
+    if (ref.length === 0) return null;
+    events.push({ seq, message: restamp(entryFields(ref[0][1]).message, seq) });
+  }
+  return events;
+}
+
+// What a resuming socket gets: the logged events after its seq, then the live ones the log read missed
+export function mergeReplay(afterSeq, events, live) {
+  const messages = [];
+  let seq = afterSeq;
+  for (const event of events) {
+    if (event.seq > seq) {
+      messages.push(event.message);
+      seq = event.seq;
+    }
+  }
+  for (const message of live) {
+    const liveSeq = messageSeq(message);
+    if (liveSeq === null || liveSeq > seq) {
+      messages.push(message);
+      if (liveSeq !== null) seq = liveSeq;
+    }
+  }
+  return messages;
+}
+
+// Live messages held back for sockets that are still reading the log, keyed by channel
+export class ReplayBuffer {
+  constructor() {
+    this.channels = new Map(); // channel -> Set of message arrays
+  }
+
+  start(channel) {
+    const live = [];
+    if (!this.channels.has(channel)) this.channels.set(channel, new Set());
+    this.channels.get(channel).add(live);
+    return live;
+  }
+
+  push(channel, message) {
+    const pending = this.channels.get(channel);
+    if (!pending) return;
+    for (const live of pending) live.push(message);
+  }
+
+  finish(channel, live) {
+    const pending = this.channels.get(channel);
+    if (!pending) return;
+    pending.delete(live);
+    if (pending.size === 0) this.channels.delete(channel);
+  }
+}
+
+export const replayBuffer = new ReplayBuffer();
+
+export function parseResumeSeq(value) {
+  if (value === false || value === undefined) return null;
+  const seq = Number(value);
+  return Number.isInteger(seq) && seq >= 0 ? seq : null;
+}
+
+// Sends the socket what it missed since afterSeq, then subscribes it, without gaps or reordering.
+// subscribed must resolve once Redis delivers the channel here, so every event is in the log read or live.
+export function resume(ws, channel, afterSeq, subscribed) {
+  const live = replayBuffer.start(channel);
+  subscribed
+    .then(() => readEvents(channel, afterSeq))
+    .catch((e) => {
+      console.error(`Replaying ${channel} failed:`, e);
+      return null;
+    })
+    .then((events) => {
+      replayBuffer.finish(channel, live);
+      if (ws.closed) return;
+
+      // The client has to fetch its state again, live events still follow
+      if (events === null) ws.send(JSON.stringify({ action: "resync" }));
+      const messages =
+        events === null ? mergeReplay(0, [], live) : mergeReplay(afterSeq, events, live);
+      for (const message of messages) ws.send(message);
+      ws.subscribe(channel);
+      console.log(`Replayed ${messages.length} events to ${channel}`);
+    });
+}
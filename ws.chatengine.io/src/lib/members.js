@@ -0,0 +1,94 @@
+// Publish chat events once to chat:<id> and route them to members here (same flag as the API)
+export const broadcastMode = process.env.CHAT_BROADCAST_MODE === "true";
+
+export const MEMBERS_CHANNEL = "chat_members";
+
+export const personChatsKey = (personId) => `person_chats:${personId}`;
+
+// Which chats the people connected to this gateway are in, keyed both ways
+export class MembershipIndex {
+  constructor() {
+    this.chats = new Map(); // chatId -> Set of personIds
+    // personId -> { sockets, chats: Set of chatIds, removed: Set of chatIds left while loading, or null once loaded }
+    this.people = new Map();
+  }
+
+  // Returns true for the person's first socket, which is when their chats need loading
+  connect(personId) {
+    const id = String(personId);
+    const person = this.people.get(id);
+    if (person) {
+      person.sockets += 1;
+      return false;
+    }
+    this.people.set(id, { sockets: 1, chats: new Set(), removed: new Set() });
+    return true;
+  }
+
+  disconnect(personId) {
+    const id = String(personId);
+    const person = this.people.get(id);
+    if (!person) return;
+
+    person.sockets -= 1;
+    if (person.sockets > 0) return;
+
+    for (const chatId of person.chats) {
+      this.removeMember(chatId, id);
+    }
+    this.people.delete(id);
+  }
+
+  addMember(chatId, personId) {
+    const id = String(personId);
+    const person = this.people.get(id);
+    if (!person) return; // Not connected here
+
+    const chat = String(chatId);
+    person.chats.add(chat);
+    if (person.removed) person.removed.delete(chat); // Added back after the removal
+    if (!this.chats.has(chat)) this.chats.set(chat, new Set());
+    this.chats.get(chat).add(id);
+  }
+
+  removeMember(chatId, personId) {
+    const id = String(personId);
+    const chat = String(chatId);
+    const person = this.people.get(id);
+    if (person) {
+      person.chats.delete(chat);
+      // The pending load may have read the membership before it went
+      if (person.removed) person.removed.add(chat);
+    }
+
+    const members = this.chats.get(chat);
+    if (!members) return;
+    members.delete(id);
+    if (members.size === 0) this.chats.delete(chat);
+  }
+
+  // The person's chats as read from Redis, minus the ones removed since the read may have started
+  load(personId, chatIds) {
+    const person = this.people.get(String(personId));
+    if (!person || !person.removed) return;
+
+    const { removed } = person;
+    person.removed = null;
+    for (const chatId of chatIds) {
+      if (!removed.has(String(chatId))) this.addMember(chatId, personId);
+    }
+  }
+
+  // A chat_members event: { id, added: [personIds], removed: [personIds] }
+  apply(message) {
+    const { id, added = [], removed = [] } = JSON.parse(message);
+    for (const personId of added) this.addMember(id, personId);
+    for (const personId of removed) this.removeMember(id, personId);
+  }
+
+  members(chatId) {
+    return this.chats.get(String(chatId)) || new Set();
+  }
+}
+
+export const membershipIndex = new MembershipIndex();
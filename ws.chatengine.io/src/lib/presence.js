@@ -0,0 +1,67 @@
+import crypto from "crypto";
+
+import { redisCache } from "./redis.js";
+
+// Sorted set of the person's connections, scored by when their heartbeat runs out (read by the API)
+export const presenceKey = (personId) => `presence:${personId}`;
+
+// A connection counts as online this long after its last heartbeat, so a crashed gateway's sockets age out
+export const PRESENCE_TTL = Number(process.env.PRESENCE_TTL || 60) * 1000;
+
+// The person sockets open on this gateway, refreshed in Redis a few times per TTL
+export class Presence {
+  constructor(redis, ttl = PRESENCE_TTL) {
+    this.redis = redis;
+    this.ttl = ttl;
+    this.connections = new Map(); // connectionId -> personId
+    this.timer = null;
+  }
+
+  // Returns the connection's id, which close hands back to disconnect
+  connect(personId) {
+    const connectionId = crypto.randomUUID();
+    this.connections.set(connectionId, String(personId));
+    this.write([[connectionId, String(personId)]]);
+    return connectionId;
+  }
+
+  disconnect(connectionId) {
+    const personId = this.connections.get(connectionId);
+    if (personId === undefined) return;
+    this.connections.delete(connectionId);
+    this.redis
+      .zrem(presenceKey(personId), connectionId)
+      .catch((e) => console.error(`Presence for person:${personId} failed:`, e));
+  }
+
+  heartbeat() {
+    return this.write([...this.connections]);
+  }
+
+  // One pipeline for every connection, expired ones from other gateways are dropped on the way
+  write(connections) {
+    if (connections.length === 0) return Promise.resolve();
+    const now = Date.now();
+    const pipeline = this.redis.pipeline();
+    for (const [connectionId, personId] of connections) {
+      const key = presenceKey(personId);
+      pipeline.zremrangebyscore(key, "-inf", now);
+      pipeline.zadd(key, now + this.ttl, connectionId);
+      pipeline.pexpire(key, this.ttl);
+    }
+    return pipeline.exec().catch((e) => console.error("Presence heartbeat failed:", e));
+  }
+
+  start() {
+    if (this.timer) return;
+    this.timer = setInterval(() => this.heartbeat(), this.ttl / 3);
+    this.timer.unref(); // Doesn't keep the process (or jest) alive on its own
+  }
+
+  stop() {
+    clearInterval(this.timer);
+    this.timer = null;
+  }
+}
+
+export const presence = new Presence(redisCache);
@@ -11,3 +11,10 @@ export const redisSubscriber = new Redis({
   port: process.env.REDIS_PORT,
   db: 1, // 1 for pub/sub
 });
+
+// A subscribed connection can't run commands, the event logs are read with this one
+export const redisEvents = new Redis({
+  host: process.env.REDIS_HOST,
+  port: process.env.REDIS_PORT,
+  db: 1, // 1 for pub/sub and the event logs
+});
@@ -1,7 +1,9 @@
 import { redisSubscriber } from "../../lib/redis.js";
+import { broadcastMode } from "../../lib/members.js";
 
 export default function close(ws) {
   const channel = `chat:${ws.id}`;
-  redisSubscriber.unsubscribe(channel);
+  ws.closed = true; // A replay still in flight mustn't send to it
+  if (!broadcastMode) redisSubscriber.unsubscribe(channel);
   console.log(`Close channel: ${channel}`);
 }
@@ -1,8 +1,16 @@
 import { redisSubscriber } from "../../lib/redis.js";
+import { broadcastMode } from "../../lib/members.js";
+import { parseResumeSeq, resume } from "../../lib/events.js";
 
 export default function open(ws) {
   const channel = `chat:${ws.id}`;
-  ws.subscribe(channel); // Picks up app.publish(channel, message)
-  redisSubscriber.subscribe(channel);
+  // Otherwise covered by chat:*
+  const subscribed = broadcastMode ? Promise.resolve() : redisSubscriber.subscribe(channel);
+  const resumeSeq = parseResumeSeq(ws.resumeSeq);
+  if (resumeSeq === null) {
+    ws.subscribe(channel); // Picks up app.publish(channel, message)
+  } else {
+    resume(ws, channel, resumeSeq, subscribed); // Subscribes once the replay is sent
+  }
   console.log(`Open channel: ${channel}`);
 }
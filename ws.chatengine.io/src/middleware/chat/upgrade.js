@@ -13,6 +13,7 @@ export default function upgradeChat(res, req, context) {
   const chatID = getQueryParam(queryParameters, "chatID");
   const accessKey = getQueryParam(queryParameters, "accessKey");
   const privateKey = getQueryParam(queryParameters, "privateKey");
+  const resumeSeq = getQueryParam(queryParameters, "seq"); // Last seq the client got, to replay from
 
   // Extract headers synchronously
   const secWebSocketKey = req.getHeader("sec-websocket-key");
@@ -33,7 +34,7 @@ export default function upgradeChat(res, req, context) {
       res.cork(() => {
         if (response.success) {
           res.upgrade(
-            { project, chatID, accessKey, privateKey, id: response.id }, // Attach properties to ws object if needed
+            { project, chatID, accessKey, privateKey, resumeSeq, id: response.id }, // Attach properties to ws object if needed
             secWebSocketKey, // Use pre-extracted header
             secWebSocketProtocol, // Use pre-extracted header
             secWebSocketExtensions, // Use pre-extracted header
@@ -1,7 +1,12 @@
 import { redisSubscriber } from "../../lib/redis.js";
+import { broadcastMode, membershipIndex } from "../../lib/members.js";
+import { presence } from "../../lib/presence.js";
 
 export default function closePerson(ws) {
   const channel = `person:${ws.id}`;
+  ws.closed = true; // A replay still in flight mustn't send to it
   redisSubscriber.unsubscribe(channel);
+  if (broadcastMode) membershipIndex.disconnect(ws.id);
+  presence.disconnect(ws.connectionId);
   console.log(`Close channel: ${channel}`);
 }
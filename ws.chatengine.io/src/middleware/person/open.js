@@ -1,8 +1,36 @@
-import { redisSubscriber } from "../../lib/redis.js";
+import { redisCache, redisSubscriber } from "../../lib/redis.js";
+import {
+  broadcastMode,
+  membershipIndex,
+  personChatsKey,
+} from "../../lib/members.js";
+import { parseResumeSeq, resume } from "../../lib/events.js";
+import { presence } from "../../lib/presence.js";
 
 export default function openPerson(ws) {
   const channel = `person:${ws.id}`;
-  ws.subscribe(channel); // Picks up app.publish(channel, message)
-  redisSubscriber.subscribe(channel);
+  const subscribed = redisSubscriber.subscribe(channel);
+  const resumeSeq = parseResumeSeq(ws.resumeSeq);
+  if (resumeSeq === null) {
+    ws.subscribe(channel); // Picks up app.publish(channel, message)
+  } else if (broadcastMode) {
+    // Chat events reach person sockets on their chats' seqs, one person seq can't resume them
+    ws.send(JSON.stringify({ action: "resync" }));
+    ws.subscribe(channel);
+  } else {
+    resume(ws, channel, resumeSeq, subscribed); // Subscribes once the replay is sent
+  }
+  ws.connectionId = presence.connect(ws.id);
   console.log(`Open channel: ${channel}`);
+
+  // Tracked before loading so membership events that race the read still apply
+  if (broadcastMode && membershipIndex.connect(ws.id)) {
+    redisCache
+      .smembers(personChatsKey(ws.id))
+      .then((chatIds) => membershipIndex.load(ws.id, chatIds))
+      .catch((e) => {
+        console.error(`Loading chats for ${channel} failed:`, e);
+        membershipIndex.load(ws.id, []); // Stops tracking removals, events still add chats
+      });
+  }
 }
@@ -16,6 +16,7 @@ export default function upgradePerson(res, req, context) {
   const username = getQueryParam(queryParameters, "username"); // For new authentication
   const secret = getQueryParam(queryParameters, "secret"); // For new authentication
   const privateKey = getQueryParam(queryParameters, "privateKey"); // For new authentication
+  const resumeSeq = getQueryParam(queryParameters, "seq"); // Last seq the client got, to replay from
 
   const secWebSocketKey = req.getHeader("sec-websocket-key");
   const secWebSocketProtocol = req.getHeader("sec-websocket-protocol");
@@ -36,7 +37,7 @@ export default function upgradePerson(res, req, context) {
         res.cork(() => {
           if (response.success) {
             res.upgrade(
-              { sessionToken, id: response.id },
+              { sessionToken, resumeSeq, id: response.id },
               secWebSocketKey, // Use pre-extracted header
               secWebSocketProtocol, // Use pre-extracted header
               secWebSocketExtensions, // Use pre-extracted header
@@ -65,7 +66,7 @@ export default function upgradePerson(res, req, context) {
         res.cork(() => {
           if (response.success) {
             res.upgrade(
-              { project, username, secret, privateKey, id: response.id },
+              { project, username, secret, privateKey, resumeSeq, id: response.id },
               secWebSocketKey, // Use pre-extracted header
               secWebSocketProtocol, // Use pre-extracted header
               secWebSocketExtensions, // Use pre-extracted header
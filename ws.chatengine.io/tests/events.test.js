@@ -0,0 +1,141 @@
+import {
+  mergeReplay,
+  parseResumeSeq,
+  readEvents,
+  replayBuffer,
+  ReplayBuffer,
+  resume,
+} from "../src/lib/events.js";
+import { redisEvents } from "../src/lib/redis.js";
+
+jest.mock("../src/lib/redis.js", () => ({ redisEvents: {} }));
+
+// A pipeline answering each call in order with the given replies
+const pipelineOf = (...replies) => {
+  const pipeline = { xrange: () => pipeline, xrevrange: () => pipeline };
+  pipeline.exec = async () => replies.map((reply) => [null, reply]);
+  return pipeline;
+};
+
+// Records what resume sends and when it subscribes
+const fakeSocket = () => {
+  const ws = { closed: false, sent: [] };
+  ws.send = (message) => ws.sent.push(message);
+  ws.subscribe = jest.fn((channel) => ws.sent.push(`subscribe ${channel}`));
+  return ws;
+};
+
+// resume doesn't return its promise, its chain settles before the next macrotask
+const settled = () => new Promise((done) => setImmediate(done));
+
+const event = (seq) => JSON.stringify({ seq, action: "new_message", data: {} });
+// How the API stamps what it publishes and logs
+const logged = (seq) => `{"seq": ${seq}, "action": "new_message", "data": {}}`;
+
+describe("Event Replay Tests", () => {
+  test("Replays logged events after the client's seq, then the live ones", () => {
+    const events = [2, 3, 4].map((seq) => ({ seq, message: event(seq) }));
+    const live = [event(4), event(5)];
+
+    expect(mergeReplay(2, events, live)).toEqual([event(3), event(4), event(5)]);
+  });
+
+  test("Live events the log already had are not sent twice", () => {
+    const events = [{ seq: 7, message: event(7) }];
+
+    expect(mergeReplay(6, events, [event(6), event(7)])).toEqual([event(7)]);
+    expect(mergeReplay(6, [], [event(7)])).toEqual([event(7)]);
+  });
+
+  test("Buffers live messages per channel until the replay finishes", () => {
+    const buffer = new ReplayBuffer();
+    const live = buffer.start("chat:1");
+    buffer.push("chat:1", event(1));
+    buffer.push("chat:2", event(1));
+    buffer.finish("chat:1", live);
+    buffer.push("chat:1", event(2));
+
+    expect(live).toEqual([event(1)]);
+    expect(buffer.channels.size).toBe(0);
+  });
+
+  test("Reads person entries that point at the chat's log", async () => {
+    const entries = [
+      ["1-0", ["message", logged(1)]],
+      ["2-0", ["ref", "events:chat:9", "ref_seq", "4"]],
+    ];
+    redisEvents.pipeline = jest
+      .fn()
+      .mockReturnValueOnce(pipelineOf([entries[0]], [entries[1]], entries))
+      .mockReturnValueOnce(pipelineOf([["4-0", ["message", logged(4)]]]));
+
+    expect(await readEvents("person:1", 0)).toEqual([
+      { seq: 1, message: logged(1) },
+      { seq: 2, message: logged(2) },
+    ]);
+  });
+
+  test("Asks for a resync when the chat's entry was trimmed", async () => {
+    const entries = [["2-0", ["ref", "events:chat:9", "ref_seq", "4"]]];
+    redisEvents.pipeline = jest
+      .fn()
+      .mockReturnValueOnce(pipelineOf(entries, entries, entries))
+      .mockReturnValueOnce(pipelineOf([]));
+
+    expect(await readEvents("person:1", 1)).toBe(null);
+  });
+
+  test("Resumes with the log, then the live events it missed, then subscribes", async () => {
+    const entries = [
+      ["3-0", ["message", logged(3)]],
+      ["4-0", ["message", logged(4)]],
+    ];
+    redisEvents.pipeline = jest.fn(() => {
+      // Published while the log is read: 4 is in both, 5 only live
+      replayBuffer.push("person:1", logged(4));
+      replayBuffer.push("person:1", logged(5));
+      return pipelineOf([entries[0]], [entries[1]], entries);
+    });
+    const ws = fakeSocket();
+
+    resume(ws, "person:1", 2, Promise.resolve());
+    await settled();
+
+    expect(ws.sent).toEqual([logged(3), logged(4), logged(5), "subscribe person:1"]);
+    expect(replayBuffer.channels.size).toBe(0);
+  });
+
+  test("Resumes with a resync when the log can't fill the gap", async () => {
+    redisEvents.pipeline = jest.fn(() => {
+      replayBuffer.push("person:1", logged(9));
+      return pipelineOf([], [], []);
+    });
+    const ws = fakeSocket();
+
+    resume(ws, "person:1", 5, Promise.resolve());
+    await settled();
+
+    const resync = JSON.stringify({ action: "resync" });
+    expect(ws.sent).toEqual([resync, logged(9), "subscribe person:1"]);
+  });
+
+  test("Sends nothing to a socket closed during the replay", async () => {
+    redisEvents.pipeline = jest.fn(() => pipelineOf([], [], []));
+    const ws = fakeSocket();
+
+    resume(ws, "person:1", 0, Promise.resolve());
+    ws.closed = true;
+    await settled();
+
+    expect(ws.sent).toEqual([]);
+    expect(replayBuffer.channels.size).toBe(0);
+  });
+
+  test("Parses the seq query parameter", () => {
+    expect(parseResumeSeq("12")).toBe(12);
+    expect(parseResumeSeq("0")).toBe(0);
+    expect(parseResumeSeq(false)).toBe(null);
+    expect(parseResumeSeq("abc")).toBe(null);
+    expect(parseResumeSeq("-1")).toBe(null);
+  });
+});
@@ -0,0 +1,63 @@
+import { MembershipIndex } from "../src/lib/members.js";
+
+describe("Membership Index Tests", () => {
+  let index;
+
+  beforeEach(() => {
+    index = new MembershipIndex();
+  });
+
+  test("Only tracks people connected here", () => {
+    index.connect(1);
+    index.apply(JSON.stringify({ id: 10, added: [1, 2], removed: [] }));
+
+    expect([...index.members(10)]).toEqual(["1"]);
+    expect([...index.members("10")]).toEqual(["1"]);
+  });
+
+  test("Loads chats from Redis and applies removals", () => {
+    expect(index.connect(1)).toBe(true);
+    index.load(1, ["10", "11"]);
+    index.apply(JSON.stringify({ id: 11, added: [], removed: [1] }));
+
+    expect([...index.members(10)]).toEqual(["1"]);
+    expect(index.members(11).size).toBe(0);
+  });
+
+  test("Removals that race the load are not undone by it", () => {
+    index.connect(1);
+    // The load read chats 10 and 11 before the person left 11
+    index.apply(JSON.stringify({ id: 11, added: [], removed: [1] }));
+    index.load(1, ["10", "11"]);
+
+    expect([...index.members(10)]).toEqual(["1"]);
+    expect(index.members(11).size).toBe(0);
+
+    // Once loaded, later reads don't apply
+    index.load(1, ["11"]);
+    expect(index.members(11).size).toBe(0);
+  });
+
+  test("An add after a racing removal wins", () => {
+    index.connect(1);
+    index.apply(JSON.stringify({ id: 11, added: [], removed: [1] }));
+    index.apply(JSON.stringify({ id: 11, added: [1], removed: [] }));
+    index.load(1, []);
+
+    expect([...index.members(11)]).toEqual(["1"]);
+  });
+
+  test("Keeps a person until their last socket closes", () => {
+    expect(index.connect(1)).toBe(true);
+    expect(index.connect(1)).toBe(false);
+    index.load(1, ["10"]);
+
+    index.disconnect(1);
+    expect([...index.members(10)]).toEqual(["1"]);
+
+    index.disconnect(1);
+    expect(index.members(10).size).toBe(0);
+    expect(index.chats.size).toBe(0);
+    expect(index.people.size).toBe(0);
+  });
+});
@@ -0,0 +1,67 @@
+import { Presence, presenceKey } from "../src/lib/presence.js";
+
+jest.mock("../src/lib/redis.js", () => ({ redisCache: {} }));
+
+// Records the commands the presence tracker sends
+class FakeRedis {
+  constructor() {
+    this.commands = [];
+  }
+
+  pipeline() {
+    const pipeline = {
+      zremrangebyscore: (...args) => this.commands.push(["zremrangebyscore", ...args]) && pipeline,
+      zadd: (...args) => this.commands.push(["zadd", ...args]) && pipeline,
+      pexpire: (...args) => this.commands.push(["pexpire", ...args]) && pipeline,
+      exec: () => Promise.resolve([]),
+    };
+    return pipeline;
+  }
+
+  zrem(...args) {
+    this.commands.push(["zrem", ...args]);
+    return Promise.resolve(1);
+  }
+}
+
+describe("Presence Tests", () => {
+  let redis;
+  let presence;
+
+  beforeEach(() => {
+    redis = new FakeRedis();
+    presence = new Presence(redis, 60000);
+  });
+
+  test("Adds a scored connection on connect", () => {
+    const connectionId = presence.connect(1);
+
+    const zadd = redis.commands.find(([command]) => command === "zadd");
+    expect(zadd[1]).toBe(presenceKey(1));
+    expect(zadd[2]).toBeGreaterThan(Date.now());
+    expect(zadd[3]).toBe(connectionId);
+  });
+
+  test("Heartbeats refresh every open connection", () => {
+    presence.connect(1);
+    presence.connect(1);
+    presence.connect(2);
+    redis.commands = [];
+
+    presence.heartbeat();
+
+    const zadds = redis.commands.filter(([command]) => command === "zadd");
+    expect(zadds.map(([, key]) => key)).toEqual([presenceKey(1), presenceKey(1), presenceKey(2)]);
+  });
+
+  test("Removes only the closed connection", () => {
+    const first = presence.connect(1);
+    presence.connect(1);
+
+    presence.disconnect(first);
+    presence.disconnect(first);
+
+    expect(redis.commands.filter(([command]) => command === "zrem")).toEqual([["zrem", presenceKey(1), first]]);
+    expect(presence.connections.size).toBe(1);
+  });
+});